@@ -19,7 +19,29 @@
 
 from __future__ import division
 
+import array
+import atexit
+import binascii
+import bisect
+import collections
+import ctypes
+import heapq
+import itertools
+import math
+import os
 import sys
+import threading
+import weakref
+
+try:
+  import numpy as np
+except ImportError:  # numpy is optional, only the array features need it
+  np = None
+
+try:
+  from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8, only the workers option of the batch conversions needs it
+  shared_memory = None
 
 _oneThird = 1.0 / 3
 _srgbGammaCorrInv = 0.03928 / 12.92
@@ -246,6 +268,11 @@ NAMED_COLOR = {
   'yellow':               '#ffff00',
   'yellowgreen':          '#9acd32'}
 
+# The named colors as (r, g, b) tuples, so that looking up a name does not
+# parse its hexadecimal definition.
+_NAMED_RGB = dict([(name, tuple([int(html[i:i+2], 16) / 255.0 for i in (1, 3, 5)]))
+    for name, html in NAMED_COLOR.items()])
+
 def rgb_to_hsl(r, g=None, b=None):
   """Convert the color from RGB coordinates to HSL.
 
@@ -687,6 +714,108 @@ def lab_to_xyz(l, a=None, b=None, wref=_DEFAULT_WREF):
   z = y - (b / 2.0)
   return tuple((((v > 0.206893) and [v**3] or [(v - _sixteenHundredsixteenth) / 7.787])[0] * w for v, w in zip((x, y, z), wref)))
 
+# The cone response matrices of the chromatic adaptation transforms, from XYZ
+# to the LMS space where the white point is scaled.
+_CAT_MATRICES = {
+  'bradford': (
+    ( 0.8951,  0.2664, -0.1614),
+    (-0.7502,  1.7135,  0.0367),
+    ( 0.0389, -0.0685,  1.0296)),
+  'von_kries': (
+    ( 0.40024, 0.70760, -0.08081),
+    (-0.22630, 1.16532,  0.04570),
+    ( 0.0,     0.0,      0.91822)),
+  'cat02': (
+    ( 0.7328, 0.4296, -0.1624),
+    (-0.7036, 1.6975,  0.0061),
+    ( 0.0030, 0.0136,  0.9834))}
+
+# The chromatic adaptation methods.
+ADAPTATION_METHODS = ('bradford', 'von_kries', 'cat02')
+
+# The adaptation matrices, by (method, source, destination white reference).
+_adaptationMatrices = {}
+
+def _mat_vec(m, v):
+  return tuple([row[0] * v[0] + row[1] * v[1] + row[2] * v[2] for row in m])
+
+def _mat_mul(a, b):
+  return tuple([tuple([sum([row[k] * b[k][j] for k in range(3)]) for j in range(3)]) for row in a])
+
+def _mat_inv(m):
+  (a, b, c), (d, e, f), (g, h, i) = m
+  det = a * (e*i - f*h) - b * (d*i - f*g) + c * (d*h - e*g)
+  return (
+    ((e*i - f*h) / det, (c*h - b*i) / det, (b*f - c*e) / det),
+    ((f*g - d*i) / det, (a*i - c*g) / det, (c*d - a*f) / det),
+    ((d*h - e*g) / det, (b*g - a*h) / det, (a*e - b*d) / det))
+
+def adaptation_matrix(srcWref=_DEFAULT_WREF, dstWref=WHITE_REFERENCE['std_D50'], method='bradford'):
+  """Return the chromatic adaptation matrix between two white references.
+
+  The matrix is computed on the first call for a given pair of white
+  references, and taken from a cache by the following ones.
+
+  Parameters:
+    :srcWref:
+      The whitepoint reference the colors are seen under, default is 2° D65.
+    :dstWref:
+      The whitepoint reference to adapt the colors to, default is 2° D50.
+    :method:
+      The adaptation transform, one of ADAPTATION_METHODS.
+
+  Returns:
+    The 3x3 matrix, as a tuple of rows, transforming the XYZ values seen
+    under srcWref to the corresponding XYZ values under dstWref.
+
+  >>> m = adaptation_matrix(WHITE_REFERENCE['std_D65'], WHITE_REFERENCE['std_D50'])
+  >>> [['%.6f' % v for v in row] for row in m]
+  [['1.047852', '0.022907', '-0.050146'], ['0.029572', '0.990467', '-0.017057'], ['-0.009237', '0.015046', '0.752062']]
+
+  """
+  key = (method, tuple(srcWref), tuple(dstWref))
+  matrix = _adaptationMatrices.get(key)
+  if matrix is None:
+    try:
+      cone = _CAT_MATRICES[method]
+    except KeyError:
+      raise ValueError("Invalid adaptation method: %s" % method)
+    src = _mat_vec(cone, srcWref)
+    dst = _mat_vec(cone, dstWref)
+    scale = tuple([tuple([v * d / s for v in row]) for row, s, d in zip(cone, src, dst)])
+    matrix = _adaptationMatrices[key] = _mat_mul(_mat_inv(cone), scale)
+  return matrix
+
+def adapt_xyz(x, y=None, z=None, srcWref=_DEFAULT_WREF, dstWref=WHITE_REFERENCE['std_D50'], method='bradford'):
+  """Adapt the color from a white reference to another one.
+
+  Parameters:
+    :x:
+      The X component value [0...1]
+    :y:
+      The Y component value [0...1]
+    :z:
+      The Z component value [0...1]
+    :srcWref:
+      The whitepoint reference the color is seen under, default is 2° D65.
+    :dstWref:
+      The whitepoint reference to adapt the color to, default is 2° D50.
+    :method:
+      The adaptation transform, one of ADAPTATION_METHODS.
+
+  Returns:
+    The corresponding color under dstWref, as an (x, y, z) tuple.
+
+  >>> '(%g, %g, %g)' % adapt_xyz(0.488941, 0.365682, 0.0448137)
+  '(0.518467, 0.37589, 0.0346887)'
+  >>> '(%g, %g, %g)' % adapt_xyz(WHITE_REFERENCE['std_D65'], method='cat02')
+  '(0.964212, 1, 0.825188)'
+
+  """
+  if type(x) in [list,tuple]:
+    x, y, z = x
+  return _mat_vec(adaptation_matrix(srcWref, dstWref, method), (x, y, z))
+
 def cmyk_to_cmy(c, m=None, y=None, k=None):
   """Convert the color from CMYK coordinates to CMY.
 
@@ -866,6 +995,89 @@ def rgb_to_html(r, g=None, b=None):
     r, g, b = r
   return '#%02x%02x%02x' % tuple((min(round(v*255), 255) for v in (r, g, b)))
 
+class _LruCache(object):
+  """A thread-safe cache keeping the maxSize most recently used items."""
+
+  def __init__(self, maxSize):
+    self.__lock = threading.Lock()
+    self.__items = collections.OrderedDict()
+    self.__maxSize = maxSize
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self):
+    return len(self.__items)
+
+  @property
+  def maxSize(self):
+    return self.__maxSize
+
+  def get(self, key):
+    with self.__lock:
+      try:
+        # Move the item to the end, OrderedDict.move_to_end is Python 3 only.
+        value = self.__items.pop(key)
+      except KeyError:
+        self.misses += 1
+        return None
+      self.__items[key] = value
+      self.hits += 1
+      return value
+
+  def put(self, key, value):
+    with self.__lock:
+      items = self.__items
+      items[key] = value
+      while len(items) > self.__maxSize:
+        items.popitem(last=False)
+
+  def resize(self, maxSize):
+    with self.__lock:
+      self.__maxSize = maxSize
+      while len(self.__items) > maxSize:
+        self.__items.popitem(last=False)
+
+  def clear(self):
+    with self.__lock:
+      self.__items.clear()
+      self.hits = 0
+      self.misses = 0
+
+_htmlCache = _LruCache(1024)
+
+def set_html_cache_size(size):
+  """Set the number of parsed colors kept by html_to_rgb and Color.from_html.
+
+  html_to_rgb keeps the results of the last parsed definitions in a least
+  recently used cache, 1024 by default. A size of 0 disables the cache.
+
+  Parameters:
+    :size:
+      The maximum number of cached definitions.
+
+  """
+  if size < 0:
+    raise ValueError("the cache size cannot be negative")
+  _htmlCache.resize(size)
+
+def clear_html_cache():
+  """Empty the cache of html_to_rgb and reset its statistics."""
+  _htmlCache.clear()
+
+def html_cache_stats():
+  """Return the statistics of the cache of html_to_rgb.
+
+  Returns:
+    A (hits, misses, size, maxSize) tuple.
+
+  >>> clear_html_cache()
+  >>> rgb = html_to_rgb('#ff8000'), html_to_rgb('#ff8000'), html_to_rgb('red')
+  >>> html_cache_stats()
+  (1, 2, 2, 1024)
+
+  """
+  return (_htmlCache.hits, _htmlCache.misses, len(_htmlCache), _htmlCache.maxSize)
+
 def html_to_rgb(html):
   """Convert the HTML color to (r, g, b).
 
@@ -896,9 +1108,18 @@ def html_to_rgb(html):
   '(1, 0.980392, 0.803922)'
 
   """
+  rgb = _htmlCache.get(html)
+  if rgb is None:
+    rgb = _parse_html(html)
+    _htmlCache.put(html, rgb)
+  return rgb
+
+def _parse_html(html):
   html = html.strip().lower()
   if html[0]=='#':
     html = html[1:]
+  elif html in _NAMED_RGB:
+    return _NAMED_RGB[html]
   elif html in NAMED_COLOR:
     html = NAMED_COLOR[html][1:]
 
@@ -1051,7 +1272,8 @@ def rgb_to_ryb(hue):
 
   Parameters:
     :hue:
-      The hue on the RGB color wheel [0...360]
+      The hue on the RGB color wheel [0...360], or a numpy array of
+      hues.
 
   Returns:
     An approximation of the corresponding hue on Itten's RYB wheel.
@@ -1060,18 +1282,15 @@ def rgb_to_ryb(hue):
   26.0
 
   """
-  d = hue % 15
-  i = int(hue / 15)
-  x0 = _RybWheel[i]
-  x1 = _RybWheel[i+1]
-  return x0 + (x1-x0) * d / 15
+  return _wheel_hue(hue, _RybWheel)
 
 def ryb_to_rgb(hue):
   """Maps a hue on Itten's RYB color wheel to the standard RGB wheel.
 
   Parameters:
     :hue:
-      The hue on Itten's RYB color wheel [0...360]
+      The hue on Itten's RYB color wheel [0...360], or a numpy array of
+      hues.
 
   Returns:
     An approximation of the corresponding hue on the standard RGB wheel.
@@ -1080,242 +1299,3787 @@ def ryb_to_rgb(hue):
   8.0
 
   """
-  d = hue % 15
-  i = int(hue / 15)
-  x0 = _RgbWheel[i]
-  x1 = _RgbWheel[i+1]
-  return x0 + (x1-x0) * d / 15
+  return _wheel_hue(hue, _RgbWheel)
 
+# --==============================--------------------------------------------
+# -- sRGB transfer lookup tables --
+# --==============================--
+#
+# Quantized pixel data only has 256 (8 bits) or 65536 (16 bits) levels per
+# channel, so the linear value of every level is computed once instead of
+# raising each pixel to the 2.4 power. Encoding linear values back to
+# quantized levels interpolates in a dense table of the encoding curve, which
+# stays within 1e-5 of the exact curve: the 8 bits levels are always exact, the
+# 16 bits ones are at most one level off.
 
-class Color(object):
-  """Hold a color value.
+_SRGB_ENCODE_SIZE = 16385
+_srgbLuts = {}
 
-  Example usage:
+def _srgb_to_linear(v):
+  return v / 12.92 if v <= 0.03928 else ((v+0.055) / 1.055) ** 2.4
 
-  To create an instance of the grapefruit.Color from RGB values:
+def _linear_to_srgb(v):
+  return v * 12.92 if v <= _srgbGammaCorrInv else (1.055 * (v ** (1/2.4))) - 0.055
 
-    >>> import grapefruit
-    >>> r, g, b = 1, 0.5, 0
-    >>> col = grapefruit.Color.from_rgb(r, g, b)
+def _srgb_lut(key):
+  """Return a sRGB transfer table.
 
-  To get the values of the color in another colorspace:
+  Parameters:
+    :key:
+      8 or 16 for the linear values of all the levels of that bit depth,
+      'encode' for the sRGB values of _SRGB_ENCODE_SIZE evenly spaced linear
+      values in [0...1].
 
-    >>> h, s, v = col.hsv
-    >>> l, a, b = col.lab
+  Returns:
+    The table, as a list of floats.
 
-  To get the complementary of a color:
+  >>> len(_srgb_lut(8)), len(_srgb_lut(16))
+  (256, 65536)
+  >>> '%g, %g' % (_srgb_lut(8)[255], _srgb_lut('encode')[-1])
+  '1, 1'
 
-    >>> compl = col.complementary_color(mode='rgb')
-    >>> compl.hsl
-    (210.0, 1.0, 0.5)
+  """
+  lut = _srgbLuts.get(key)
+  if lut is None:
+    if key=='encode':
+      scale = float(_SRGB_ENCODE_SIZE - 1)
+      lut = [_linear_to_srgb(i / scale) for i in range(_SRGB_ENCODE_SIZE)]
+    else:
+      scale = float((1 << key) - 1)
+      lut = [_srgb_to_linear(i / scale) for i in range(1 << key)]
+    _srgbLuts[key] = lut
+  return lut
+
+def _pixel_depth(values):
+  """Return the bit depth of 8 or 16 bits unsigned integer data, or 0."""
+  if np is not None and isinstance(values, np.ndarray):
+    code = values.dtype.char
+  else:
+    code = getattr(values, 'typecode', None) or getattr(values, 'format', None)
+  return {'B': 8, 'H': 16}.get(code, 0)
 
-  To directly convert RGB values to their HSL equivalent:
+# --=====================-----------------------------------------------------
+# -- Vectorized kernels --
+# --=====================--
+#
+# These work on (N, 3) float64 numpy arrays and write their result in a
+# preallocated out array. They mirror the scalar functions above, but use
+# np.where masks instead of branches so that every color is converted in the
+# same pass.
+
+def _require_numpy(feature):
+  if np is None:
+    raise ImportError("%s requires numpy" % feature)
+
+def _as_array(values):
+  if isinstance(values, (bytes, bytearray, memoryview, array.array)):
+    return np.asarray(memoryview(values))
+  return values
+
+def _as_components(values, n=3):
+  """Return values as a C-contiguous (N, n) float64 array."""
+  return np.ascontiguousarray(_as_array(values), dtype=np.float64).reshape(-1, n)
+
+def _as_pixel_components(values, n=3):
+  """Like _as_components, but keep 8 and 16 bits integer data as is."""
+  values = _as_array(values)
+  if _pixel_depth(values):
+    return np.ascontiguousarray(values).reshape(-1, n)
+  return _as_components(values, n)
+
+def _np_srgb_lut(key):
+  lut = _srgbLuts.get(('numpy', key))
+  if lut is None:
+    lut = _srgbLuts[('numpy', key)] = np.array(_srgb_lut(key))
+  return lut
+
+if np is not None:
+  _YIQ_MATRIX = np.array((
+    (0.29895808,  0.58660979,  0.11443213),
+    (0.59590296, -0.27405705, -0.32184591),
+    (0.21133576, -0.52263517,  0.31129940)))
+  _YIQ_INV_MATRIX = np.array((
+    (1.0,  0.9562,  0.6210),
+    (1.0, -0.2717, -0.6485),
+    (1.0, -1.1053,  1.7020)))
+
+  _YUV_MATRIX = np.array((
+    ( 0.29900,  0.58700,  0.11400),
+    (-0.14713, -0.28886,  0.43600),
+    ( 0.61500, -0.51499, -0.10001)))
+  _YUV_INV_MATRIX = np.array((
+    (1.0,  0.0,      1.13983),
+    (1.0, -0.39465, -0.58060),
+    (1.0,  2.03211,  0.0)))
+
+  _XYZ_MATRIX = np.array((
+    (0.4124, 0.3576, 0.1805),
+    (0.2126, 0.7152, 0.0722),
+    (0.0193, 0.1192, 0.9505)))
+  _XYZ_INV_MATRIX = np.array((
+    ( 3.2406255, -1.5372080, -0.4986286),
+    (-0.9689307,  1.8757561,  0.0415175),
+    ( 0.0557101, -0.2040211,  1.0569959)))
+
+  # Position of (v, n, m) in the RGB triple for each HSV sextant.
+  _HSV_SEXTANTS = np.array((
+    (0, 1, 2),
+    (1, 0, 2),
+    (2, 0, 1),
+    (2, 1, 0),
+    (1, 2, 0),
+    (0, 2, 1)))
+
+def _np_hue(rgb, maxVal, d, grey):
+  # Hue of the non-grey colors, shared by the HSL and HSV kernels.
+  r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+  d = np.where(grey, 1.0, d)
+  dr = (maxVal - r) / d
+  dg = (maxVal - g) / d
+  db = (maxVal - b) / d
+  h = np.where(r==maxVal, db - dg, np.where(g==maxVal, 2.0 + dr - db, 4.0 + dg - dr))
+  h = (h*60.0) % 360.0
+  h[grey] = 0.0
+  return h
 
-    >>> h, s, l = rgb_to_hsl(r, g, b)
+def _np_rgb_to_hsl(rgb, out):
+  maxVal = rgb.max(axis=1)
+  minVal = rgb.min(axis=1)
+  d = maxVal - minVal
+  grey = d==0
 
-  """
+  l = (maxVal + minVal) / 2.0
+  with np.errstate(divide='ignore', invalid='ignore'):
+    s = np.where(l < 0.5, d / (maxVal + minVal), d / (2.0 - maxVal - minVal))
+  s[grey] = 0.0
+
+  out[:, 0] = _np_hue(rgb, maxVal, d, grey)
+  out[:, 1] = s
+  out[:, 2] = l
+  return out
+
+def _np_hsl_to_rgb(hsl, out):
+  h, s, l = hsl[:, 0], hsl[:, 1], hsl[:, 2]
+  n2 = np.where(l < 0.5, l * (1.0 + s), l+s - (l*s))
+  n1 = (2.0 * l) - n2
+  h = h / 60.0
+  # _hue_to_rgb as a single clamped ramp: 0 on [4, 6), rising on [0, 1),
+  # 1 on [1, 3) and falling on [3, 4).
+  for i, offset in enumerate((2.0, 0.0, -2.0)):
+    t = (h + offset) % 6.0
+    out[:, i] = n1 + ((n2-n1) * np.clip(np.minimum(t, 4.0 - t), 0.0, 1.0))
+  return out
+
+def _np_rgb_to_hsv(rgb, out):
+  v = rgb.max(axis=1)
+  d = v - rgb.min(axis=1)
+  grey = d==0
+  with np.errstate(divide='ignore', invalid='ignore'):
+    s = d / v
+  s[grey] = 0.0
+
+  out[:, 0] = _np_hue(rgb, v, d, grey)
+  out[:, 1] = s
+  out[:, 2] = v
+  return out
+
+def _np_hsv_to_rgb(hsv, out):
+  h, s, v = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+  h = (h / 60.0) % 6.0
+  i = h.astype(np.intp)
+  f = h - i
+  f = np.where(i & 1, f, 1 - f)
 
-  # --==================--------------------------------------------------------
-  # -- Creation methods --
-  # --==================--
+  vnm = np.empty_like(out)
+  vnm[:, 0] = v
+  vnm[:, 1] = v * (1.0 - (s * f))
+  vnm[:, 2] = v * (1.0 - s)
+  # Greys need no special case: with s==0, n and m are both equal to v.
+  out[...] = np.take_along_axis(vnm, _HSV_SEXTANTS[i], axis=1)
+  return out
 
-  @staticmethod
-  def from_rgb(r, g, b, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed RGB values.
+def _np_rgb_to_yiq(rgb, out):
+  return np.dot(rgb, _YIQ_MATRIX.T, out=out)
 
-    Parameters:
-      :r:
-        The Red component value [0...1]
-      :g:
-        The Green component value [0...1]
-      :b:
-        The Blue component value [0...1]
-      :alpha:
-        The color transparency [0...1], default is opaque
-      :wref:
-        The whitepoint reference, default is 2° D65.
+def _np_yiq_to_rgb(yiq, out):
+  return np.dot(yiq, _YIQ_INV_MATRIX.T, out=out)
 
-    Returns:
-      A grapefruit.Color instance.
+def _np_rgb_to_yuv(rgb, out):
+  return np.dot(rgb, _YUV_MATRIX.T, out=out)
 
-    >>> Color.from_rgb(1.0, 0.5, 0.0)
-    Color(1.0, 0.5, 0.0, 1.0)
-    >>> Color.from_rgb(1.0, 0.5, 0.0, 0.5)
-    Color(1.0, 0.5, 0.0, 0.5)
+def _np_yuv_to_rgb(yuv, out):
+  return np.dot(yuv, _YUV_INV_MATRIX.T, out=out)
 
-    """
-    return Color((r, g, b), 'rgb', alpha, wref)
+def _np_srgb_to_linear(v):
+  # The clamp only keeps the unused branch from raising negative values to a
+  # fractional power.
+  return np.where(v <= 0.03928, v / 12.92, ((np.maximum(v, 0.03928)+0.055) / 1.055) ** 2.4)
 
-  @staticmethod
-  def from_hsl(h, s, l, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed HSL values.
+def _np_linear_to_srgb(v):
+  return np.where(v <= _srgbGammaCorrInv, v * 12.92, (1.055 * (np.maximum(v, _srgbGammaCorrInv) ** (1/2.4))) - 0.055)
 
-    Parameters:
-      :h:
-        The Hue component value [0...1]
-      :s:
-        The Saturation component value [0...1]
-      :l:
-        The Lightness component value [0...1]
-      :alpha:
-        The color transparency [0...1], default is opaque
-      :wref:
-        The whitepoint reference, default is 2° D65.
+def _np_rgb_to_xyz(rgb, out):
+  depth = _pixel_depth(rgb)
+  if depth:
+    linear = _np_srgb_lut(depth)[rgb]
+  else:
+    linear = _np_srgb_to_linear(rgb)
+  return np.dot(linear, _XYZ_MATRIX.T, out=out)
+
+def _np_xyz_to_rgb(xyz, out):
+  linear = np.dot(xyz, _XYZ_INV_MATRIX.T)
+  depth = _pixel_depth(out)
+  if depth:
+    # numpy's vectorized pow is faster than gathering from the encode table.
+    out[...] = np.rint(np.clip(_np_linear_to_srgb(linear), 0.0, 1.0) * ((1 << depth) - 1))
+  else:
+    out[...] = _np_linear_to_srgb(linear)
+  return out
+
+def _np_xyz_to_lab(xyz, out, wref=_DEFAULT_WREF):
+  v = xyz / np.asarray(wref, dtype=np.float64)
+  v = np.where(v > 0.008856, np.cbrt(v), (7.787 * v) + _sixteenHundredsixteenth)
+  out[:, 0] = (116 * v[:, 1]) - 16
+  out[:, 1] = 5.0 * (v[:, 0] - v[:, 1])
+  out[:, 2] = 2.0 * (v[:, 1] - v[:, 2])
+  return out
+
+def _np_lab_to_xyz(lab, out, wref=_DEFAULT_WREF):
+  v = np.empty_like(out)
+  v[:, 1] = (lab[:, 0] + 16) / 116
+  v[:, 0] = (lab[:, 1] / 5.0) + v[:, 1]
+  v[:, 2] = v[:, 1] - (lab[:, 2] / 2.0)
+  v = np.where(v > 0.206893, v**3, (v - _sixteenHundredsixteenth) / 7.787)
+  return np.multiply(v, np.asarray(wref, dtype=np.float64), out=out)
+
+def _np_adapt_xyz(xyz, out, matrix):
+  return np.dot(xyz, np.asarray(matrix).T, out=out)
+
+def _np_cmyk_to_cmy(cmyk, out):
+  k = cmyk[:, 3:]
+  out[...] = (cmyk[:, :3] * (1 - k)) + k
+  return out
+
+def _np_cmy_to_cmyk(cmy, out):
+  k = cmy.min(axis=1)
+  black = k==1.0
+  mk = np.where(black, 1.0, 1.0 - k)[:, np.newaxis]
+  out[:, :3] = (cmy - k[:, np.newaxis]) / mk
+  out[black, :3] = 0.0
+  out[:, 3] = k
+  return out
+
+def _np_rgb_to_cmy(rgb, out):
+  return np.subtract(1.0, rgb, out=out)
+
+_np_cmy_to_rgb = _np_rgb_to_cmy
+
+def _np_rgb_to_cmyk(rgb, out):
+  return _np_cmy_to_cmyk(1.0 - rgb, out)
+
+def _np_rgb_to_ints(rgb, out):
+  return np.rint(rgb * 255, out=out, casting='unsafe')
+
+def _np_ints_to_rgb(ints, out):
+  return np.divide(ints, 255.0, out=out)
+
+def _np_rgb_to_html(rgb, blob=False):
+  ints = np.clip(np.rint(rgb * 255), 0, 255).astype(np.uint8)
+  # Lay out '#rrggbb\n' lines in a single buffer, split at C speed.
+  lines = np.empty((len(ints), 8), dtype=np.uint8)
+  lines[:, 0] = ord('#')
+  lines[:, 1:7] = np.frombuffer(binascii.hexlify(ints.tobytes()), dtype=np.uint8).reshape(-1, 6)
+  lines[:, 7] = ord('\n')
+  if blob:
+    return lines.tobytes()
+  return lines.tobytes().decode('ascii').split('\n')[:-1]
+
+# --=========================-------------------------------------------------
+# -- Pure python batch kernels --
+# --=========================--
+#
+# Used by the batch conversions when numpy is not available. They work on
+# flat sequences of interleaved components (array.array, memoryview...) and
+# write their result in a preallocated flat output buffer. The hot
+# conversions are unrolled with their constants bound to local variables;
+# the others loop over the scalar functions.
+
+class _ScalarKernel(object):
+  """Batch kernel looping over a scalar conversion function."""
+
+  def __init__(self, scalar, inWidth=3):
+    self.scalar = scalar
+    self.inWidth = inWidth
+
+  def __call__(self, src, out, *args):
+    scalar = self.scalar
+    inWidth = self.inWidth
+    o = 0
+    for i in range(0, len(src), inWidth):
+      if inWidth==3:
+        res = scalar(src[i], src[i+1], src[i+2], *args)
+      else:
+        res = scalar(*(tuple(src[i:i+inWidth]) + args))
+      for v in res:
+        out[o] = v
+        o += 1
+    return out
+
+def _py_rgb_to_xyz(src, out):
+  depth = _pixel_depth(src)
+  if depth:
+    return _py_pixels_to_xyz(src, out, _srgb_lut(depth))
+  thres = 0.03928
+  lin = 1 / 12.92
+  inv = 1 / 1.055
+  for i in range(0, len(src), 3):
+    r = src[i]
+    g = src[i+1]
+    b = src[i+2]
+    r = r * lin if r <= thres else ((r + 0.055) * inv) ** 2.4
+    g = g * lin if g <= thres else ((g + 0.055) * inv) ** 2.4
+    b = b * lin if b <= thres else ((b + 0.055) * inv) ** 2.4
+    out[i]   = (r * 0.4124) + (g * 0.3576) + (b * 0.1805)
+    out[i+1] = (r * 0.2126) + (g * 0.7152) + (b * 0.0722)
+    out[i+2] = (r * 0.0193) + (g * 0.1192) + (b * 0.9505)
+  return out
+
+def _py_pixels_to_xyz(src, out, lut):
+  for i in range(0, len(src), 3):
+    r = lut[src[i]]
+    g = lut[src[i+1]]
+    b = lut[src[i+2]]
+    out[i]   = (r * 0.4124) + (g * 0.3576) + (b * 0.1805)
+    out[i+1] = (r * 0.2126) + (g * 0.7152) + (b * 0.0722)
+    out[i+2] = (r * 0.0193) + (g * 0.1192) + (b * 0.9505)
+  return out
+
+def _py_xyz_to_pixels(src, out, depth):
+  lut = _srgb_lut('encode')
+  steps = _SRGB_ENCODE_SIZE - 1
+  scale = (1 << depth) - 1
+  for i in range(0, len(src), 3):
+    x = src[i]
+    y = src[i+1]
+    z = src[i+2]
+    r =  (x * 3.2406255) - (y * 1.5372080) - (z * 0.4986286)
+    g = -(x * 0.9689307) + (y * 1.8757561) + (z * 0.0415175)
+    b =  (x * 0.0557101) - (y * 0.2040211) + (z * 1.0569959)
+    # The three channels are unrolled, a helper call would cost more than
+    # the pow it replaces.
+    if r <= 0.0: out[i] = 0
+    elif r >= 1.0: out[i] = scale
+    else:
+      pos = r * steps
+      k = int(pos)
+      x0 = lut[k]
+      out[i] = int(((x0 + ((lut[k+1] - x0) * (pos - k))) * scale) + 0.5)
+    if g <= 0.0: out[i+1] = 0
+    elif g >= 1.0: out[i+1] = scale
+    else:
+      pos = g * steps
+      k = int(pos)
+      x0 = lut[k]
+      out[i+1] = int(((x0 + ((lut[k+1] - x0) * (pos - k))) * scale) + 0.5)
+    if b <= 0.0: out[i+2] = 0
+    elif b >= 1.0: out[i+2] = scale
+    else:
+      pos = b * steps
+      k = int(pos)
+      x0 = lut[k]
+      out[i+2] = int(((x0 + ((lut[k+1] - x0) * (pos - k))) * scale) + 0.5)
+  return out
+
+def _py_xyz_to_rgb(src, out):
+  depth = _pixel_depth(out)
+  if depth:
+    return _py_xyz_to_pixels(src, out, depth)
+  thres = _srgbGammaCorrInv
+  exp = 1 / 2.4
+  for i in range(0, len(src), 3):
+    x = src[i]
+    y = src[i+1]
+    z = src[i+2]
+    r =  (x * 3.2406255) - (y * 1.5372080) - (z * 0.4986286)
+    g = -(x * 0.9689307) + (y * 1.8757561) + (z * 0.0415175)
+    b =  (x * 0.0557101) - (y * 0.2040211) + (z * 1.0569959)
+    out[i]   = r * 12.92 if r <= thres else (1.055 * (r ** exp)) - 0.055
+    out[i+1] = g * 12.92 if g <= thres else (1.055 * (g ** exp)) - 0.055
+    out[i+2] = b * 12.92 if b <= thres else (1.055 * (b ** exp)) - 0.055
+  return out
+
+def _py_xyz_to_lab(src, out, wref=_DEFAULT_WREF):
+  wx = 1.0 / wref[0]
+  wy = 1.0 / wref[1]
+  wz = 1.0 / wref[2]
+  oneThird = _oneThird
+  offset = _sixteenHundredsixteenth
+  for i in range(0, len(src), 3):
+    x = src[i] * wx
+    y = src[i+1] * wy
+    z = src[i+2] * wz
+    x = x ** oneThird if x > 0.008856 else (7.787 * x) + offset
+    y = y ** oneThird if y > 0.008856 else (7.787 * y) + offset
+    z = z ** oneThird if z > 0.008856 else (7.787 * z) + offset
+    out[i]   = (116 * y) - 16
+    out[i+1] = 5.0 * (x - y)
+    out[i+2] = 2.0 * (y - z)
+  return out
+
+def _py_lab_to_xyz(src, out, wref=_DEFAULT_WREF):
+  wx, wy, wz = wref
+  offset = _sixteenHundredsixteenth
+  for i in range(0, len(src), 3):
+    y = (src[i] + 16) / 116
+    x = (src[i+1] / 5.0) + y
+    z = y - (src[i+2] / 2.0)
+    out[i]   = wx * (x**3 if x > 0.206893 else (x - offset) / 7.787)
+    out[i+1] = wy * (y**3 if y > 0.206893 else (y - offset) / 7.787)
+    out[i+2] = wz * (z**3 if z > 0.206893 else (z - offset) / 7.787)
+  return out
+
+def _py_adapt_xyz(src, out, matrix):
+  (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = matrix
+  for i in range(0, len(src), 3):
+    x = src[i]
+    y = src[i+1]
+    z = src[i+2]
+    out[i]   = (m00 * x) + (m01 * y) + (m02 * z)
+    out[i+1] = (m10 * x) + (m11 * y) + (m12 * z)
+    out[i+2] = (m20 * x) + (m21 * y) + (m22 * z)
+  return out
+
+_py_rgb_to_hsl = _ScalarKernel(rgb_to_hsl)
+_py_hsl_to_rgb = _ScalarKernel(hsl_to_rgb)
+_py_rgb_to_hsv = _ScalarKernel(rgb_to_hsv)
+_py_hsv_to_rgb = _ScalarKernel(hsv_to_rgb)
+_py_rgb_to_yiq = _ScalarKernel(rgb_to_yiq)
+_py_yiq_to_rgb = _ScalarKernel(yiq_to_rgb)
+_py_rgb_to_yuv = _ScalarKernel(rgb_to_yuv)
+_py_yuv_to_rgb = _ScalarKernel(yuv_to_rgb)
+_py_cmyk_to_cmy = _ScalarKernel(cmyk_to_cmy, 4)
+_py_cmy_to_cmyk = _ScalarKernel(cmy_to_cmyk)
+_py_rgb_to_cmy = _ScalarKernel(rgb_to_cmy)
+_py_cmy_to_rgb = _ScalarKernel(cmy_to_rgb)
+_py_rgb_to_ints = _ScalarKernel(rgb_to_ints)
+_py_ints_to_rgb = _ScalarKernel(ints_to_rgb)
+
+# Python 2 memoryviews only hold single bytes and cannot be cast to another
+# format: array.array stand in for them there.
+_TYPED_MEMORYVIEWS = hasattr(memoryview, 'cast')
+
+def _array_bytes(values):
+  """Return the bytes of an array.array (tostring on Python 2)."""
+  return values.tobytes() if _TYPED_MEMORYVIEWS else values.tostring()
+
+def _as_flat_components(values):
+  """Return values as a flat indexable sequence of components."""
+  if isinstance(values, array.array):
+    return values
+  try:
+    view = memoryview(values)
+  except TypeError:
+    # A sequence of color tuples.
+    return array.array('d', [v for c in values for v in c])
+  if not _TYPED_MEMORYVIEWS:
+    return array.array('B', view.tobytes())
+  if view.ndim != 1:
+    view = view.cast('B').cast(view.format)
+  return view
+
+def _as_flat_out(out):
+  """Return out, a writable buffer, as a flat sequence of components."""
+  if not isinstance(out, array.array):
+    try:
+      readonly = memoryview(out).readonly
+    except TypeError:
+      # A list would be copied, the result never reaching the caller.
+      readonly = True
+    if readonly:
+      raise TypeError("out must be a writable buffer, not %s" % type(out).__name__)
+    if not _TYPED_MEMORYVIEWS:
+      raise TypeError("out must be an array.array on Python 2")
+  return _as_flat_components(out)
+
+def _py_run_batch(kernel, values, out, inWidth, outWidth, args, dtype, workers, threads):
+  src = _as_flat_components(values)
+  if len(src) % inWidth:
+    raise ValueError("values must hold %d interleaved components per color" % inWidth)
+  size = (len(src) // inWidth) * outWidth
+  if out is None:
+    out = flat = array.array(dtype is int and 'l' or 'd', [0]) * size
+  else:
+    flat = _as_flat_out(out)
+    if len(flat) != size:
+      raise ValueError("out must hold %d components" % size)
+  _call_kernel(kernel, src, flat, inWidth, outWidth, args, workers, threads)
+  return out
+
+def _py_batch_out(result, out):
+  """Copy a flat array.array result to out, if any, and return it."""
+  if out is None:
+    return result
+  flat = _as_flat_out(out)
+  if len(flat) != len(result):
+    raise ValueError("out must hold %d components" % len(result))
+  flat[:] = result
+  return out
+
+def _np_batch_out(out, shape):
+  """Return a numpy view of the given shape of out, an array or a buffer."""
+  if not isinstance(out, np.ndarray):
+    out = np.asarray(memoryview(out))
+    if out.size == int(np.prod(shape)):
+      out = out.reshape(shape)
+  if out.shape != shape:
+    raise ValueError("out must be an array of shape %s" % (shape,))
+  return out
+
+# --===========================------------------------------------------------
+# -- Parallel batch kernels --
+# --===========================--
+#
+# With workers=N, the batch conversions copy the components once to a pair of
+# shared memory blocks and split them across a pool of N worker processes.
+# Each worker attaches to the blocks and runs the kernel over its slice in
+# place, so only the block names and the slice bounds are pickled. The values
+# and the out buffer of a SharedBatch already live in a shared memory block,
+# the workers read and write them directly and both copies are skipped.
+
+_CHUNKS_PER_WORKER = 4
+_THREAD_CHUNK = 1 << 14
+_workerPools = {}
+_threadPools = {}
+
+def _worker_pool(workers):
+  pool = _workerPools.get(workers)
+  if pool is None:
+    import multiprocessing
+    if not _workerPools and not _threadPools:
+      atexit.register(_close_worker_pools)
+    pool = _workerPools[workers] = multiprocessing.Pool(workers)
+  return pool
+
+def _thread_pool(threads):
+  pool = _threadPools.get(threads)
+  if pool is None:
+    from multiprocessing.pool import ThreadPool
+    if not _workerPools and not _threadPools:
+      atexit.register(_close_worker_pools)
+    pool = _threadPools[threads] = ThreadPool(threads)
+  return pool
+
+def _close_worker_pools():
+  for pools in (_workerPools, _threadPools):
+    while pools:
+      pool = pools.popitem()[1]
+      pool.terminate()
+      pool.join()
+
+_sharedBlocks = {}
+_pendingBlocks = []
+
+def _close_blocks(*blocks):
+  """Close shared memory blocks, deferring those whose buffer is still in use."""
+  blocks = _pendingBlocks + list(blocks)
+  del _pendingBlocks[:]
+  for shm in blocks:
+    try:
+      shm.close()
+    except BufferError:
+      _pendingBlocks.append(shm)
+
+def _buffer_address(buf):
+  """Return the address of the first byte of a writable buffer, or None."""
+  if np is not None and isinstance(buf, np.ndarray):
+    return buf.__array_interface__['data'][0]
+  try:
+    return ctypes.addressof(ctypes.c_char.from_buffer(memoryview(buf).cast('B')))
+  except (TypeError, ValueError):
+    return None
+
+def _shared_block(buf, nbytes):
+  """Return the (name, offset) of the SharedBatch block holding buf, or None."""
+  address = _buffer_address(buf)
+  if address is None:
+    return None
+  for name, (start, size) in _sharedBlocks.items():
+    if start <= address and address + nbytes <= start + size:
+      return name, address - start
+  return None
+
+class SharedBatch(object):
+  """A buffer of colors in shared memory, for the workers option.
+
+  The batch conversions run with workers=N read their values from and write
+  their result to a SharedBatch in place, instead of copying them to and
+  from a temporary shared memory block. The result of a conversion written to
+  a SharedBatch can feed the next one without any copy either.
+
+  >>> with SharedBatch(2) as rgb, SharedBatch(2) as hsl:
+  ...   rgb.values is html_to_rgb_batch(['#ff8000', '#0000ff'], out=rgb.values)
+  ...   hsl.values is rgb_to_hsl_batch(rgb.values, out=hsl.values, workers=2)
+  ...   [round(v, 3) for v in memoryview(hsl.values).cast('B').cast('d')]
+  True
+  True
+  [30.118, 1.0, 0.5, 240.0, 1.0, 0.5]
 
-    Returns:
-      A grapefruit.Color instance.
+  """
 
-    >>> Color.from_hsl(30, 1, 0.5)
-    Color(1.0, 0.5, 0.0, 1.0)
-    >>> Color.from_hsl(30, 1, 0.5, 0.5)
-    Color(1.0, 0.5, 0.0, 0.5)
+  def __init__(self, count, width=3, typecode='d'):
+    """Allocate a shared buffer of count colors.
+
+    Parameters:
+      :count:
+        The number of colors.
+      :width:
+        The number of components of each color.
+      :typecode:
+        The array.array type code of the components.
 
     """
-    return Color((h, s, l), 'hsl', alpha, wref)
+    if shared_memory is None:
+      raise ImportError("SharedBatch requires multiprocessing.shared_memory (Python 3.8+)")
+    nbytes = count * width * array.array(typecode).itemsize
+    self.__shm = shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+    if np is not None:
+      self.__values = np.frombuffer(shm.buf, typecode, count * width).reshape(count, width)
+    else:
+      self.__values = shm.buf[:nbytes].cast(typecode)
+    _sharedBlocks[shm.name] = (_buffer_address(shm.buf), nbytes)
 
-  @staticmethod
-  def from_hsv(h, s, v, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed HSV values.
+  def __enter__(self):
+    return self
 
-    Parameters:
-      :h:
-        The Hus component value [0...1]
-      :s:
-        The Saturation component value [0...1]
-      :v:
-        The Value component [0...1]
-      :alpha:
-        The color transparency [0...1], default is opaque
-      :wref:
-        The whitepoint reference, default is 2° D65.
+  def __exit__(self, *exc):
+    self.close()
 
-    Returns:
-      A grapefruit.Color instance.
+  def __del__(self):
+    self.close()
 
-    >>> Color.from_hsv(30, 1, 1)
-    Color(1.0, 0.5, 0.0, 1.0)
-    >>> Color.from_hsv(30, 1, 1, 0.5)
-    Color(1.0, 0.5, 0.0, 0.5)
+  def close(self):
+    """Release the shared memory block, the values must no longer be used."""
+    shm = self.__dict__.pop('_SharedBatch__shm', None)
+    if shm is None:
+      return
+    self.__values = None
+    del _sharedBlocks[shm.name]
+    shm.unlink()
+    _close_blocks(shm)
 
-    """
-    h2, s, l = rgb_to_hsl(*hsv_to_rgb(h, s, v))
-    return Color((h, s, l), 'hsl', alpha, wref)
+  @property
+  def values(self):
+    """The (count, width) numpy array, or without numpy the flat memoryview, of the colors."""
+    if self.__values is None:
+      raise ValueError("the SharedBatch is closed")
+    return self.__values
 
-  @staticmethod
-  def from_yiq(y, i, q, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed YIQ values.
+  @property
+  def name(self):
+    """The name of the shared memory block."""
+    return self.__shm.name
+
+def _shm_kernel(task):
+  """Run a kernel over a slice of the shared memory blocks of a batch."""
+  kernel, args, asArrays, blocks = task
+  shms = []
+  views = []
+  try:
+    for name, offset, fmt, width, start, stop in blocks:
+      shm = shared_memory.SharedMemory(name)
+      shms.append(shm)
+      size = array.array(fmt).itemsize * width
+      views.append(shm.buf[offset+start*size:offset+stop*size].cast(fmt))
+    if asArrays:
+      src, out = [np.frombuffer(v, v.format).reshape(-1, w) for v, w in zip(views, (blocks[0][3], blocks[1][3]))]
+    else:
+      src, out = views
+    kernel(src, out, *args)
+  finally:
+    src = out = None
+    for view in views:
+      view.release()
+    for shm in shms:
+      shm.close()
+
+def _parallel_kernel(kernel, src, out, inWidth, outWidth, args, workers):
+  """Run kernel(src, out, *args), splitting the work across workers processes."""
+  if shared_memory is None:
+    raise ImportError("workers requires multiprocessing.shared_memory (Python 3.8+)")
+  srcView = memoryview(src)
+  outView = memoryview(out)
+  count = srcView.nbytes // (srcView.itemsize * inWidth)
+  if count==0:
+    return
+  step = -(-count // (workers * _CHUNKS_PER_WORKER))
+  asArrays = np is not None and isinstance(src, np.ndarray)
+
+  srcBlock = _shared_block(src, srcView.nbytes)
+  outBlock = _shared_block(out, outView.nbytes)
+  outShm = None
+  created = []
+  try:
+    if srcBlock is None:
+      srcShm = shared_memory.SharedMemory(create=True, size=srcView.nbytes)
+      created.append(srcShm)
+      srcShm.buf[:srcView.nbytes] = srcView.cast('B')
+      srcBlock = (srcShm.name, 0)
+    if outBlock is None:
+      outShm = shared_memory.SharedMemory(create=True, size=outView.nbytes)
+      created.append(outShm)
+      outBlock = (outShm.name, 0)
+    tasks = []
+    for start in range(0, count, step):
+      stop = min(start + step, count)
+      tasks.append((kernel, args, asArrays, (
+        srcBlock + (srcView.format, inWidth, start, stop),
+        outBlock + (outView.format, outWidth, start, stop))))
+    _worker_pool(workers).map(_shm_kernel, tasks)
+    if outShm is not None:
+      outView.cast('B')[:] = outShm.buf[:outView.nbytes]
+  finally:
+    for shm in created:
+      shm.close()
+      shm.unlink()
+
+def _threaded_kernel(kernel, src, out, inWidth, outWidth, args, threads):
+  """Run kernel(src, out, *args) over chunks of colors in a thread pool."""
+  if np is not None and isinstance(src, np.ndarray):
+    inStep = outStep = 1
+  else:
+    # Slices of memoryviews share the data where array.array slices copy it.
+    if _TYPED_MEMORYVIEWS:
+      src = memoryview(src)
+      out = memoryview(out)
+    inStep, outStep = inWidth, outWidth
+  copies = isinstance(out, array.array)
+  count = len(src) // inStep
+  if count <= _THREAD_CHUNK:
+    return kernel(src, out, *args)
+
+  def run(start):
+    stop = min(start + _THREAD_CHUNK, count)
+    chunk = out[start*outStep:stop*outStep]
+    kernel(src[start*inStep:stop*inStep], chunk, *args)
+    if copies:
+      out[start*outStep:stop*outStep] = chunk
+
+  if not hasattr(threads, 'map'):
+    threads = _thread_pool(threads)
+  # Executor.map is lazy, consuming it propagates the exceptions.
+  list(threads.map(run, range(0, count, _THREAD_CHUNK)))
+
+def _call_kernel(kernel, src, out, inWidth, outWidth, args, workers, threads):
+  if workers is not None and workers > 1:
+    if threads is not None:
+      raise ValueError("workers and threads cannot be used together")
+    _parallel_kernel(kernel, src, out, inWidth, outWidth, args, workers)
+  elif threads is not None and threads != 1:
+    _threaded_kernel(kernel, src, out, inWidth, outWidth, args, threads)
+  else:
+    kernel(src, out, *args)
 
-    Parameters:
-      :y:
-        The Y component value [0...1]
-      :i:
-        The I component value [0...1]
-      :q:
-        The Q component value [0...1]
-      :alpha:
-        The color transparency [0...1], default is opaque
-      :wref:
-        The whitepoint reference, default is 2° D65.
+# --===================-------------------------------------------------------
+# -- Batch conversions --
+# --===================--
+#
+# Each scalar conversion function has a *_batch variant converting a whole
+# (N, 3) array of colors at once. The batch results match the scalar ones
+# within an absolute tolerance of BATCH_TOLERANCE for values in the documented
+# ranges; the only differences come from the order of the floating point
+# operations (e.g. np.cbrt instead of v**(1/3)).
+#
+# Without numpy, the same functions accept array.array('d') or any other
+# buffer of interleaved components and return a flat array.array instead of
+# an (N, 3) array, so the results of the two paths only index alike when
+# flattened. Passing a preallocated out buffer (e.g. an array.array('d'))
+# gets the result written in place and returned with and without numpy: code
+# written this way, like the examples below, does not change.
+#
+# The workers=N and threads=N options of every batch conversion run it across
+# a pool of N processes or threads (see the parallel batch kernels above). The
+# pools are started on the first use and reused by the following conversions.
 
-    Returns:
-      A grapefruit.Color instance.
+BATCH_TOLERANCE = 1e-12
 
-    >>> Color.from_yiq(0.5922, 0.45885,-0.05)
-    Color(0.999902, 0.499955, -6.7e-05, 1.0)
-    >>> Color.from_yiq(0.5922, 0.45885,-0.05, 0.5)
-    Color(0.999902, 0.499955, -6.7e-05, 0.5)
+def _run_batch(kernel, pyKernel, values, out, inWidth=3, outWidth=3, args=(), dtype=float, pixels=False, workers=None, threads=None):
+  if np is None:
+    return _py_run_batch(pyKernel, values, out, inWidth, outWidth, args, dtype, workers, threads)
 
-    """
-    return Color(yiq_to_rgb(y, i, q), 'rgb', alpha, wref)
+  if pixels:
+    values = _as_pixel_components(values, inWidth)
+  else:
+    values = _as_components(values, inWidth)
+  result = out
+  if out is None:
+    out = result = np.empty((len(values), outWidth), dtype=dtype)
+  elif not isinstance(out, np.ndarray):
+    # An array.array or any other writable buffer of interleaved components.
+    out = np.asarray(memoryview(out)).reshape(-1, outWidth)
+  if out.shape != (len(values), outWidth):
+    raise ValueError("out must be an array of shape (%d, %d)" % (len(values), outWidth))
+  if np.may_share_memory(values, out):
+    values = values.copy()
+  _call_kernel(kernel, values, out, inWidth, outWidth, args, workers, threads)
+  return result
+
+def rgb_to_hsl_batch(rgb, out=None, workers=None, threads=None):
+  """Convert an array of colors from RGB coordinates to HSL.
+
+  This is the vectorized equivalent of rgb_to_hsl.
 
-  @staticmethod
-  def from_yuv(y, u, v, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed YUV values.
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
 
-    Parameters:
-      :y:
-        The Y component value [0...1]
-      :u:
-        The U component value [-0.436...0.436]
-      :v:
-        The V component value [-0.615...0.615]
-      :alpha:
-        The color transparency [0...1], default is opaque
-      :wref:
-        The whitepoint reference, default is 2° D65.
+  Returns:
+    The (N, 3) array of HSL values, in the ranges of rgb_to_hsl.
+    Without numpy, a flat array.array('d') of the interleaved values.
 
-    Returns:
-      A grapefruit.Color instance.
+  >>> out = array.array('d', [0.0] * 6)
+  >>> rgb_to_hsl_batch([(1, 0.5, 0), (0.5, 0.5, 0.5)], out=out).tolist()
+  [30.0, 1.0, 0.5, 0.0, 0.0, 0.5]
 
-    >>> Color.from_yuv(0.5925, -0.2916, 0.3575)
-    Color(0.999989, 0.500015, -6.3e-05, 1.0)
-    >>> Color.from_yuv(0.5925, -0.2916, 0.3575, 0.5)
-    Color(0.999989, 0.500015, -6.3e-05, 0.5)
+  """
+  return _run_batch(_np_rgb_to_hsl, _py_rgb_to_hsl, rgb, out, workers=workers, threads=threads)
 
-    """
-    return Color(yuv_to_rgb(y, u, v), 'rgb', alpha, wref)
+def hsl_to_rgb_batch(hsl, out=None, workers=None, threads=None):
+  """Convert an array of colors from HSL coordinates to RGB.
 
-  @staticmethod
-  def from_xyz(x, y, z, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed CIE-XYZ values.
+  This is the vectorized equivalent of hsl_to_rgb.
 
-    Parameters:
-      :x:
-        The Red component value [0...1]
-      :y:
-        The Green component value [0...1]
-      :z:
-        The Blue component value [0...1]
-      :alpha:
-        The color transparency [0...1], default is opaque
-      :wref:
-        The whitepoint reference, default is 2° D65.
+  Parameters:
+    :hsl:
+      The (N, 3) array of HSL values, in the ranges of hsl_to_rgb.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
 
-    Returns:
-      A grapefruit.Color instance.
+  Returns:
+    The (N, 3) array of RGB values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
 
-    >>> Color.from_xyz(0.488941, 0.365682, 0.0448137)
-    Color(1.0, 0.5, 0.0, 1.0)
-    >>> Color.from_xyz(0.488941, 0.365682, 0.0448137, 0.5)
-    Color(1.0, 0.5, 0.0, 0.5)
+  >>> out = array.array('d', [0.0] * 6)
+  >>> hsl_to_rgb_batch([(30.0, 1.0, 0.5), (0.0, 0.0, 0.5)], out=out).tolist()
+  [1.0, 0.5, 0.0, 0.5, 0.5, 0.5]
 
-    """
-    return Color(xyz_to_rgb(x, y, z), 'rgb', alpha, wref)
+  """
+  return _run_batch(_np_hsl_to_rgb, _py_hsl_to_rgb, hsl, out, workers=workers, threads=threads)
 
-  @staticmethod
-  def from_lab(l, a, b, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed CIE-LAB values.
+def rgb_to_hsv_batch(rgb, out=None, workers=None, threads=None):
+  """Convert an array of colors from RGB coordinates to HSV.
 
-    Parameters:
-      :l:
-        The L component [0...100]
-      :a:
-        The a component [-1...1]
-      :b:
-        The a component [-1...1]
-      :alpha:
-        The color transparency [0...1], default is opaque
-      :wref:
-        The whitepoint reference, default is 2° D65.
+  This is the vectorized equivalent of rgb_to_hsv.
 
-    Returns:
-      A grapefruit.Color instance.
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of HSV values, in the ranges of rgb_to_hsv.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> rgb_to_hsv_batch([(1, 0.5, 0)], out=out).tolist()
+  [30.0, 1.0, 1.0]
+
+  """
+  return _run_batch(_np_rgb_to_hsv, _py_rgb_to_hsv, rgb, out, workers=workers, threads=threads)
+
+def hsv_to_rgb_batch(hsv, out=None, workers=None, threads=None):
+  """Convert an array of colors from HSV coordinates to RGB.
+
+  This is the vectorized equivalent of hsv_to_rgb.
+
+  Parameters:
+    :hsv:
+      The (N, 3) array of HSV values, in the ranges of hsv_to_rgb.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of RGB values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> hsv_to_rgb_batch([(30.0, 1.0, 0.5)], out=out).tolist()
+  [0.5, 0.25, 0.0]
+
+  """
+  return _run_batch(_np_hsv_to_rgb, _py_hsv_to_rgb, hsv, out, workers=workers, threads=threads)
+
+def rgb_to_yiq_batch(rgb, out=None, workers=None, threads=None):
+  """Convert an array of colors from RGB to YIQ.
+
+  This is the vectorized equivalent of rgb_to_yiq.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of YIQ values, in the ranges of rgb_to_yiq.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in rgb_to_yiq_batch([(1, 0.5, 0)], out=out)]
+  [0.592263, 0.458874, -0.049982]
+
+  """
+  return _run_batch(_np_rgb_to_yiq, _py_rgb_to_yiq, rgb, out, workers=workers, threads=threads)
+
+def yiq_to_rgb_batch(yiq, out=None, workers=None, threads=None):
+  """Convert an array of colors from YIQ coordinates to RGB.
+
+  This is the vectorized equivalent of yiq_to_rgb.
+
+  Parameters:
+    :yiq:
+      The (N, 3) array of YIQ values, in the ranges of yiq_to_rgb.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of RGB values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in yiq_to_rgb_batch([(0.592263, 0.458874, -0.0499818)], out=out)]
+  [1.0, 0.5, 1e-06]
+
+  """
+  return _run_batch(_np_yiq_to_rgb, _py_yiq_to_rgb, yiq, out, workers=workers, threads=threads)
+
+def rgb_to_yuv_batch(rgb, out=None, workers=None, threads=None):
+  """Convert an array of colors from RGB coordinates to YUV.
+
+  This is the vectorized equivalent of rgb_to_yuv.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of YUV values, in the ranges of rgb_to_yuv.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in rgb_to_yuv_batch([(1, 0.5, 0)], out=out)]
+  [0.5925, -0.29156, 0.357505]
+
+  """
+  return _run_batch(_np_rgb_to_yuv, _py_rgb_to_yuv, rgb, out, workers=workers, threads=threads)
+
+def yuv_to_rgb_batch(yuv, out=None, workers=None, threads=None):
+  """Convert an array of colors from YUV coordinates to RGB.
+
+  This is the vectorized equivalent of yuv_to_rgb.
+
+  Parameters:
+    :yuv:
+      The (N, 3) array of YUV values, in the ranges of yuv_to_rgb.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of RGB values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in yuv_to_rgb_batch([(0.5925, -0.2916, 0.3575)], out=out)]
+  [0.999989, 0.500015, -6.3e-05]
+
+  """
+  return _run_batch(_np_yuv_to_rgb, _py_yuv_to_rgb, yuv, out, workers=workers, threads=threads)
+
+def rgb_to_xyz_batch(rgb, out=None, workers=None, threads=None):
+  """Convert an array of colors from sRGB to CIE XYZ.
+
+  This is the vectorized equivalent of rgb_to_xyz.
+
+  8 and 16 bits unsigned integer input (numpy uint8/uint16 arrays,
+  array.array('B'/'H'), bytes...) holds quantized levels in the [0...255]
+  or [0...65535] range; their gamma correction is read from a precomputed
+  table instead of being computed for each pixel.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1], or of 8/16 bits levels.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of XYZ values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in rgb_to_xyz_batch([(1, 0.5, 0)], out=out)]
+  [0.488941, 0.365682, 0.044814]
+  >>> [round(v, 6) for v in rgb_to_xyz_batch(bytearray((255, 128, 0)), out=out)]
+  [0.489592, 0.366983, 0.045031]
+
+  """
+  return _run_batch(_np_rgb_to_xyz, _py_rgb_to_xyz, rgb, out, pixels=True, workers=workers, threads=threads)
+
+def xyz_to_rgb_batch(xyz, out=None, workers=None, threads=None):
+  """Convert an array of colors from CIE XYZ coordinates to sRGB.
+
+  This is the vectorized equivalent of xyz_to_rgb.
+
+  When out is an 8 or 16 bits unsigned integer array, the result is written
+  as quantized levels in the [0...255] or [0...65535] range, clipped to the
+  legal gamut.
+
+  Parameters:
+    :xyz:
+      The (N, 3) array of XYZ values [0...1]
+    :out:
+      An optional (N, 3) float or 8/16 bits integer array, or any
+      writable buffer of interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of RGB values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in xyz_to_rgb_batch([(0.488941, 0.365682, 0.0448137)], out=out)]
+  [1.0, 0.5, 0.0]
+
+  """
+  return _run_batch(_np_xyz_to_rgb, _py_xyz_to_rgb, xyz, out, workers=workers, threads=threads)
+
+def xyz_to_lab_batch(xyz, wref=_DEFAULT_WREF, out=None, workers=None, threads=None):
+  """Convert an array of colors from CIE XYZ to CIE L*a*b*.
+
+  This is the vectorized equivalent of xyz_to_lab.
+
+  Parameters:
+    :xyz:
+      The (N, 3) array of XYZ values [0...1]
+    :wref:
+      The whitepoint reference, default is 2° D65.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of L*a*b* values, in the ranges of xyz_to_lab.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in xyz_to_lab_batch([(0.488941, 0.365682, 0.0448137)], out=out)]
+  [66.951807, 0.430841, 0.739692]
+
+  """
+  return _run_batch(_np_xyz_to_lab, _py_xyz_to_lab, xyz, out, args=(wref,), workers=workers, threads=threads)
+
+def lab_to_xyz_batch(lab, wref=_DEFAULT_WREF, out=None, workers=None, threads=None):
+  """Convert an array of colors from CIE L*a*b* to CIE 1931 XYZ.
+
+  This is the vectorized equivalent of lab_to_xyz.
+
+  Parameters:
+    :lab:
+      The (N, 3) array of L*a*b* values, in the ranges of lab_to_xyz.
+    :wref:
+      The whitepoint reference, default is 2° D65.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of XYZ values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in lab_to_xyz_batch([(66.9518, 0.43084, 0.739692)], out=out)]
+  [0.48894, 0.365682, 0.044814]
+
+  """
+  return _run_batch(_np_lab_to_xyz, _py_lab_to_xyz, lab, out, args=(wref,), workers=workers, threads=threads)
+
+def adapt_xyz_batch(xyz, srcWref=_DEFAULT_WREF, dstWref=WHITE_REFERENCE['std_D50'], method='bradford', out=None, workers=None, threads=None):
+  """Adapt an array of colors from a white reference to another one.
+
+  This is the vectorized equivalent of adapt_xyz: the whole array goes
+  through a single product by the cached adaptation matrix.
+
+  Parameters:
+    :xyz:
+      The (N, 3) array of XYZ values [0...1]
+    :srcWref:
+      The whitepoint reference the colors are seen under, default is 2° D65.
+    :dstWref:
+      The whitepoint reference to adapt the colors to, default is 2° D50.
+    :method:
+      The adaptation transform, one of ADAPTATION_METHODS.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result, which can be xyz
+      itself.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of the corresponding XYZ values under dstWref.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in adapt_xyz_batch([(0.488941, 0.365682, 0.0448137)], out=out)]
+  [0.518467, 0.37589, 0.034689]
+
+  """
+  matrix = adaptation_matrix(srcWref, dstWref, method)
+  return _run_batch(_np_adapt_xyz, _py_adapt_xyz, xyz, out, args=(matrix,), workers=workers, threads=threads)
+
+def cmyk_to_cmy_batch(cmyk, out=None, workers=None, threads=None):
+  """Convert an array of colors from CMYK coordinates to CMY.
+
+  This is the vectorized equivalent of cmyk_to_cmy.
+
+  Parameters:
+    :cmyk:
+      The (N, 4) array of CMYK values [0...1]
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of CMY values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> cmyk_to_cmy_batch([(1, 0.32, 0, 0.5)], out=out).tolist()
+  [1.0, 0.66, 0.5]
+
+  """
+  return _run_batch(_np_cmyk_to_cmy, _py_cmyk_to_cmy, cmyk, out, inWidth=4, workers=workers, threads=threads)
+
+def cmy_to_cmyk_batch(cmy, out=None, workers=None, threads=None):
+  """Convert an array of colors from CMY coordinates to CMYK.
+
+  This is the vectorized equivalent of cmy_to_cmyk.
+
+  Parameters:
+    :cmy:
+      The (N, 3) array of CMY values [0...1]
+    :out:
+      An optional (N, 4) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 4) array of CMYK values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 8)
+  >>> [round(v, 6) for v in cmy_to_cmyk_batch([(1, 0.66, 0.5), (1, 1, 1)], out=out)]
+  [1.0, 0.32, 0.0, 0.5, 0.0, 0.0, 0.0, 1.0]
+
+  """
+  return _run_batch(_np_cmy_to_cmyk, _py_cmy_to_cmyk, cmy, out, outWidth=4, workers=workers, threads=threads)
+
+def rgb_to_cmy_batch(rgb, out=None, workers=None, threads=None):
+  """Convert an array of colors from RGB coordinates to CMY.
+
+  This is the vectorized equivalent of rgb_to_cmy.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of CMY values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> rgb_to_cmy_batch([(1, 0.5, 0)], out=out).tolist()
+  [0.0, 0.5, 1.0]
+
+  """
+  return _run_batch(_np_rgb_to_cmy, _py_rgb_to_cmy, rgb, out, workers=workers, threads=threads)
+
+def cmy_to_rgb_batch(cmy, out=None, workers=None, threads=None):
+  """Convert an array of colors from CMY coordinates to RGB.
+
+  This is the vectorized equivalent of cmy_to_rgb.
+
+  Parameters:
+    :cmy:
+      The (N, 3) array of CMY values [0...1]
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of RGB values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> cmy_to_rgb_batch([(0, 0.5, 1)], out=out).tolist()
+  [1.0, 0.5, 0.0]
+
+  """
+  return _run_batch(_np_cmy_to_rgb, _py_cmy_to_rgb, cmy, out, workers=workers, threads=threads)
+
+def rgb_to_ints_batch(rgb, out=None, workers=None, threads=None):
+  """Convert an array of colors in the [0...1] range to ints in the [0...255] range.
+
+  This is the vectorized equivalent of rgb_to_ints.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :out:
+      An optional (N, 3) integer array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) integer array of RGB values [0...255]
+    Without numpy, a flat array.array('l') of the interleaved values.
+
+  >>> out = array.array('l', [0] * 3)
+  >>> rgb_to_ints_batch([(1, 0.5, 0)], out=out).tolist()
+  [255, 128, 0]
+
+  """
+  return _run_batch(_np_rgb_to_ints, _py_rgb_to_ints, rgb, out, dtype=int, workers=workers, threads=threads)
+
+def ints_to_rgb_batch(ints, out=None, workers=None, threads=None):
+  """Convert an array of ints in the [0...255] range to the [0...1] range.
+
+  This is the vectorized equivalent of ints_to_rgb.
+
+  Parameters:
+    :ints:
+      The (N, 3) array of RGB values [0...255]
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+    :workers:
+      The number of worker processes converting the colors in parallel.
+    :threads:
+      The number of threads, or an executor, converting chunks of the colors
+      concurrently.
+
+  Returns:
+    The (N, 3) array of RGB values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> [round(v, 6) for v in ints_to_rgb_batch([(255, 128, 0)], out=out)]
+  [1.0, 0.501961, 0.0]
+
+  """
+  return _run_batch(_np_ints_to_rgb, _py_ints_to_rgb, ints, out, workers=workers, threads=threads)
+
+def _html_hex_digits(tokens):
+  """Return the hex digits of a list of #rrggbb (or rrggbb) definitions.
+
+  Returns None if any definition has another form (#rgb, a color name...).
+
+  """
+  sharp = isinstance(tokens[0], bytes) and b'#' or '#'
+  try:
+    joined = sharp[:0].join(tokens)
+  except TypeError:
+    return None
+  n = len(tokens)
+  lengths = set(map(len, tokens))
+  if lengths=={7} and joined[::7]==sharp*n:
+    digits = joined.replace(sharp, sharp[:0])
+    # A stray '#' within a definition would be dropped with the leading ones.
+    if len(digits)==6*n:
+      return digits
+  elif lengths=={6} and sharp not in joined:
+    return joined
+  return None
+
+# On Python 2, str is bytes: it is split in tokens like the unicode text.
+_TEXT_TYPES = (str, type(u''))
+
+def _html_blob_digits(blob):
+  """Return the hex digits of a blob of '#rrggbb\\n' lines, None for others."""
+  if not blob.endswith(b'\n'):
+    blob += b'\n'
+  n = len(blob) // 8
+  if len(blob)!=8*n or blob[::8]!=b'#'*n or blob[7::8]!=b'\n'*n:
+    return None
+  digits = blob.translate(None, b'#\n')
+  if len(digits)!=6*n:
+    return None
+  return digits
+
+_INT_TO_FLOAT = [i / 255.0 for i in range(256)]
+
+def _unhexlify(digits):
+  if digits is None:
+    return None
+  try:
+    return binascii.unhexlify(digits)
+  except (TypeError, ValueError):  # binascii.Error is a ValueError
+    return None
+
+def _np_copy(values, out):
+  out[...] = values
+
+def _py_copy(src, out):
+  for i in range(len(src)):
+    out[i] = src[i]
+
+def html_to_rgb_batch(html, out=None):
+  """Convert a sequence of HTML colors to an array of RGB values.
+
+  This is the batch equivalent of html_to_rgb. When every definition is in
+  the #rrggbb (or rrggbb) form, their hex digits are decoded all at once
+  with binascii.unhexlify instead of one int(n, 16) per channel. The other
+  forms (#rgb, color names) are parsed one by one with html_to_rgb.
+
+  Parameters:
+    :html:
+      A sequence of HTML color definitions, or a bytes (or str) blob of
+      definitions separated by whitespace, e.g. one per line.
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+
+  Returns:
+    The (N, 3) array of RGB values [0...1]
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  Throws:
+    :ValueError:
+      If a definition is neither a known color name or a hexadecimal RGB
+      representation.
+
+  >>> out = array.array('d', [0.0] * 6)
+  >>> [round(v, 6) for v in html_to_rgb_batch(['#ff8000', '#0000ff'], out=out)]
+  [1.0, 0.501961, 0.0, 0.0, 0.0, 1.0]
+  >>> [round(v, 6) for v in html_to_rgb_batch(b'#ff8000\\nred\\n', out=out)]
+  [1.0, 0.501961, 0.0, 1.0, 0.0, 0.0]
+
+  """
+  raw = None
+  if isinstance(html, _TEXT_TYPES):
+    tokens = html.split()
+  elif isinstance(html, (bytes, bytearray, memoryview)):
+    html = memoryview(html).tobytes()
+    raw = _unhexlify(_html_blob_digits(html))
+    tokens = raw is None and html.split() or []
+  else:
+    tokens = list(html)
+  if tokens:
+    raw = _unhexlify(_html_hex_digits(tokens))
+
+  if raw is not None or not tokens:
+    raw = raw or b''
+    if np is not None:
+      return ints_to_rgb_batch(np.frombuffer(raw, np.uint8).reshape(-1, 3), out)
+    if out is None:
+      return array.array('d', map(_INT_TO_FLOAT.__getitem__, bytearray(raw)))
+    return ints_to_rgb_batch(array.array('B', raw), out)
+
+  rgb = [html_to_rgb(t.decode('ascii') if isinstance(t, bytes) else t) for t in tokens]
+  return _run_batch(_np_copy, _py_copy, rgb, out)
+
+def rgb_to_html_batch(rgb, blob=False):
+  """Convert an array of RGB values to HTML color definitions.
+
+  This is the batch equivalent of rgb_to_html: the hex digits of all the
+  colors are produced at once with binascii.hexlify instead of one '%02x'
+  format per channel.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :blob:
+      If True, return the definitions as a single bytes object, each one
+      followed by a newline.
+
+  Returns:
+    The list of '#rrggbb' definitions, or their bytes blob.
+
+  >>> rgb_to_html_batch([(1, 0.5, 0), (0, 0, 1)])
+  ['#ff8000', '#0000ff']
+  >>> rgb_to_html_batch([(1, 0.5, 0), (0, 0, 1)], blob=True)
+  b'#ff8000\\n#0000ff\\n'
+
+  """
+  if np is not None:
+    return _np_rgb_to_html(_as_components(rgb), blob)
+
+  src = _as_flat_components(rgb)
+  if len(src) % 3:
+    raise ValueError("values must hold 3 interleaved components per color")
+  ints = bytearray([min(max(int(round(v * 255)), 0), 255) for v in src])
+  hexa = binascii.hexlify(bytes(ints)).decode('ascii')
+  html = ['#' + hexa[i:i+6] for i in range(0, len(hexa), 6)]
+  if blob:
+    return ''.join([h + '\n' for h in html]).encode('ascii')
+  return html
+
+
+
+# --======================---------------------------------------------------
+# -- Batch color schemes --
+# --======================--
+#
+# The color schemes are computed on the HSL values by the same functions for
+# a single color (the Color.make_*_scheme methods) and for numpy arrays of
+# colors, so both give the same hues.
+
+def _wheel_hue(hue, wheel):
+  """Map a hue, or a numpy array of hues, through _RybWheel or _RgbWheel.
+
+  This is the piecewise linear interpolation of rgb_to_ryb and ryb_to_rgb.
+
+  """
+  if np is None or not isinstance(hue, np.ndarray):
+    d = hue % 15
+    i = int(hue / 15)
+    x0 = wheel[i]
+    x1 = wheel[i+1]
+    return x0 + (x1-x0) * d / 15
+  table = np.array(wheel + (360,), dtype=np.float64)
+  d = hue % 15
+  i = np.trunc(hue / 15).astype(np.intp)
+  x0 = table[i]
+  return x0 + (table[i+1] - x0) * d / 15
+
+def _complementary_hsl(h, s, l, mode):
+  if mode == 'ryb': h = _wheel_hue(h, _RybWheel)
+  h = (h+180)%360
+  if mode == 'ryb': h = _wheel_hue(h, _RgbWheel)
+  return [(h, s, l)]
+
+def _scheme_wrap(x, low, thres, plus):
+  if np is not None and isinstance(x, np.ndarray):
+    return np.where((x-low) < thres, x + plus, x - low)
+  if (x-low) < thres: return x + plus
+  else: return x-low
+
+def _monochrome_hsl(h, s, l):
+  s1 = _scheme_wrap(s, 0.3, 0.1, 0.3)
+  l1 = _scheme_wrap(l, 0.5, 0.2, 0.3)
+
+  s2 = s
+  l2 = _scheme_wrap(l, 0.2, 0.2, 0.6)
+
+  s3 = s1
+  if np is not None and isinstance(l, np.ndarray):
+    l3 = np.maximum(0.2, l + (1-l)*0.2)
+  else:
+    l3 = max(0.2, l + (1-l)*0.2)
+
+  s4 = s
+  l4 = _scheme_wrap(l, 0.5, 0.2, 0.3)
+  return [(h, s1, l1), (h, s2, l2), (h, s3, l3), (h, s4, l4)]
+
+def _triadic_hsl(h, s, l, angle, mode):
+  angle = min(angle, 120) / 2.0
+
+  if mode == 'ryb': h = _wheel_hue(h, _RybWheel)
+  h += 180
+  h1 = (h - angle) % 360
+  h2 = (h + angle) % 360
+  if mode == 'ryb':
+    h1 = _wheel_hue(h1, _RgbWheel)
+    h2 = _wheel_hue(h2, _RgbWheel)
+  return [(h1, s, l), (h2, s, l)]
+
+def _tetradic_hsl(h, s, l, angle, mode):
+  if mode == 'ryb': h = _wheel_hue(h, _RybWheel)
+  h1 = (h + 90 - angle) % 360
+  h2 = (h + 180) % 360
+  h3 = (h + 270 - angle) % 360
+  if mode == 'ryb':
+    h1 = _wheel_hue(h1, _RgbWheel)
+    h2 = _wheel_hue(h2, _RgbWheel)
+    h3 = _wheel_hue(h3, _RgbWheel)
+  return [(h1, s, l), (h2, s, l), (h3, s, l)]
+
+def _analogous_hsl(h, s, l, angle, mode):
+  if mode == 'ryb': h = _wheel_hue(h, _RybWheel)
+  h += 360
+  h1 = (h - angle) % 360
+  h2 = (h + angle) % 360
+  if mode == 'ryb':
+    h1 = _wheel_hue(h1, _RgbWheel)
+    h2 = _wheel_hue(h2, _RgbWheel)
+  return [(h1, s, l), (h2, s, l)]
+
+def _scheme_batch(rgb, out, scheme, *args):
+  """Apply a scheme function to an (N, 3) array of RGB values.
+
+  Returns the (N, k, 3) array of the RGB values of the k colors of each
+  scheme, (N, 3) when k is 1, or a flat array.array('d') without numpy.
+
+  """
+  if np is None:
+    result = array.array('d')
+    for rgb in _batch_rows(rgb):
+      for hsl in scheme(*(rgb_to_hsl(*rgb) + args)):
+        result.extend(hsl_to_rgb(*hsl))
+    return _py_batch_out(result, out)
+
+  hsl = rgb_to_hsl_batch(rgb)
+  colors = scheme(*((hsl[:, 0], hsl[:, 1], hsl[:, 2]) + args))
+  values = np.empty((len(hsl), len(colors), 3))
+  for i, (h, s, l) in enumerate(colors):
+    values[:, i, 0] = h
+    values[:, i, 1] = s
+    values[:, i, 2] = l
+  hsl_to_rgb_batch(values.reshape(-1, 3), values.reshape(-1, 3))
+  if len(colors)==1:
+    values = values.reshape(-1, 3)
+  if out is None:
+    return values
+  _np_batch_out(out, values.shape)[...] = values
+  return out
+
+def complementary_color_batch(rgb, mode='ryb', out=None):
+  """Return the complementary colors of an array of colors.
+
+  This is the vectorized equivalent of Color.complementary_color.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :mode:
+      Select which color wheel to use for the generation (ryb/rgb).
+    :out:
+      An optional (N, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+
+  Returns:
+    The (N, 3) array of the RGB values of the complementary colors.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 3)
+  >>> complementary_color_batch([(1, 0.5, 0)], mode='rgb', out=out).tolist()
+  [0.0, 0.5, 1.0]
+
+  """
+  return _scheme_batch(rgb, out, _complementary_hsl, mode)
+
+def monochrome_scheme_batch(rgb, out=None):
+  """Return the monochrome schemes of an array of colors.
+
+  This is the vectorized equivalent of Color.make_monochrome_scheme.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :out:
+      An optional (N, 4, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+
+  Returns:
+    The (N, 4, 3) array of the RGB values of the 4 colors of each scheme.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  """
+  return _scheme_batch(rgb, out, _monochrome_hsl)
+
+def triadic_scheme_batch(rgb, angle=120, mode='ryb', out=None):
+  """Return the triads, or split complementaries, of an array of colors.
+
+  This is the vectorized equivalent of Color.make_triadic_scheme.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :angle:
+      The angle between the hues of the created colors.
+      The default value makes a triad.
+    :mode:
+      Select which color wheel to use for the generation (ryb/rgb).
+    :out:
+      An optional (N, 2, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+
+  Returns:
+    The (N, 2, 3) array of the RGB values of the 2 colors of each scheme.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  >>> out = array.array('d', [0.0] * 6)
+  >>> rgb_to_hsl_batch(triadic_scheme_batch([(1, 0.5, 0)], mode='rgb', out=out), out=out).tolist()
+  [150.0, 1.0, 0.5, 270.0, 1.0, 0.5]
+
+  """
+  return _scheme_batch(rgb, out, _triadic_hsl, angle, mode)
+
+def tetradic_scheme_batch(rgb, angle=30, mode='ryb', out=None):
+  """Return the tetrads of an array of colors.
+
+  This is the vectorized equivalent of Color.make_tetradic_scheme.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :angle:
+      The angle to substract from the adjacent colors hues [-90...90].
+      You can use an angle of zero to generate a square tetrad.
+    :mode:
+      Select which color wheel to use for the generation (ryb/rgb).
+    :out:
+      An optional (N, 3, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+
+  Returns:
+    The (N, 3, 3) array of the RGB values of the 3 colors of each scheme.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  """
+  return _scheme_batch(rgb, out, _tetradic_hsl, angle, mode)
+
+def analogous_scheme_batch(rgb, angle=30, mode='ryb', out=None):
+  """Return the analogous colors of an array of colors.
+
+  This is the vectorized equivalent of Color.make_analogous_scheme.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :angle:
+      The angle between the hues of the created colors and the base colors.
+    :mode:
+      Select which color wheel to use for the generation (ryb/rgb).
+    :out:
+      An optional (N, 2, 3) float array, or any writable buffer of
+      interleaved components, receiving the result.
+
+  Returns:
+    The (N, 2, 3) array of the RGB values of the 2 colors of each scheme.
+    Without numpy, a flat array.array('d') of the interleaved values.
+
+  """
+  return _scheme_batch(rgb, out, _analogous_hsl, angle, mode)
+
+
+# --======================---------------------------------------------------
+# -- Nearest named colors --
+# --======================--
+
+# The largest share of the nodes of a k-d subtree allowed in one of its halves.
+_KD_BALANCE = 0.7
+
+class _KDTree(object):
+  """A k-d tree over a list of 3-D points (e.g. L*a*b* values).
+
+  The nodes are [x, y, z, point index, split axis, left, right, parent,
+  size, live size] lists, the sizes counting the nodes of their subtree; the
+  points are compared by squared euclidean distance. Points can be inserted
+  and removed without rebuilding the whole tree, like in a scapegoat tree:
+
+  - an insertion adds a leaf. When it lands deeper than log(n) / log(1 / 0.7),
+    the subtree of the lowest ancestor having a child with more than 70% of
+    its nodes is rebuilt balanced, so sorted insertions do not degrade into
+    a chain.
+  - a removal marks the node as deleted. The highest subtree left with half
+    of its nodes deleted is rebuilt without them.
+
+  """
+
+  def __init__(self, points=()):
+    self.points = [tuple(p) for p in points]
+    self.deleted = set()
+    self.__nodes = {}
+    self.root = self.__build(list(range(len(self.points))), 0, None)
+
+  def __len__(self):
+    return self.root[9] if self.root is not None else 0
+
+  def __build(self, indexes, axis, parent):
+    """Return a balanced subtree over the points at indexes, split on axis first."""
+    if not indexes:
+      return None
+    points = self.points
+    indexes.sort(key=lambda i: points[i][axis])
+    mid = len(indexes) // 2
+    index = indexes[mid]
+    x, y, z = points[index]
+    node = self.__nodes[index] = [x, y, z, index, axis, None, None, parent, len(indexes), len(indexes)]
+    axis = (axis + 1) % 3
+    node[5] = self.__build(indexes[:mid], axis, node)
+    node[6] = self.__build(indexes[mid+1:], axis, node)
+    return node
+
+  def __rebuild(self, node):
+    """Rebuild the subtree of node balanced, dropping its deleted points."""
+    points = self.points
+    deleted = self.deleted
+    indexes = []
+    stack = [node]
+    while stack:
+      child = stack.pop()
+      if child is None:
+        continue
+      index = child[3]
+      if index in deleted:
+        deleted.discard(index)
+        del self.__nodes[index]
+        points[index] = None
+      else:
+        indexes.append(index)
+      stack.append(child[5])
+      stack.append(child[6])
+    parent = node[7]
+    subtree = self.__build(indexes, node[4], parent)
+    if parent is None:
+      self.root = subtree
+      return
+    parent[5 if parent[5] is node else 6] = subtree
+    removed = node[8] - len(indexes)
+    while parent is not None:
+      parent[8] -= removed
+      parent = parent[7]
+
+  def insert(self, point):
+    """Add a point, return its index."""
+    x, y, z = point
+    p = (x, y, z)
+    index = len(self.points)
+    self.points.append(p)
+    node = self.__nodes[index] = [x, y, z, index, 0, None, None, None, 1, 1]
+    parent = self.root
+    if parent is None:
+      self.root = node
+      return index
+    depth = 0
+    while True:
+      parent[8] += 1
+      parent[9] += 1
+      depth += 1
+      axis = parent[4]
+      side = 5 if p[axis] < parent[axis] else 6
+      if parent[side] is None:
+        node[4] = (axis + 1) % 3
+        node[7] = parent
+        parent[side] = node
+        break
+      parent = parent[side]
+    if depth > -math.log(self.root[8]) / math.log(_KD_BALANCE):
+      while parent is not None and node[8] <= _KD_BALANCE * parent[8]:
+        node, parent = parent, parent[7]
+      if parent is not None:
+        self.__rebuild(parent)
+    return index
+
+  def remove(self, index):
+    """Remove the point at index."""
+    node = self.__nodes.get(index)
+    if node is None or index in self.deleted:
+      raise KeyError(index)
+    self.deleted.add(index)
+    unbalanced = None
+    while node is not None:
+      node[9] -= 1
+      if node[9] * 2 <= node[8]:
+        unbalanced = node
+      node = node[7]
+    if unbalanced is not None:
+      self.__rebuild(unbalanced)
+
+  def nearest(self, point):
+    """Return the (index, squared distance) of the point nearest to point."""
+    px, py, pz = point
+    p = (px, py, pz)
+    deleted = self.deleted
+    bestIndex, bestDist = None, float('inf')
+    stack = [(self.root, 0.0)]
+    while stack:
+      node, bound = stack.pop()
+      if node is None or not node[9] or bound >= bestDist:
+        continue
+      x, y, z, index, axis, left, right, parent, size, live = node
+      d = (px - x) * (px - x) + (py - y) * (py - y) + (pz - z) * (pz - z)
+      if d < bestDist and index not in deleted:
+        bestIndex, bestDist = index, d
+      diff = p[axis] - node[axis]
+      if diff < 0:
+        stack.append((right, diff * diff))
+        stack.append((left, 0.0))
+      else:
+        stack.append((left, diff * diff))
+        stack.append((right, 0.0))
+    return (bestIndex, bestDist)
+
+  def knearest(self, point, k):
+    """Return the (index, squared distance) of the k points nearest to point.
+
+    The results are sorted by increasing distance.
+
+    """
+    if k <= 0:
+      return []
+    px, py, pz = point
+    p = (px, py, pz)
+    deleted = self.deleted
+    heap = []  # (-distance, -index) of the k best points so far
+    worst = float('inf')
+    stack = [(self.root, 0.0)]
+    while stack:
+      node, bound = stack.pop()
+      # bound is the squared distance to the splitting plane of the parent.
+      if node is None or not node[9] or bound >= worst:
+        continue
+      x, y, z, index, axis, left, right, parent, size, live = node
+      d = (px - x) * (px - x) + (py - y) * (py - y) + (pz - z) * (pz - z)
+      if d < worst and index not in deleted:
+        if len(heap) < k:
+          heapq.heappush(heap, (-d, -index))
+        else:
+          heapq.heapreplace(heap, (-d, -index))
+        if len(heap)==k:
+          worst = -heap[0][0]
+      diff = p[axis] - node[axis]
+      if diff < 0:
+        stack.append((right, diff * diff))
+        stack.append((left, 0.0))
+      else:
+        stack.append((left, diff * diff))
+        stack.append((right, 0.0))
+    return sorted([(-i, -d) for d, i in heap], key=lambda hit: (hit[1], hit[0]))
+
+  def within(self, point, radius):
+    """Return the (index, squared distance) of the points within radius.
+
+    The results are sorted by increasing distance.
+
+    """
+    px, py, pz = point
+    p = (px, py, pz)
+    deleted = self.deleted
+    r2 = radius * radius
+    hits = []
+    stack = [self.root]
+    while stack:
+      node = stack.pop()
+      if node is None or not node[9]:
+        continue
+      x, y, z, index, axis, left, right, parent, size, live = node
+      d = (px - x) * (px - x) + (py - y) * (py - y) + (pz - z) * (pz - z)
+      if d <= r2 and index not in deleted:
+        hits.append((index, d))
+      diff = p[axis] - node[axis]
+      if diff < 0:
+        stack.append(left)
+        if diff * diff <= r2:
+          stack.append(right)
+      else:
+        stack.append(right)
+        if diff * diff <= r2:
+          stack.append(left)
+    hits.sort(key=lambda hit: (hit[1], hit[0]))
+    return hits
+
+# The a* and b* values of xyz_to_lab are 1/100 of the CIE ones; they are
+# scaled back before measuring color differences, so that the distances are
+# CIE delta E values rather than being dominated by the lightness.
+_LAB_AB_SCALE = 100.0
+
+def _cie_lab(l, a, b):
+  return (l, a * _LAB_AB_SCALE, b * _LAB_AB_SCALE)
+
+# The indexes of the named colors, by white reference, built on first use.
+_namedColorIndexes = {}
+_namedColorLock = threading.Lock()
+
+def _named_color_index(wref):
+  """Return the (names, Lab points, k-d tree) of NAMED_COLOR for wref."""
+  # The white reference is often given as a list, which is not hashable.
+  wref = tuple(wref)
+  index = _namedColorIndexes.get(wref)
+  if index is None:
+    with _namedColorLock:
+      index = _namedColorIndexes.get(wref)
+      if index is None:
+        names = []
+        seen = set()
+        for name in sorted(NAMED_COLOR):
+          # Keep a single name for the aliases (aqua/cyan, gray/grey...)
+          rgb = html_to_rgb(name)
+          if rgb not in seen:
+            seen.add(rgb)
+            names.append(name)
+        points = [_cie_lab(*xyz_to_lab(wref=wref, *rgb_to_xyz(*html_to_rgb(name)))) for name in names]
+        index = _namedColorIndexes[wref] = (names, points, _KDTree(points))
+  return index
+
+def nearest_names(rgb, wref=_DEFAULT_WREF):
+  """Return the names of the NAMED_COLOR entries nearest to an array of colors.
+
+  The distance is the euclidean distance in the L*a*b* space (CIE76 delta E),
+  with a* and b* scaled to the CIE range.
+  The L*a*b* values of the named colors are indexed once per white reference,
+  on first use; when aliases share a value (aqua and cyan...), the first one
+  in alphabetical order is returned.
+
+  Parameters:
+    :rgb:
+      The (N, 3) array of RGB values [0...1]
+    :wref:
+      The whitepoint reference, default is 2° D65.
+
+  Returns:
+    The list of the N color names.
+
+  >>> nearest_names([(1, 0.5, 0), (0.1, 0.1, 0.4)])
+  ['darkorange', 'midnightblue']
+
+  """
+  names, points, tree = _named_color_index(wref)
+  lab = xyz_to_lab_batch(rgb_to_xyz_batch(rgb), wref)
+  if np is None:
+    return [names[tree.nearest(_cie_lab(*lab[i:i+3]))[0]] for i in range(0, len(lab), 3)]
+  lab[:, 1:] *= _LAB_AB_SCALE
+
+  # For the ~140 named colors, a vectorized scan of chunks of colors beats
+  # walking the k-d tree once per color.
+  points = np.array(points)
+  result = []
+  for start in range(0, len(lab), _PIXEL_CHUNK // 64):
+    chunk = lab[start:start + (_PIXEL_CHUNK // 64)]
+    d = chunk[:, np.newaxis, :] - points[np.newaxis, :, :]
+    result.extend(np.einsum('ijk,ijk->ij', d, d).argmin(axis=1).tolist())
+  return [names[i] for i in result]
+
+# --===================-------------------------------------------------------
+# -- Color differences --
+# --===================--
+#
+# The delta E functions take L*a*b* values as returned by xyz_to_lab (a* and
+# b* in [-1...1]) and scale them to the CIE range, so their results are the
+# usual CIE delta E values (about 2.3 for a just noticeable difference).
+
+def delta_e76(lab1, lab2):
+  """Return the CIE76 color difference of two colors.
+
+  This is the euclidean distance of the colors in the L*a*b* space.
+
+  Parameters:
+    :lab1:
+      The L*a*b* values of the first color.
+    :lab2:
+      The L*a*b* values of the second color.
+
+  Returns:
+    The delta E value.
+
+  >>> '%g' % delta_e76((50, 0.025, 0), (50, 0, -0.025))
+  '3.53553'
+
+  """
+  l1, a1, b1 = _cie_lab(*lab1)
+  l2, a2, b2 = _cie_lab(*lab2)
+  return math.sqrt((l2 - l1) ** 2 + (a2 - a1) ** 2 + (b2 - b1) ** 2)
+
+def delta_e94(lab1, lab2, textiles=False):
+  """Return the CIE94 color difference of two colors.
+
+  The difference is not symmetric: the chroma of lab1, the reference
+  color, weights the chroma and hue differences.
+
+  Parameters:
+    :lab1:
+      The L*a*b* values of the reference color.
+    :lab2:
+      The L*a*b* values of the sample color.
+    :textiles:
+      If True, use the weights for textiles rather than for graphic arts.
+
+  Returns:
+    The delta E value.
+
+  >>> '%g' % delta_e94((50, 0.025, 0), (50, 0, -0.025))
+  '3.40774'
+
+  """
+  if textiles:
+    kL, k1, k2 = 2.0, 0.048, 0.014
+  else:
+    kL, k1, k2 = 1.0, 0.045, 0.015
+  l1, a1, b1 = _cie_lab(*lab1)
+  l2, a2, b2 = _cie_lab(*lab2)
+  c1 = math.sqrt(a1 * a1 + b1 * b1)
+  dC = c1 - math.sqrt(a2 * a2 + b2 * b2)
+  dH2 = max((a1 - a2) ** 2 + (b1 - b2) ** 2 - dC * dC, 0.0)
+  sC = 1.0 + k1 * c1
+  sH = 1.0 + k2 * c1
+  return math.sqrt(((l1 - l2) / kL) ** 2 + (dC / sC) ** 2 + dH2 / (sH * sH))
+
+_25_POW_7 = 25.0 ** 7
+
+def delta_e2000(lab1, lab2, kL=1.0, kC=1.0, kH=1.0):
+  """Return the CIEDE2000 color difference of two colors.
+
+  Parameters:
+    :lab1:
+      The L*a*b* values of the first color.
+    :lab2:
+      The L*a*b* values of the second color.
+    :kL:
+      The weight of the lightness difference.
+    :kC:
+      The weight of the chroma difference.
+    :kH:
+      The weight of the hue difference.
+
+  Returns:
+    The delta E value.
+
+  >>> '%g' % delta_e2000((50, 0.025, 0), (50, 0, -0.025))
+  '4.30648'
+
+  """
+  l1, a1, b1 = _cie_lab(*lab1)
+  l2, a2, b2 = _cie_lab(*lab2)
+  c7 = ((math.sqrt(a1 * a1 + b1 * b1) + math.sqrt(a2 * a2 + b2 * b2)) / 2) ** 7
+  g = 1.5 - 0.5 * math.sqrt(c7 / (c7 + _25_POW_7))
+  a1 *= g
+  a2 *= g
+  c1 = math.sqrt(a1 * a1 + b1 * b1)
+  c2 = math.sqrt(a2 * a2 + b2 * b2)
+  h1 = math.degrees(math.atan2(b1, a1)) % 360
+  h2 = math.degrees(math.atan2(b2, a2)) % 360
+
+  dh = h2 - h1
+  hMean = h1 + h2
+  if c1 * c2 == 0:
+    dh = 0.0
+  elif dh > 180:
+    dh -= 360
+    hMean += hMean < 360 and 360 or -360
+  elif dh < -180:
+    dh += 360
+    hMean += hMean < 360 and 360 or -360
+  if c1 * c2 != 0:
+    hMean /= 2
+  dH = 2 * math.sqrt(c1 * c2) * math.sin(math.radians(dh / 2))
+
+  lMean = (l1 + l2) / 2 - 50
+  cMean = (c1 + c2) / 2
+  t = (1 - 0.17 * math.cos(math.radians(hMean - 30))
+    + 0.24 * math.cos(math.radians(2 * hMean))
+    + 0.32 * math.cos(math.radians(3 * hMean + 6))
+    - 0.20 * math.cos(math.radians(4 * hMean - 63)))
+  c7 = cMean ** 7
+  rT = (-2 * math.sqrt(c7 / (c7 + _25_POW_7))
+    * math.sin(math.radians(60 * math.exp(-((hMean - 275) / 25) ** 2))))
+
+  dL = (l2 - l1) / (kL * (1 + 0.015 * lMean * lMean / math.sqrt(20 + lMean * lMean)))
+  dC = (c2 - c1) / (kC * (1 + 0.045 * cMean))
+  dH /= kH * (1 + 0.015 * cMean * t)
+  return math.sqrt(dL * dL + dC * dC + dH * dH + rT * dC * dH)
+
+def _np_lab_terms(lab):
+  """Return the (L, a, b, C) arrays of an array of L*a*b* values."""
+  lab = _as_components(lab, 3)
+  l = lab[:, 0]
+  a = lab[:, 1] * _LAB_AB_SCALE
+  b = lab[:, 2] * _LAB_AB_SCALE
+  return (l, a, b, np.hypot(a, b))
+
+def _np_delta_e76(t1, t2):
+  return np.sqrt((t2[0] - t1[0]) ** 2 + (t2[1] - t1[1]) ** 2 + (t2[2] - t1[2]) ** 2)
+
+def _np_delta_e94(t1, t2):
+  l1, a1, b1, c1 = t1
+  l2, a2, b2, c2 = t2
+  dC = c1 - c2
+  dH2 = np.maximum((a1 - a2) ** 2 + (b1 - b2) ** 2 - dC * dC, 0.0)
+  sH = 1.0 + 0.015 * c1
+  return np.sqrt((l1 - l2) ** 2 + (dC / (1.0 + 0.045 * c1)) ** 2 + dH2 / (sH * sH))
+
+def _np_delta_e2000(t1, t2):
+  l1, a1, b1, c1 = t1
+  l2, a2, b2, c2 = t2
+  c7 = ((c1 + c2) / 2) ** 7
+  g = 1.5 - 0.5 * np.sqrt(c7 / (c7 + _25_POW_7))
+  a1 = a1 * g
+  a2 = a2 * g
+  c1 = np.hypot(a1, b1)
+  c2 = np.hypot(a2, b2)
+  h1 = np.degrees(np.arctan2(b1, a1)) % 360
+  h2 = np.degrees(np.arctan2(b2, a2)) % 360
+
+  grey = (c1 * c2) == 0
+  dh = h2 - h1
+  hMean = h1 + h2
+  wrap = np.abs(dh) > 180
+  dh = np.where(wrap, dh - np.copysign(360.0, dh), dh)
+  hMean = np.where(wrap, hMean + np.where(hMean < 360, 360.0, -360.0), hMean)
+  dh = np.where(grey, 0.0, dh)
+  hMean = np.where(grey, hMean, hMean / 2)
+  dH = 2 * np.sqrt(c1 * c2) * np.sin(np.radians(dh / 2))
+
+  lMean = (l1 + l2) / 2 - 50
+  cMean = (c1 + c2) / 2
+  h = np.radians(hMean)
+  t = (1 - 0.17 * np.cos(h - math.radians(30)) + 0.24 * np.cos(2 * h)
+    + 0.32 * np.cos(3 * h + math.radians(6)) - 0.20 * np.cos(4 * h - math.radians(63)))
+  c7 = cMean ** 7
+  rT = (-2 * np.sqrt(c7 / (c7 + _25_POW_7))
+    * np.sin(np.radians(60 * np.exp(-((hMean - 275) / 25) ** 2))))
+
+  lMean *= lMean
+  dL = (l2 - l1) / (1 + 0.015 * lMean / np.sqrt(20 + lMean))
+  dC = (c2 - c1) / (1 + 0.045 * cMean)
+  dH /= 1 + 0.015 * cMean * t
+  return np.sqrt(dL * dL + dC * dC + dH * dH + rT * dC * dH)
+
+_DELTA_E = {
+  'cie76': (delta_e76, _np_delta_e76),
+  'cie94': (delta_e94, _np_delta_e94),
+  'ciede2000': (delta_e2000, _np_delta_e2000)}
+
+def _delta_e_method(method):
+  try:
+    return _DELTA_E[method]
+  except KeyError:
+    raise ValueError("unknown delta E method: %r" % (method,))
+
+def delta_e_batch(lab1, lab2, method='ciede2000', out=None):
+  """Return the color differences of two arrays of colors, pair by pair.
+
+  When lab2 holds a single color, it is compared with every color of lab1.
+  This is the vectorized equivalent of delta_e76, delta_e94 (graphic arts
+  weights) and delta_e2000 (unit weights).
+
+  Parameters:
+    :lab1:
+      The (N, 3) array of L*a*b* values of the first (reference) colors.
+    :lab2:
+      The (N, 3) array of L*a*b* values of the second colors, or the L*a*b*
+      values of a single color.
+    :method:
+      The color difference formula: 'cie76', 'cie94' or 'ciede2000'.
+    :out:
+      An optional (N,) float array, or any writable buffer, receiving the
+      result.
+
+  Returns:
+    The (N,) array of delta E values. Without numpy, an array.array('d').
+
+  >>> out = array.array('d', [0.0] * 2)
+  >>> [round(v, 4) for v in delta_e_batch([(50, 0.025, 0), (50, 0, 0)], (50, 0, -0.025), out=out)]
+  [4.3065, 2.3669]
+
+  """
+  scalar, kernel = _delta_e_method(method)
+  if np is None:
+    rows1 = _batch_rows(lab1)
+    rows2 = _batch_rows(lab2)
+    if len(rows2)==1:
+      rows2 = rows2 * len(rows1)
+    elif len(rows2) != len(rows1):
+      raise ValueError("lab1 and lab2 must hold the same number of colors")
+    result = array.array('d', [scalar(c1, c2) for c1, c2 in zip(rows1, rows2)])
+    return _py_batch_out(result, out)
+
+  t1 = _np_lab_terms(lab1)
+  t2 = _np_lab_terms(lab2)
+  if len(t2[0]) not in (1, len(t1[0])):
+    raise ValueError("lab1 and lab2 must hold the same number of colors")
+  result = kernel(t1, t2)
+  if out is None:
+    return result
+  _np_batch_out(out, result.shape)[...] = result
+  return out
+
+def delta_e_matrix(lab1, lab2=None, method='ciede2000', chunkSize=None):
+  """Compute the color differences of all the pairs of colors of two arrays.
+
+  The matrix is yielded in blocks of rows, so that the differences between
+  large arrays of colors can be streamed (reduced, thresholded or written out)
+  without allocating the whole matrix. The per-color terms of lab2 are
+  computed once and reused by every block.
+
+  Parameters:
+    :lab1:
+      The (N, 3) array of L*a*b* values of the colors of the rows.
+    :lab2:
+      The (M, 3) array of L*a*b* values of the colors of the columns, default
+      is lab1.
+    :method:
+      The color difference formula: 'cie76', 'cie94' or 'ciede2000'.
+    :chunkSize:
+      The number of rows of each block, default is as many as fit in about
+      65536 values.
+
+  Returns:
+    An iterator of (start, block) tuples, where block is the (rows, M) array
+    of the differences between lab1[start:start+rows] and lab2. Without
+    numpy, the blocks are lists of array.array('d') rows.
+
+  >>> lab = [(50, 0.025, 0), (50, 0, -0.025), (50, 0, 0)]
+  >>> [(start, [[round(float(d), 2) for d in row] for row in block]) for start, block in delta_e_matrix(lab, chunkSize=2)]
+  [(0, [[0.0, 4.31, 3.46], [4.31, 0.0, 2.37]]), (2, [[3.46, 2.37, 0.0]])]
+
+  """
+  scalar, kernel = _delta_e_method(method)
+  if np is None:
+    rows1 = _batch_rows(lab1)
+    rows2 = lab2 is None and rows1 or _batch_rows(lab2)
+    chunkSize = chunkSize or max(1, _PIXEL_CHUNK // max(len(rows2), 1))
+    for start in range(0, len(rows1), chunkSize):
+      yield (start, [array.array('d', [scalar(c1, c2) for c2 in rows2])
+        for c1 in rows1[start:start + chunkSize]])
+    return
+
+  t1 = _np_lab_terms(lab1)
+  t2 = lab2 is None and t1 or _np_lab_terms(lab2)
+  chunkSize = chunkSize or max(1, _PIXEL_CHUNK // max(len(t2[0]), 1))
+  t2 = tuple([v[np.newaxis, :] for v in t2])
+  for start in range(0, len(t1[0]), chunkSize):
+    yield (start, kernel(tuple([v[start:start + chunkSize, np.newaxis] for v in t1]), t2))
+
+class _ColorCache(object):
+  """The memoized values of a Color, see Color.enable_cache."""
+
+  __slots__ = ('values', 'hits', 'misses')
+
+  def __init__(self):
+    self.values = {}
+    self.hits = 0
+    self.misses = 0
+
+class Color(object):
+  """Hold a color value.
+
+  Example usage:
+
+  To create an instance of the grapefruit.Color from RGB values:
+
+    >>> import grapefruit
+    >>> r, g, b = 1, 0.5, 0
+    >>> col = grapefruit.Color.from_rgb(r, g, b)
+
+  To get the values of the color in another colorspace:
+
+    >>> h, s, v = col.hsv
+    >>> l, a, b = col.lab
+
+  To get the complementary of a color:
+
+    >>> compl = col.complementary_color(mode='rgb')
+    >>> compl.hsl
+    (210.0, 1.0, 0.5)
+
+  To directly convert RGB values to their HSL equivalent:
+
+    >>> h, s, l = rgb_to_hsl(r, g, b)
+
+  """
+
+  # Only one of the RGB and HSL values is stored when the color is set, the
+  # other one is derived on first access and cached until the next change.
+  __slots__ = ('__rgb', '__hsl', '__a', '__wref', '__cache', '__weakref__')
+
+  # --==================--------------------------------------------------------
+  # -- Creation methods --
+  # --==================--
+
+  @staticmethod
+  def from_rgb(r, g, b, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed RGB values.
+
+    Parameters:
+      :r:
+        The Red component value [0...1]
+      :g:
+        The Green component value [0...1]
+      :b:
+        The Blue component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_rgb(1.0, 0.5, 0.0)
+    Color(1.0, 0.5, 0.0, 1.0)
+    >>> Color.from_rgb(1.0, 0.5, 0.0, 0.5)
+    Color(1.0, 0.5, 0.0, 0.5)
+
+    """
+    return Color((r, g, b), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_hsl(h, s, l, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed HSL values.
+
+    Parameters:
+      :h:
+        The Hue component value [0...1]
+      :s:
+        The Saturation component value [0...1]
+      :l:
+        The Lightness component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 1, 0.5)
+    Color(1.0, 0.5, 0.0, 1.0)
+    >>> Color.from_hsl(30, 1, 0.5, 0.5)
+    Color(1.0, 0.5, 0.0, 0.5)
+
+    """
+    return Color((h, s, l), 'hsl', alpha, wref)
+
+  @staticmethod
+  def from_hsv(h, s, v, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed HSV values.
+
+    Parameters:
+      :h:
+        The Hus component value [0...1]
+      :s:
+        The Saturation component value [0...1]
+      :v:
+        The Value component [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsv(30, 1, 1)
+    Color(1.0, 0.5, 0.0, 1.0)
+    >>> Color.from_hsv(30, 1, 1, 0.5)
+    Color(1.0, 0.5, 0.0, 0.5)
+
+    """
+    h2, s, l = rgb_to_hsl(*hsv_to_rgb(h, s, v))
+    return Color((h, s, l), 'hsl', alpha, wref)
+
+  @staticmethod
+  def from_yiq(y, i, q, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed YIQ values.
+
+    Parameters:
+      :y:
+        The Y component value [0...1]
+      :i:
+        The I component value [0...1]
+      :q:
+        The Q component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_yiq(0.5922, 0.45885,-0.05)
+    Color(0.999902, 0.499955, -6.7e-05, 1.0)
+    >>> Color.from_yiq(0.5922, 0.45885,-0.05, 0.5)
+    Color(0.999902, 0.499955, -6.7e-05, 0.5)
+
+    """
+    return Color(yiq_to_rgb(y, i, q), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_yuv(y, u, v, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed YUV values.
+
+    Parameters:
+      :y:
+        The Y component value [0...1]
+      :u:
+        The U component value [-0.436...0.436]
+      :v:
+        The V component value [-0.615...0.615]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_yuv(0.5925, -0.2916, 0.3575)
+    Color(0.999989, 0.500015, -6.3e-05, 1.0)
+    >>> Color.from_yuv(0.5925, -0.2916, 0.3575, 0.5)
+    Color(0.999989, 0.500015, -6.3e-05, 0.5)
+
+    """
+    return Color(yuv_to_rgb(y, u, v), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_xyz(x, y, z, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed CIE-XYZ values.
+
+    Parameters:
+      :x:
+        The Red component value [0...1]
+      :y:
+        The Green component value [0...1]
+      :z:
+        The Blue component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_xyz(0.488941, 0.365682, 0.0448137)
+    Color(1.0, 0.5, 0.0, 1.0)
+    >>> Color.from_xyz(0.488941, 0.365682, 0.0448137, 0.5)
+    Color(1.0, 0.5, 0.0, 0.5)
+
+    """
+    return Color(xyz_to_rgb(x, y, z), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_lab(l, a, b, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed CIE-LAB values.
+
+    Parameters:
+      :l:
+        The L component [0...100]
+      :a:
+        The a component [-1...1]
+      :b:
+        The a component [-1...1]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_lab(66.951823, 0.43084105, 0.73969231)
+    Color(1.0, 0.5, -0.0, 1.0)
+    >>> Color.from_lab(66.951823, 0.41165967, 0.67282012, wref=WHITE_REFERENCE['std_D50'])
+    Color(1.0, 0.5, -0.0, 1.0)
+    >>> Color.from_lab(66.951823, 0.43084105, 0.73969231, 0.5)
+    Color(1.0, 0.5, -0.0, 0.5)
+    >>> Color.from_lab(66.951823, 0.41165967, 0.67282012, 0.5, WHITE_REFERENCE['std_D50'])
+    Color(1.0, 0.5, -0.0, 0.5)
+
+    """
+    return Color(xyz_to_rgb(*lab_to_xyz(l, a, b, wref)), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_cmy(c, m, y, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed CMY values.
+
+    Parameters:
+      :c:
+        The Cyan component value [0...1]
+      :m:
+        The Magenta component value [0...1]
+      :y:
+        The Yellow component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_cmy(0, 0.5, 1)
+    Color(1.0, 0.5, 0.0, 1.0)
+    >>> Color.from_cmy(0, 0.5, 1, 0.5)
+    Color(1.0, 0.5, 0.0, 0.5)
+
+    """
+    return Color(cmy_to_rgb(c, m, y), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_cmyk(c, m, y, k, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed CMYK values.
+
+    Parameters:
+      :c:
+        The Cyan component value [0...1]
+      :m:
+        The Magenta component value [0...1]
+      :y:
+        The Yellow component value [0...1]
+      :k:
+        The Black component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_cmyk(1, 0.32, 0, 0.5)
+    Color(0.0, 0.34, 0.5, 1.0)
+    >>> Color.from_cmyk(1, 0.32, 0, 0.5, 0.5)
+    Color(0.0, 0.34, 0.5, 0.5)
+
+    """
+    return Color(cmy_to_rgb(*cmyk_to_cmy(c, m, y, k)), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_html(html, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed HTML color definition.
+
+    Parameters:
+      :html:
+        The HTML definition of the color (#RRGGBB or #RGB or a color name).
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_html('#ff8000')
+    Color(1.0, 0.501961, 0.0, 1.0)
+    >>> Color.from_html('ff8000')
+    Color(1.0, 0.501961, 0.0, 1.0)
+    >>> Color.from_html('#f60')
+    Color(1.0, 0.4, 0.0, 1.0)
+    >>> Color.from_html('f60')
+    Color(1.0, 0.4, 0.0, 1.0)
+    >>> Color.from_html('lemonchiffon')
+    Color(1.0, 0.980392, 0.803922, 1.0)
+    >>> Color.from_html('#ff8000', 0.5)
+    Color(1.0, 0.501961, 0.0, 0.5)
+
+    """
+    return Color(html_to_rgb(html), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_pil(pil, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed PIL color.
+
+    Parameters:
+      :pil:
+        A PIL compatible color representation (0xBBGGRR)
+      :alpha:
+        The color transparency [0...1], default is opaque
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_pil(0x0080ff)
+    Color(1.0, 0.501961, 0.0, 1.0)
+    >>> Color.from_pil(0x0080ff, 0.5)
+    Color(1.0, 0.501961, 0.0, 0.5)
+
+    """
+    return Color(pil_to_rgb(pil), 'rgb', alpha, wref)
+
+
+  def __init__(self, values, mode='rgb', alpha=1.0, wref=_DEFAULT_WREF):
+    """Instantiate a new grapefruit.Color object.
+
+    Parameters:
+      :values:
+        The values of this color, in the specified representation.
+      :mode:
+        The representation mode used for values.
+      :alpha:
+        the alpha value (transparency) of this color.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    """
+    if not(isinstance(values, tuple)):
+      raise TypeError("values must be a tuple")
+
+    self.__cache = None
+    if mode=='rgb':
+      self.__set_rgb(tuple([float(v) for v in values]))
+    elif mode=='hsl':
+      self.__set_hsl(tuple([float(v) for v in values]))
+    else:
+      raise ValueError("Invalid color mode: " + mode)
+
+    self.__a = alpha
+    self.__wref = wref
+
+  def __set_rgb(self, rgb):
+    self.__rgb = rgb
+    self.__hsl = None
+    if self.__cache is not None:
+      self.__cache.values.clear()
+
+  def __set_hsl(self, hsl):
+    self.__hsl = hsl
+    self.__rgb = None
+    if self.__cache is not None:
+      self.__cache.values.clear()
+
+  def __get_rgb(self):
+    rgb = self.__rgb
+    if rgb is None:
+      rgb = self.__rgb = hsl_to_rgb(*self.__hsl)
+    return rgb
+
+  def __get_hsl(self):
+    hsl = self.__hsl
+    if hsl is None:
+      hsl = self.__hsl = rgb_to_hsl(*self.__rgb)
+    return hsl
+
+  def __derived(self, key, func):
+    cache = self.__cache
+    if cache is None:
+      return func(self)
+    values = cache.values
+    if key in values:
+      cache.hits += 1
+      return values[key]
+    cache.misses += 1
+    value = values[key] = func(self)
+    return value
+
+  def __reduce__(self):
+    # Without __dict__ the default pickling fails with the protocols 0 and 1.
+    if self.__rgb is None:
+      return (self.__class__, (self.__hsl, 'hsl', self.__a, self.__wref))
+    return (self.__class__, (self.__rgb, 'rgb', self.__a, self.__wref))
+
+  # --=====================-----------------------------------------------------
+  # -- Convenience methods --
+  # --=====================--
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __eq__(self, other):
+    try:
+      if isinstance(other, Color):
+        return (self.__get_rgb()==other.__get_rgb()) and (self.__a==other.__a) and (self.__wref==other.__wref)
+      if len(other) != 4:
+        return False
+      return list(self.__get_rgb() + (self.__a,)) == list(other)
+    except TypeError:
+      return False
+    except AttributeError:
+      return False
+
+  def __repr__(self):
+    return "Color({}, {}, {}, {})".format(*[round(v, 6) for v in (self.__get_rgb() + (self.__a,))])
+
+  def __str__(self):
+    """A string representation of this grapefruit.Color instance.
+
+    Returns:
+      The RGBA representation of this grapefruit.Color instance.
+
+    """
+    return "({}, {}, {}, {})".format(*[round(v, 6) for v in (self.__get_rgb() + (self.__a,))])
+
+  if sys.version_info[0] < 3:
+    def __unicode__(self):
+      """A unicode string representation of this grapefruit.Color instance.
+
+      Returns:
+        The RGBA representation of this grapefruit.Color instance.
+
+      """
+      return unicode("({}, {}, {}, {})".format(*[round(v, 6) for v in (self.__get_rgb() + (self.__a,))]))
+
+  def __iter__(self):
+    return iter(self.__get_rgb() + (self.__a,))
+
+  def __len__(self):
+    return 4
+
+  # --============--------------------------------------------------------------
+  # -- Properties --
+  # --============--
+
+  @property
+  def is_legal(self):
+    """Boolean indicating whether the color is within the legal gamut."""
+    return all(0.0 <= v <= 1.0 for v in self)
+
+  @property
+  def alpha(self):
+    """The transparency of this color. 0.0 is transparent and 1.0 is fully opaque."""
+    return self.__a
+  @alpha.setter
+  def alpha(self, value):
+    self.__a = value
+
+  @property
+  def white_ref(self):
+    """the white reference point of this color."""
+    return self.__wref
+  @white_ref.setter
+  def white_ref(self, value):
+    self.__wref = value
+    if self.__cache is not None:
+      self.__cache.values.clear()
+
+
+  @property
+  def rgb(self):
+    """The RGB values of this Color."""
+    return self.__get_rgb()
+  @rgb.setter
+  def rgb(self, value):
+    self.__set_rgb(tuple([float(v) for v in value]))
+
+  @property
+  def rgba(self):
+    """The RGBA values of this Color."""
+    return (self.__get_rgb() + (self.__a,))
+  @rgba.setter
+  def rgba(self, value):
+    self.__set_rgb(tuple([float(v) for v in value[:3]]))
+    self.__a = float(value[3])
+
+  @property
+  def red(self):
+    return self.__get_rgb()[0]
+  @red.setter
+  def red(self, value):
+    r, g, b = self.__get_rgb()
+    self.__set_rgb((float(value), g, b))
+
+  @property
+  def green(self):
+    return self.__get_rgb()[1]
+  @green.setter
+  def green(self, value):
+    r, g, b = self.__get_rgb()
+    self.__set_rgb((r, float(value), b))
+
+  @property
+  def blue(self):
+    return self.__get_rgb()[2]
+  @blue.setter
+  def blue(self, value):
+    r, g, b = self.__get_rgb()
+    self.__set_rgb((r, g, float(value)))
+
+
+  @property
+  def hsl(self):
+    """The HSL values of this Color."""
+    return self.__get_hsl()
+  @hsl.setter
+  def hsl(self, value):
+    self.__set_hsl(tuple([float(v) for v in value]))
+
+  @property
+  def hsl_hue(self):
+    """The hue of this color."""
+    return self.__get_hsl()[0]
+  @hsl_hue.setter
+  def hsl_hue(self, value):
+    h, s, l = self.__get_hsl()
+    self.__set_hsl((float(value), s, l))
+
+  @property
+  def hsv(self):
+    """The HSV values of this Color."""
+    return self.__derived('hsv', lambda c: rgb_to_hsv(*c.__get_rgb()))
+  @hsv.setter
+  def hsv(self, value):
+    self.__set_rgb(hsv_to_rgb(*value))
+
+  @property
+  def yiq(self):
+    """The YIQ values of this Color."""
+    return self.__derived('yiq', lambda c: rgb_to_yiq(*c.__get_rgb()))
+  @yiq.setter
+  def yiq(self, value):
+    self.__set_rgb(yiq_to_rgb(*value))
+
+  @property
+  def yuv(self):
+    """The YUV values of this Color."""
+    return self.__derived('yuv', lambda c: rgb_to_yuv(*c.__get_rgb()))
+  @yuv.setter
+  def yuv(self, value):
+    self.__set_rgb(yuv_to_rgb(*value))
+
+  @property
+  def xyz(self):
+    """The CIE-XYZ values of this Color."""
+    return self.__derived('xyz', lambda c: rgb_to_xyz(*c.__get_rgb()))
+  @xyz.setter
+  def xyz(self, value):
+    self.__set_rgb(xyz_to_rgb(*value))
+
+  @property
+  def lab(self):
+    """The CIE-LAB values of this Color."""
+    return self.__derived('lab', lambda c: xyz_to_lab(wref=c.__wref, *c.xyz))
+  @lab.setter
+  def lab(self, value):
+    self.__set_rgb(xyz_to_rgb(lab_to_xyz(*value)))
+
+  @property
+  def cmy(self):
+    """The CMY values of this Color."""
+    return self.__derived('cmy', lambda c: rgb_to_cmy(*c.__get_rgb()))
+  @cmy.setter
+  def cmy(self, value):
+    self.__set_rgb(cmy_to_rgb(*value))
+
+  @property
+  def cmyk(self):
+    """The CMYK values of this Color."""
+    return self.__derived('cmyk', lambda c: cmy_to_cmyk(*c.cmy))
+  @cmyk.setter
+  def cmyk(self, value):
+    self.__set_rgb(cmy_to_rgb(*cmyk_to_cmy(*value)))
+
+  @property
+  def ints(self):
+    """This Color as a tuple of integers in the range [0...255]"""
+    return self.__derived('ints', lambda c: rgb_to_ints(*c.__get_rgb()))
+  @ints.setter
+  def ints(self, value):
+    self.__set_rgb(ints_to_rgb(*value))
+
+  @property
+  def html(self):
+    """This Color as an HTML color definition."""
+    return self.__derived('html', lambda c: rgb_to_html(*c.__get_rgb()))
+  @html.setter
+  def html(self, value):
+    self.__set_rgb(html_to_rgb(value))
+
+  @property
+  def pil(self):
+    """This Color as a PIL compatible value."""
+    return self.__derived('pil', lambda c: rgb_to_pil(*c.__get_rgb()))
+  @pil.setter
+  def pil(self, value):
+    self.__set_rgb(pil_to_rgb(value))
+
+  @property
+  def websafe(self):
+    """The web safe color nearest to this one (RGB)."""
+    return self.__derived('websafe', lambda c: rgb_to_websafe(*c.__get_rgb()))
+
+  @property
+  def greyscale(self):
+    """The greyscale equivalent to this color (RGB)."""
+    return self.__derived('greyscale', lambda c: rgb_to_greyscale(*c.__get_rgb()))
+
+  def nearest_name(self):
+    """Return the name of the NAMED_COLOR entry nearest to this color.
+
+    The distance is the CIE76 delta E, see nearest_names.
+
+    Returns:
+      The name of the color, as used by from_html.
+
+    >>> Color.from_rgb(1, 0.5, 0).nearest_name()
+    'darkorange'
+
+    """
+    names, points, tree = _named_color_index(self.__wref)
+    return names[tree.nearest(_cie_lab(*self.lab))[0]]
+
+  def delta_e(self, other, method='ciede2000'):
+    """Return the color difference between this color and another one.
+
+    The L*a*b* values of both colors use the white reference of this one.
+
+    Parameters:
+      :other:
+        The grapefruit.Color to compare with.
+      :method:
+        The color difference formula: 'cie76', 'cie94' or 'ciede2000'.
+
+    Returns:
+      The delta E value, see delta_e76, delta_e94 and delta_e2000.
+
+    >>> '%.4f' % Color.from_html('#ff8000').delta_e(Color.from_html('#ff8800'))
+    '2.5735'
+
+    """
+    scalar = _delta_e_method(method)[0]
+    return scalar(self.lab, xyz_to_lab(wref=self.__wref, *other.xyz))
+
+  def enable_cache(self):
+    """Memoize the values of this color in the other color spaces.
+
+    Once enabled, the derived values (hsv, xyz, lab, cmyk, html...) are
+    computed on the first access then returned from a cache, until a setter
+    changes the color or its white reference. The new instances created from
+    this one (darker, with_alpha...) do not inherit the cache.
+
+    >>> col = Color.from_rgb(1.0, 0.5, 0.0)
+    >>> col.enable_cache()
+    >>> l, a, b = col.lab
+    >>> l, a, b = col.lab
+    >>> col.cache_stats
+    (1, 2)
+
+    """
+    if self.__cache is None:
+      self.__cache = _ColorCache()
+
+  def disable_cache(self):
+    """Stop memoizing the values of this color and drop the cached ones."""
+    self.__cache = None
+
+  @property
+  def cache_stats(self):
+    """The (hits, misses) counts of the cache, (0, 0) if it is disabled."""
+    cache = self.__cache
+    if cache is None:
+      return (0, 0)
+    return (cache.hits, cache.misses)
+
+  def with_alpha(self, alpha):
+    """Create a new instance based on this one with a new alpha value.
+
+    Parameters:
+      :alpha:
+        The transparency of the new color [0...1].
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_rgb(1.0, 0.5, 0.0, 1.0).with_alpha(0.5)
+    Color(1.0, 0.5, 0.0, 0.5)
+
+    """
+    return Color(self.__get_rgb(), 'rgb', alpha, self.__wref)
+
+  def with_white_ref(self, wref, labAsRef=False):
+    """Create a new instance based on this one with a new white reference.
+
+    Parameters:
+      :wref:
+        The whitepoint reference.
+      :labAsRef:
+        If True, the L*a*b* values of the current instance are used as reference
+        for the new color; otherwise, the RGB values are used as reference.
+
+    Returns:
+      A grapefruit.Color instance.
+
+
+    >>> c = Color.from_rgb(1.0, 0.5, 0.0, 1.0, WHITE_REFERENCE['std_D65'])
+
+    >>> c2 = c.with_white_ref(WHITE_REFERENCE['sup_D50'])
+    >>> c2.rgb
+    (1.0, 0.5, 0.0)
+    >>> '(%g, %g, %g)' % c2.white_ref
+    '(0.967206, 1, 0.81428)'
+
+    >>> c2 = c.with_white_ref(WHITE_REFERENCE['sup_D50'], labAsRef=True)
+    >>> '(%g, %g, %g)' % c2.rgb
+    '(1.01463, 0.490341, -0.148133)'
+    >>> '(%g, %g, %g)' % c2.white_ref
+    '(0.967206, 1, 0.81428)'
+    >>> '(%g, %g, %g)' % c.lab
+    '(66.9518, 0.430841, 0.739692)'
+    >>> '(%g, %g, %g)' % c2.lab
+    '(66.9518, 0.430841, 0.739693)'
+
+    """
+    if labAsRef:
+      l, a, b = self.lab
+      return Color.from_lab(l, a, b, self.__a, wref)
+    else:
+      return Color(self.__get_rgb(), 'rgb', self.__a, wref)
+
+  def adapt(self, wref, method='bradford'):
+    """Create a new instance based on this one, adapted to a new white reference.
+
+    Unlike with_white_ref, the XYZ values are transformed by a chromatic
+    adaptation: the new color is the one which, seen under wref, looks like
+    this one under its own white reference.
+
+    Parameters:
+      :wref:
+        The whitepoint reference to adapt the color to.
+      :method:
+        The adaptation transform, one of ADAPTATION_METHODS.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> c = Color.from_rgb(1.0, 0.5, 0.0, 1.0, WHITE_REFERENCE['std_D65'])
+    >>> c2 = c.adapt(WHITE_REFERENCE['std_D50'])
+    >>> '(%g, %g, %g)' % c2.rgb
+    '(1.03649, 0.489177, -0.143929)'
+    >>> '(%g, %g, %g)' % c2.white_ref
+    '(0.964212, 1, 0.825188)'
+    >>> c2.adapt(WHITE_REFERENCE['std_D65']).html
+    '#ff8000'
+
+    """
+    xyz = adapt_xyz(self.xyz, srcWref=self.__wref, dstWref=wref, method=method)
+    return Color(xyz_to_rgb(xyz), 'rgb', self.__a, wref)
+
+  def with_hue(self, hue):
+    """Create a new instance based on this one with a new hue.
+
+    Parameters:
+      :hue:
+        The hue of the new color [0...360].
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 1, 0.5).with_hue(60)
+    Color(1.0, 1.0, 0.0, 1.0)
+    >>> Color.from_hsl(30, 1, 0.5).with_hue(60).hsl
+    (60.0, 1.0, 0.5)
+
+    """
+    h, s, l = self.__get_hsl()
+    return Color((hue, s, l), 'hsl', self.__a, self.__wref)
+
+  def with_saturation(self, saturation):
+    """Create a new instance based on this one with a new saturation value.
+
+    .. note::
+
+       The saturation is defined for the HSL mode.
+
+    Parameters:
+      :saturation:
+        The saturation of the new color [0...1].
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 1, 0.5).with_saturation(0.5)
+    Color(0.75, 0.5, 0.25, 1.0)
+    >>> Color.from_hsl(30, 1, 0.5).with_saturation(0.5).hsl
+    (30.0, 0.5, 0.5)
+
+    """
+    h, s, l = self.__get_hsl()
+    return Color((h, saturation, l), 'hsl', self.__a, self.__wref)
+
+  def with_lightness(self, lightness):
+    """Create a new instance based on this one with a new lightness value.
+
+    Parameters:
+      :lightness:
+        The lightness of the new color [0...1].
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 1, 0.5).with_lightness(0.25)
+    Color(0.5, 0.25, 0.0, 1.0)
+    >>> Color.from_hsl(30, 1, 0.5).with_lightness(0.25).hsl
+    (30.0, 1.0, 0.25)
+
+    """
+    h, s, l = self.__get_hsl()
+    return Color((h, s, lightness), 'hsl', self.__a, self.__wref)
+
+  def darker(self, level):
+    """Create a new instance based on this one but darker.
+
+    Parameters:
+      :level:
+        The amount by which the color should be darkened to produce
+        the new one [0...1].
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 1, 0.5).darker(0.25)
+    Color(0.5, 0.25, 0.0, 1.0)
+    >>> Color.from_hsl(30, 1, 0.5).darker(0.25).hsl
+    (30.0, 1.0, 0.25)
+
+    """
+    h, s, l = self.__get_hsl()
+    return Color((h, s, max(l - level, 0)), 'hsl', self.__a, self.__wref)
+
+  def lighter(self, level):
+    """Create a new instance based on this one but lighter.
+
+    Parameters:
+      :level:
+        The amount by which the color should be lightened to produce
+        the new one [0...1].
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 1, 0.5).lighter(0.25)
+    Color(1.0, 0.75, 0.5, 1.0)
+    >>> Color.from_hsl(30, 1, 0.5).lighter(0.25).hsl
+    (30.0, 1.0, 0.75)
+
+    """
+    h, s, l = self.__get_hsl()
+    return Color((h, s, min(l + level, 1)), 'hsl', self.__a, self.__wref)
+
+  def saturate(self, level):
+    """Create a new instance based on this one but more saturated.
+
+    Parameters:
+      :level:
+        The amount by which the color should be saturated to produce
+        the new one [0...1].
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 0.5, 0.5).saturate(0.25)
+    Color(0.875, 0.5, 0.125, 1.0)
+    >>> Color.from_hsl(30, 0.5, 0.5).saturate(0.25).hsl
+    (30.0, 0.75, 0.5)
+
+    """
+    h, s, l = self.__get_hsl()
+    return Color((h, min(s + level, 1), l), 'hsl', self.__a, self.__wref)
+
+  def desaturate(self, level):
+    """Create a new instance based on this one but less saturated.
+
+    Parameters:
+      :level:
+        The amount by which the color should be desaturated to produce
+        the new one [0...1].
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 0.5, 0.5).desaturate(0.25)
+    Color(0.625, 0.5, 0.375, 1.0)
+    >>> Color.from_hsl(30, 0.5, 0.5).desaturate(0.25).hsl
+    (30.0, 0.25, 0.5)
+
+    """
+    h, s, l = self.__get_hsl()
+    return Color((h, max(s - level, 0), l), 'hsl', self.__a, self.__wref)
+
+  def nearest_legal(self):
+    """Create a new instance that is the nearest legal color to this one.
+
+    >>> Color.from_rgb(2.0, 0.0, 3.0).nearest_legal()
+    Color(1.0, 0.0, 1.0, 1.0)
+    """
+    return Color.from_rgb(*[max(min(v, 1.0), 0.0) for v in self])
+
+  def websafe_dither(self):
+    """Return the two websafe colors nearest to this one.
+
+    Returns:
+      A tuple of two grapefruit.Color instances which are the two
+      web safe colors closest this one.
+
+    >>> c = Color.from_rgb(1.0, 0.45, 0.0)
+    >>> c1, c2 = c.websafe_dither()
+    >>> c1
+    Color(1.0, 0.4, 0.0, 1.0)
+    >>> c2
+    Color(1.0, 0.6, 0.0, 1.0)
+
+    """
+    return (
+      Color(rgb_to_websafe(*self.__get_rgb()), 'rgb', self.__a, self.__wref),
+      Color(rgb_to_websafe(alt=True, *self.__get_rgb()), 'rgb', self.__a, self.__wref))
+
+  def complementary_color(self, mode='ryb'):
+    """Create a new instance which is the complementary color of this one.
+
+    Parameters:
+      :mode:
+        Select which color wheel to use for the generation (ryb/rgb).
+
+
+    Returns:
+      A grapefruit.Color instance.
+
+    >>> Color.from_hsl(30, 1, 0.5).complementary_color(mode='rgb')
+    Color(0.0, 0.5, 1.0, 1.0)
+    >>> Color.from_hsl(30, 1, 0.5).complementary_color(mode='rgb').hsl
+    (210.0, 1.0, 0.5)
+
+    """
+    hsl = _complementary_hsl(*(self.__get_hsl() + (mode,)))[0]
+    return Color(hsl, 'hsl', self.__a, self.__wref)
+
+  def make_gradient(self, target, steps=100):
+    """Create a list with the gradient colors between this and the other color.
+
+    The colors are interpolated in sRGB, without clipping the values out of
+    the [0...1] range, see Gradient for the other spaces and the gradients
+    with more stops.
+
+    Parameters:
+      :target:
+        The grapefruit.Color at the other end of the gradient.
+      :steps:
+        The number of gradients steps to create.
+
+
+    Returns:
+      A list of grapefruit.Color instances.
+
+    >>> c1 = Color.from_rgb(1.0, 0.0, 0.0, alpha=1)
+    >>> c2 = Color.from_rgb(0.0, 1.0, 0.0, alpha=0)
+    >>> c1.make_gradient(c2, 3)
+    [Color(0.75, 0.25, 0.0, 0.75), Color(0.5, 0.5, 0.0, 0.5), Color(0.25, 0.75, 0.0, 0.25)]
+
+    """
+    gradient = Gradient([self, target], 'rgb', self.__wref)
+    steps += 1
+    return [gradient.sample(1.0*n/steps, False) for n in range(1, steps)]
+
+  def make_monochrome_scheme(self):
+    """Return 4 colors in the same hue with varying saturation/lightness.
+
+    Returns:
+      A tuple of 4 grapefruit.Color in the same hue as this one,
+      with varying saturation/lightness.
+
+    >>> c = Color.from_hsl(30, 0.5, 0.5)
+    >>> ['(%g, %g, %g)' % clr.hsl for clr in c.make_monochrome_scheme()]
+    ['(30, 0.2, 0.8)', '(30, 0.5, 0.3)', '(30, 0.2, 0.6)', '(30, 0.5, 0.8)']
+
+    """
+    return tuple([Color(hsl, 'hsl', self.__a, self.__wref)
+      for hsl in _monochrome_hsl(*self.__get_hsl())])
+
+  def make_triadic_scheme(self, angle=120, mode='ryb'):
+    """Return two colors forming a triad or a split complementary with this one.
+
+    Parameters:
+      :angle:
+        The angle between the hues of the created colors.
+        The default value makes a triad.
+      :mode:
+        Select which color wheel to use for the generation (ryb/rgb).
+
+    Returns:
+      A tuple of two grapefruit.Color forming a color triad with
+      this one or a split complementary.
+
+    >>> c1 = Color.from_hsl(30, 1, 0.5)
+
+    >>> c2, c3 = c1.make_triadic_scheme(mode='rgb')
+    >>> c2.hsl
+    (150.0, 1.0, 0.5)
+    >>> c3.hsl
+    (270.0, 1.0, 0.5)
+
+    >>> c2, c3 = c1.make_triadic_scheme(angle=40, mode='rgb')
+    >>> c2.hsl
+    (190.0, 1.0, 0.5)
+    >>> c3.hsl
+    (230.0, 1.0, 0.5)
+
+    """
+    return tuple([Color(hsl, 'hsl', self.__a, self.__wref)
+      for hsl in _triadic_hsl(*(self.__get_hsl() + (angle, mode)))])
+
+  def make_tetradic_scheme(self, angle=30, mode='ryb'):
+    """Return three colors froming a tetrad with this one.
+
+    Parameters:
+      :angle:
+        The angle to substract from the adjacent colors hues [-90...90].
+        You can use an angle of zero to generate a square tetrad.
+      :mode:
+        Select which color wheel to use for the generation (ryb/rgb).
+
+    Returns:
+      A tuple of three grapefruit.Color forming a color tetrad with
+      this one.
+
+    >>> col = Color.from_hsl(30, 1, 0.5)
+    >>> [c.hsl for c in col.make_tetradic_scheme(mode='rgb', angle=30)]
+    [(90.0, 1.0, 0.5), (210.0, 1.0, 0.5), (270.0, 1.0, 0.5)]
+
+    """
+    return tuple([Color(hsl, 'hsl', self.__a, self.__wref)
+      for hsl in _tetradic_hsl(*(self.__get_hsl() + (angle, mode)))])
+
+  def make_analogous_scheme(self, angle=30, mode='ryb'):
+    """Return two colors analogous to this one.
+
+    Args:
+      :angle:
+        The angle between the hues of the created colors and this one.
+      :mode:
+        Select which color wheel to use for the generation (ryb/rgb).
+
+    Returns:
+      A tuple of grapefruit.Colors analogous to this one.
+
+    >>> c1 = Color.from_hsl(30, 1, 0.5)
+
+    >>> c2, c3 = c1.make_analogous_scheme(angle=60, mode='rgb')
+    >>> c2.hsl
+    (330.0, 1.0, 0.5)
+    >>> c3.hsl
+    (90.0, 1.0, 0.5)
+
+    >>> c2, c3 = c1.make_analogous_scheme(angle=10, mode='rgb')
+    >>> c2.hsl
+    (20.0, 1.0, 0.5)
+    >>> c3.hsl
+    (40.0, 1.0, 0.5)
+
+    """
+    return tuple([Color(hsl, 'hsl', self.__a, self.__wref)
+      for hsl in _analogous_hsl(*(self.__get_hsl() + (angle, mode)))])
+
+  def alpha_blend(self, other):
+    """Alpha-blend this color on the other one.
+
+    Args:
+      :other:
+        The grapefruit.Color to alpha-blend with this one.
+
+    Returns:
+      A grapefruit.Color instance which is the result of alpha-blending
+      this color on the other one.
+
+    >>> c1 = Color.from_rgb(1, 0.5, 0, 0.2)
+    >>> c2 = Color.from_rgb(1, 1, 1, 0.8)
+    >>> c3 = c1.alpha_blend(c2)
+    >>> c3
+    Color(1.0, 0.875, 0.75, 0.84)
+
+    """
+    # get final alpha channel
+    fa = self.__a + other.__a - (self.__a * other.__a)
+
+    # get percentage of source alpha compared to final alpha
+    if fa==0: sa = 0
+    else: sa = min(1.0, self.__a/other.__a)
+
+    # destination percentage is just the additive inverse
+    da = 1.0 - sa
+
+    sr, sg, sb = [v * sa for v in self.__get_rgb()]
+    dr, dg, db = [v * da for v in other.__get_rgb()]
+
+    return Color((sr+dr, sg+dg, sb+db), 'rgb', fa, self.__wref)
+
+  def blend(self, other, percent=0.5):
+    """blend this color with the other one.
+
+    Args:
+      :other:
+        the grapefruit.Color to blend with this one.
+
+    Returns:
+      A grapefruit.Color instance which is the result of blending
+      this color on the other one.
+
+    >>> c1 = Color.from_rgb(1, 0.5, 0, 0.2)
+    >>> c2 = Color.from_rgb(1, 1, 1, 0.6)
+    >>> c3 = c1.blend(c2)
+    >>> c3
+    Color(1.0, 0.75, 0.5, 0.4)
+
+    """
+    dest = 1.0 - percent
+    rgb = tuple(((u * percent) + (v * dest) for u, v in zip(self.__get_rgb(), other.__get_rgb())))
+    a = (self.__a * percent) + (other.__a * dest)
+    return Color(rgb, 'rgb', a, self.__wref)
+
+# --===============------------------------------------------------------------
+# -- Frozen colors --
+# --===============--
+#
+# The interned FrozenColor instances, by creation arguments and by value.
+# Only the lookups and insertions need the lock: the instances themselves
+# never change once created.
+_internLock = threading.Lock()
+_internedColors = weakref.WeakValueDictionary()
+
+def _interned_color(key, values, mode, alpha, wref):
+  # The white reference is often given as a list, which is not hashable.
+  wref = tuple(wref)
+  key += (alpha, wref)
+  with _internLock:
+    col = _internedColors.get(key)
+  if col is not None:
+    return col
+  col = FrozenColor(values, mode, alpha, wref)
+  with _internLock:
+    col = _internedColors.setdefault((col.rgb, alpha, wref), col)
+    _internedColors[key] = col
+  return col
+
+class FrozenColor(Color):
+  """An immutable and hashable Color.
+
+  The values of a FrozenColor cannot be changed once created: the setters
+  raise an AttributeError and both the RGB and HSL values are computed up
+  front, so instances can be shared between threads without locks. Equal
+  colors have equal hashes, so frozen colors can be used as dict keys or in
+  sets.
+
+  The from_* constructors intern the colors: calling them again with the
+  same arguments, or with arguments giving the same values, returns the same
+  instance. The methods creating new colors
+  (darker, with_alpha...) return mutable Color instances.
+
+    >>> col = FrozenColor.from_html('#ff8000')
+    >>> col is FrozenColor.from_ints((255, 128, 0))
+    True
+    >>> {col: 'orange'}[FrozenColor((1.0, 128 / 255.0, 0.0))]
+    'orange'
+    >>> col.rgb = (0, 0, 0)
+    Traceback (most recent call last):
+      ...
+    AttributeError: FrozenColor instances are immutable
+
+  """
+
+  __slots__ = ('__hash',)
+
+  @staticmethod
+  def from_color(color):
+    """Create a new instance with the values of a Color.
+
+    Parameters:
+      :color:
+        The grapefruit.Color to copy.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_color(Color.from_hsl(30, 1, 0.5))
+    FrozenColor(1.0, 0.5, 0.0, 1.0)
+
+    """
+    rgb = color.rgb
+    return _interned_color(('rgb', rgb), rgb, 'rgb', color.alpha, color.white_ref)
+
+  @staticmethod
+  def from_rgb(r, g, b, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for RGB values.
 
-    >>> Color.from_lab(66.951823, 0.43084105, 0.73969231)
-    Color(1.0, 0.5, -0.0, 1.0)
-    >>> Color.from_lab(66.951823, 0.41165967, 0.67282012, wref=WHITE_REFERENCE['std_D50'])
-    Color(1.0, 0.5, -0.0, 1.0)
-    >>> Color.from_lab(66.951823, 0.43084105, 0.73969231, 0.5)
-    Color(1.0, 0.5, -0.0, 0.5)
-    >>> Color.from_lab(66.951823, 0.41165967, 0.67282012, 0.5, WHITE_REFERENCE['std_D50'])
-    Color(1.0, 0.5, -0.0, 0.5)
+    Parameters:
+      :r:
+        The Red component value [0...1]
+      :g:
+        The Green component value [0...1]
+      :b:
+        The Blue component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_rgb(1.0, 0.5, 0.0)
+    FrozenColor(1.0, 0.5, 0.0, 1.0)
 
     """
-    return Color(xyz_to_rgb(*lab_to_xyz(l, a, b, wref)), 'rgb', alpha, wref)
+    return _interned_color(('rgb', (r, g, b)), (r, g, b), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_hsl(h, s, l, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for HSL values.
+
+    Parameters:
+      :h:
+        The Hue component value [0...360]
+      :s:
+        The Saturation component value [0...1]
+      :l:
+        The Lightness component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_hsl(30, 1, 0.5)
+    FrozenColor(1.0, 0.5, 0.0, 1.0)
+
+    """
+    return _interned_color(('hsl', (h, s, l)), (h, s, l), 'hsl', alpha, wref)
+
+  @staticmethod
+  def from_hsv(h, s, v, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for HSV values.
+
+    Parameters:
+      :h:
+        The Hue component value [0...360]
+      :s:
+        The Saturation component value [0...1]
+      :v:
+        The Value component [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_hsv(30, 1, 1)
+    FrozenColor(1.0, 0.5, 0.0, 1.0)
+
+    """
+    return _interned_color(('hsv', (h, s, v)), hsv_to_rgb(h, s, v), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_yiq(y, i, q, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for YIQ values.
+
+    Parameters:
+      :y:
+        The Y component value [0...1]
+      :i:
+        The I component value [0...1]
+      :q:
+        The Q component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_yiq(0.5922, 0.45885, -0.05)
+    FrozenColor(0.999902, 0.499955, -6.7e-05, 1.0)
+
+    """
+    return _interned_color(('yiq', (y, i, q)), yiq_to_rgb(y, i, q), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_yuv(y, u, v, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for YUV values.
+
+    Parameters:
+      :y:
+        The Y component value [0...1]
+      :u:
+        The U component value [-0.436...0.436]
+      :v:
+        The V component value [-0.615...0.615]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_yuv(0.5925, -0.2916, 0.3575)
+    FrozenColor(0.999989, 0.500015, -6.3e-05, 1.0)
+
+    """
+    return _interned_color(('yuv', (y, u, v)), yuv_to_rgb(y, u, v), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_xyz(x, y, z, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for CIE-XYZ values.
+
+    Parameters:
+      :x:
+        The X component value [0...1]
+      :y:
+        The Y component value [0...1]
+      :z:
+        The Z component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_xyz(0.488941, 0.365682, 0.0448137)
+    FrozenColor(1.0, 0.5, 0.0, 1.0)
+
+    """
+    return _interned_color(('xyz', (x, y, z)), xyz_to_rgb(x, y, z), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_lab(l, a, b, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for CIE-LAB values.
+
+    Parameters:
+      :l:
+        The L component [0...100]
+      :a:
+        The a component [-1...1]
+      :b:
+        The b component [-1...1]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_lab(66.951823, 0.43084105, 0.73969231)
+    FrozenColor(1.0, 0.5, -0.0, 1.0)
+
+    """
+    return _interned_color(('lab', (l, a, b)), xyz_to_rgb(*lab_to_xyz(l, a, b, wref)), 'rgb', alpha, wref)
 
   @staticmethod
   def from_cmy(c, m, y, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed CMY values.
+    """Return the interned instance for CMY values.
+
+    Parameters:
+      :c:
+        The Cyan component value [0...1]
+      :m:
+        The Magenta component value [0...1]
+      :y:
+        The Yellow component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_cmy(0, 0.5, 1)
+    FrozenColor(1.0, 0.5, 0.0, 1.0)
+
+    """
+    return _interned_color(('cmy', (c, m, y)), cmy_to_rgb(c, m, y), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_cmyk(c, m, y, k, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for CMYK values.
 
     Parameters:
       :c:
@@ -1324,863 +5088,2683 @@ class Color(object):
         The Magenta component value [0...1]
       :y:
         The Yellow component value [0...1]
+      :k:
+        The Black component value [0...1]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_cmyk(0, 0.5, 1, 0)
+    FrozenColor(1.0, 0.5, 0.0, 1.0)
+
+    """
+    return _interned_color(('cmyk', (c, m, y, k)), cmy_to_rgb(*cmyk_to_cmy(c, m, y, k)), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_html(html, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for an HTML color definition.
+
+    Parameters:
+      :html:
+        The HTML definition of the color (#RRGGBB or #RGB or a color name).
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_html('#f60')
+    FrozenColor(1.0, 0.4, 0.0, 1.0)
+
+    """
+    return _interned_color(('html', html), html_to_rgb(html), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_ints(ints, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for integer RGB values.
+
+    Parameters:
+      :ints:
+        The (r, g, b) values of the color [0...255]
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_ints((255, 102, 0))
+    FrozenColor(1.0, 0.4, 0.0, 1.0)
+
+    """
+    ints = tuple(ints)
+    return _interned_color(('ints', ints), ints_to_rgb(ints), 'rgb', alpha, wref)
+
+  @staticmethod
+  def from_pil(pil, alpha=1.0, wref=_DEFAULT_WREF):
+    """Return the interned instance for a PIL color.
+
+    Parameters:
+      :pil:
+        A PIL compatible color representation (0xBBGGRR)
+      :alpha:
+        The color transparency [0...1], default is opaque.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    Returns:
+      A grapefruit.FrozenColor instance.
+
+    >>> FrozenColor.from_pil(0x0066ff)
+    FrozenColor(1.0, 0.4, 0.0, 1.0)
+
+    """
+    return _interned_color(('pil', pil), pil_to_rgb(pil), 'rgb', alpha, wref)
+
+  def __init__(self, values, mode='rgb', alpha=1.0, wref=_DEFAULT_WREF):
+    """Instantiate a new grapefruit.FrozenColor object.
+
+    Parameters:
+      :values:
+        The values of this color, in the specified representation.
+      :mode:
+        The representation mode used for values.
+      :alpha:
+        the alpha value (transparency) of this color.
+      :wref:
+        The whitepoint reference, default is 2° D65.
+
+    """
+    Color.__init__(self, values, mode, alpha, wref)
+    # Derive both representations now, nothing is written after __init__.
+    self.rgb, self.hsl
+    object.__setattr__(self, '_FrozenColor__hash', hash(self.rgba))
+
+  def __setattr__(self, name, value):
+    if name.startswith('_Color__') and not hasattr(self, '_FrozenColor__hash'):
+      object.__setattr__(self, name, value)
+    else:
+      raise AttributeError("FrozenColor instances are immutable")
+
+  def __delattr__(self, name):
+    raise AttributeError("FrozenColor instances are immutable")
+
+  def __hash__(self):
+    # Consistent with __eq__, which also compares equal to (r, g, b, a).
+    return self.__hash
+
+  def __repr__(self):
+    return 'Frozen' + Color.__repr__(self)
+
+# --==============-------------------------------------------------------------
+# -- Color arrays --
+# --==============--
+
+class ColorArray(object):
+  """Hold an array of color values.
+
+  The colors are stored in contiguous numpy buffers: an (N, 3) array of RGB
+  values, an (N,) array of alpha values and a single white reference shared
+  by the whole array. Every property converts all the colors in a single
+  vectorized pass and returns a numpy array.
+
+  .. note::
+
+     This class requires numpy.
+
+  Example usage:
+
+    >>> colors = ColorArray.from_rgb([(1, 0.5, 0), (0, 0, 1)])  # doctest: +SKIP
+    >>> len(colors)  # doctest: +SKIP
+    2
+    >>> colors.hsl.tolist()  # doctest: +SKIP
+    [[30.0, 1.0, 0.5], [240.0, 1.0, 0.5]]
+    >>> colors.html  # doctest: +SKIP
+    ['#ff8000', '#0000ff']
+    >>> colors[0]  # doctest: +SKIP
+    Color(1.0, 0.5, 0.0, 1.0)
+
+  """
+
+  # --==================--------------------------------------------------------
+  # -- Creation methods --
+  # --==================--
+
+  @staticmethod
+  def from_rgb(rgb, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed RGB values.
+
+    Parameters:
+      :rgb:
+        A sequence of (r, g, b) values, or an (N, 3) array [0...1]
       :alpha:
-        The color transparency [0...1], default is opaque
+        The colors transparency [0...1], a single value or one per color.
       :wref:
         The whitepoint reference, default is 2° D65.
 
     Returns:
-      A grapefruit.Color instance.
+      A grapefruit.ColorArray instance.
 
-    >>> Color.from_cmy(0, 0.5, 1)
-    Color(1.0, 0.5, 0.0, 1.0)
-    >>> Color.from_cmy(0, 0.5, 1, 0.5)
-    Color(1.0, 0.5, 0.0, 0.5)
+    >>> ColorArray.from_rgb([(1.0, 0.5, 0.0)], 0.5).rgba.tolist()  # doctest: +SKIP
+    [[1.0, 0.5, 0.0, 0.5]]
 
     """
-    return Color(cmy_to_rgb(c, m, y), 'rgb', alpha, wref)
+    return ColorArray(rgb, 'rgb', alpha, wref)
 
   @staticmethod
-  def from_cmyk(c, m, y, k, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed CMYK values.
+  def from_hsl(hsl, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on the specifed HSL values.
 
     Parameters:
-      :c:
-        The Cyan component value [0...1]
-      :m:
-        The Magenta component value [0...1]
-      :y:
-        The Yellow component value [0...1]
-      :k:
-        The Black component value [0...1]
+      :hsl:
+        A sequence of (h, s, l) values, or an (N, 3) array.
       :alpha:
-        The color transparency [0...1], default is opaque
+        The colors transparency [0...1], a single value or one per color.
       :wref:
         The whitepoint reference, default is 2° D65.
 
     Returns:
-      A grapefruit.Color instance.
+      A grapefruit.ColorArray instance.
 
-    >>> Color.from_cmyk(1, 0.32, 0, 0.5)
-    Color(0.0, 0.34, 0.5, 1.0)
-    >>> Color.from_cmyk(1, 0.32, 0, 0.5, 0.5)
-    Color(0.0, 0.34, 0.5, 0.5)
+    >>> ColorArray.from_hsl([(30, 1, 0.5)]).rgb.tolist()  # doctest: +SKIP
+    [[1.0, 0.5, 0.0]]
 
     """
-    return Color(cmy_to_rgb(*cmyk_to_cmy(c, m, y, k)), 'rgb', alpha, wref)
+    return ColorArray(hsl, 'hsl', alpha, wref)
 
   @staticmethod
-  def from_html(html, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed HTML color definition.
+  def from_ints(ints, alpha=1.0, wref=_DEFAULT_WREF):
+    """Create a new instance based on integer RGB values.
 
     Parameters:
-      :html:
-        The HTML definition of the color (#RRGGBB or #RGB or a color name).
+      :ints:
+        A sequence of (r, g, b) values, or an (N, 3) array [0...255]
       :alpha:
-        The color transparency [0...1], default is opaque.
+        The colors transparency [0...1], a single value or one per color.
       :wref:
         The whitepoint reference, default is 2° D65.
 
     Returns:
-      A grapefruit.Color instance.
+      A grapefruit.ColorArray instance.
 
-    >>> Color.from_html('#ff8000')
-    Color(1.0, 0.501961, 0.0, 1.0)
-    >>> Color.from_html('ff8000')
-    Color(1.0, 0.501961, 0.0, 1.0)
-    >>> Color.from_html('#f60')
-    Color(1.0, 0.4, 0.0, 1.0)
-    >>> Color.from_html('f60')
-    Color(1.0, 0.4, 0.0, 1.0)
-    >>> Color.from_html('lemonchiffon')
-    Color(1.0, 0.980392, 0.803922, 1.0)
-    >>> Color.from_html('#ff8000', 0.5)
-    Color(1.0, 0.501961, 0.0, 0.5)
+    >>> ColorArray.from_ints([(255, 0, 0)]).rgb.tolist()  # doctest: +SKIP
+    [[1.0, 0.0, 0.0]]
 
     """
-    return Color(html_to_rgb(html), 'rgb', alpha, wref)
+    _require_numpy('ColorArray')
+    return ColorArray(_as_components(ints) / 255.0, 'rgb', alpha, wref)
 
   @staticmethod
-  def from_pil(pil, alpha=1.0, wref=_DEFAULT_WREF):
-    """Create a new instance based on the specifed PIL color.
+  def from_colors(colors, wref=None):
+    """Create a new instance from a sequence of grapefruit.Color.
 
     Parameters:
-      :pil:
-        A PIL compatible color representation (0xBBGGRR)
-      :alpha:
-        The color transparency [0...1], default is opaque
+      :colors:
+        The grapefruit.Color instances to store.
       :wref:
-        The whitepoint reference, default is 2° D65.
+        The whitepoint reference, default is the one of the first color.
 
     Returns:
-      A grapefruit.Color instance.
+      A grapefruit.ColorArray instance.
 
-    >>> Color.from_pil(0x0080ff)
-    Color(1.0, 0.501961, 0.0, 1.0)
-    >>> Color.from_pil(0x0080ff, 0.5)
-    Color(1.0, 0.501961, 0.0, 0.5)
+    >>> ColorArray.from_colors([Color.from_rgb(1, 0.5, 0, 0.5)]).rgba.tolist()  # doctest: +SKIP
+    [[1.0, 0.5, 0.0, 0.5]]
 
     """
-    return Color(pil_to_rgb(pil), 'rgb', alpha, wref)
-
+    _require_numpy('ColorArray')
+    colors = list(colors)
+    if wref is None:
+      wref = colors and colors[0].white_ref or _DEFAULT_WREF
+    rgba = np.array([c.rgba for c in colors], dtype=np.float64).reshape(-1, 4)
+    return ColorArray(rgba[:, :3], 'rgb', rgba[:, 3], wref)
 
   def __init__(self, values, mode='rgb', alpha=1.0, wref=_DEFAULT_WREF):
-    """Instantiate a new grapefruit.Color object.
+    """Instantiate a new grapefruit.ColorArray object.
 
     Parameters:
       :values:
-        The values of this color, in the specified representation.
+        The values of the colors, in the specified representation, as a
+        sequence of triples or an (N, 3) array.
       :mode:
-        The representation mode used for values.
+        The representation mode used for values (rgb/hsl).
       :alpha:
-        the alpha value (transparency) of this color.
+        the alpha value (transparency) of the colors, a single value or one
+        per color.
       :wref:
         The whitepoint reference, default is 2° D65.
 
     """
-    if not(isinstance(values, tuple)):
-      raise TypeError("values must be a tuple")
+    _require_numpy('ColorArray')
+    values = _as_components(values)
 
     if mode=='rgb':
-      self.__rgb = tuple([float(v) for v in values])
-      self.__hsl = rgb_to_hsl(*self.__rgb)
+      self.__rgb = values.copy()
     elif mode=='hsl':
-      self.__hsl = tuple([float(v) for v in values])
-      self.__rgb = hsl_to_rgb(*self.__hsl)
+      self.__rgb = _np_hsl_to_rgb(values, np.empty_like(values))
     else:
       raise ValueError("Invalid color mode: " + mode)
 
-    self.__a = alpha
-    self.__wref = wref
+    self.__a = np.empty(len(values))
+    self.__a[:] = alpha
+    self.__wref = tuple(wref)
 
   # --=====================-----------------------------------------------------
   # -- Convenience methods --
   # --=====================--
 
-  def __ne__(self, other):
-    return not self.__eq__(other)
+  def __len__(self):
+    return len(self.__rgb)
 
-  def __eq__(self, other):
-    try:
-      if isinstance(other, Color):
-        return (self.__rgb==other.__rgb) and (self.__a==other.__a) and (self.__wref==other.__wref)
-      if len(other) != 4:
-        return False
-      return list(self.__rgb + (self.__a,)) == list(other)
-    except TypeError:
-      return False
-    except AttributeError:
-      return False
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return ColorArray(self.__rgb[index], 'rgb', self.__a[index], self.__wref)
+    return Color(tuple(self.__rgb[index].tolist()), 'rgb', float(self.__a[index]), self.__wref)
+
+  def __iter__(self):
+    for i in range(len(self.__rgb)):
+      yield self[i]
 
   def __repr__(self):
-    return "Color({}, {}, {}, {})".format(*[round(v, 6) for v in (self.__rgb + (self.__a,))])
+    return "ColorArray(<%d colors>)" % len(self.__rgb)
 
-  def __str__(self):
-    """A string representation of this grapefruit.Color instance.
+  # --============--------------------------------------------------------------
+  # -- Properties --
+  # --============--
 
-    Returns:
-      The RGBA representation of this grapefruit.Color instance.
+  @property
+  def alpha(self):
+    """The (N,) array of transparencies."""
+    return self.__a
+
+  @property
+  def white_ref(self):
+    """the white reference point shared by all the colors."""
+    return self.__wref
+
+  @property
+  def rgb(self):
+    """The (N, 3) array of RGB values."""
+    return self.__rgb
+
+  @property
+  def rgba(self):
+    """The (N, 4) array of RGBA values."""
+    return np.column_stack((self.__rgb, self.__a))
+
+  def _convert(self, kernel, width=3):
+    return kernel(self.__rgb, np.empty((len(self.__rgb), width)))
+
+  @property
+  def hsl(self):
+    """The (N, 3) array of HSL values."""
+    return self._convert(_np_rgb_to_hsl)
+
+  @property
+  def hsv(self):
+    """The (N, 3) array of HSV values."""
+    return self._convert(_np_rgb_to_hsv)
+
+  @property
+  def yiq(self):
+    """The (N, 3) array of YIQ values."""
+    return self._convert(_np_rgb_to_yiq)
+
+  @property
+  def yuv(self):
+    """The (N, 3) array of YUV values."""
+    return self._convert(_np_rgb_to_yuv)
+
+  @property
+  def xyz(self):
+    """The (N, 3) array of CIE-XYZ values."""
+    return self._convert(_np_rgb_to_xyz)
+
+  @property
+  def lab(self):
+    """The (N, 3) array of CIE-LAB values."""
+    xyz = self._convert(_np_rgb_to_xyz)
+    return _np_xyz_to_lab(xyz, xyz, self.__wref)
+
+  @property
+  def cmy(self):
+    """The (N, 3) array of CMY values."""
+    return 1.0 - self.__rgb
+
+  @property
+  def cmyk(self):
+    """The (N, 4) array of CMYK values."""
+    return self._convert(_np_rgb_to_cmyk, 4)
+
+  @property
+  def ints(self):
+    """The (N, 3) array of integer values in the range [0...255]"""
+    return _np_rgb_to_ints(self.__rgb, np.empty(self.__rgb.shape, dtype=int))
+
+  @property
+  def html(self):
+    """The colors as a list of HTML color definitions."""
+    return _np_rgb_to_html(self.__rgb)
+
+  def nearest_names(self):
+    """Return the names of the NAMED_COLOR entries nearest to the colors.
+
+    See nearest_names.
 
     """
-    return "({}, {}, {}, {})".format(*[round(v, 6) for v in (self.__rgb + (self.__a,))])
+    return nearest_names(self.__rgb, self.__wref)
 
-  if sys.version_info[0] < 3:
-    def __unicode__(self):
-      """A unicode string representation of this grapefruit.Color instance.
+  def adapt(self, wref, method='bradford'):
+    """Return the colors adapted to a new white reference.
 
-      Returns:
-        The RGBA representation of this grapefruit.Color instance.
+    See Color.adapt. All the colors go through a single product by the
+    cached adaptation matrix. The RGB values stay sRGB, relative to D65: the
+    white of colors adapted to D50 is the yellowish D50 white.
 
-      """
-      return unicode("({}, {}, {}, {})".format(*[round(v, 6) for v in (self.__rgb + (self.__a,))]))
+    >>> colors = ColorArray.from_rgb([(1, 0.5, 0), (1, 1, 1)])  # doctest: +SKIP
+    >>> colors.adapt(WHITE_REFERENCE['std_D50']).rgb.round(6).tolist()  # doctest: +SKIP
+    [[1.036494, 0.489177, -0.143929], [1.073793, 0.98924, 0.866105]]
 
-  def __iter__(self):
-    return iter(self.__rgb + (self.__a,))
+    """
+    xyz = _np_adapt_xyz(self.xyz, np.empty((len(self.__rgb), 3)), adaptation_matrix(self.__wref, wref, method))
+    return ColorArray(_np_xyz_to_rgb(xyz, xyz), 'rgb', self.__a, wref)
+
+# --==========----------------------------------------------------------------
+# -- Palettes --
+# --==========--
+
+class Palette(object):
+  """An indexed collection of colors, searched by color difference.
+
+  The L*a*b* values of the colors are computed once, when they are added,
+  and kept in a k-d tree answering the nearest and radius queries. The
+  distances are CIE76 delta E values (see nearest_names). Colors can be
+  added and removed without rebuilding the whole index.
+
+  Each color is identified by the integer key returned by add (or by its
+  position in the initial colors); the keys of the removed colors are not
+  reused.
+
+  Example usage:
+
+    >>> palette = Palette([(1, 0, 0), (0, 1, 0), (0, 0, 1)])
+    >>> [(key, round(d, 3)) for key, d in palette.nearest((0.9, 0.1, 0), 2)]
+    [(0, 10.905), (1, 163.62)]
+    >>> key = palette.add(Color.from_html('#e01000'))
+    >>> palette.nearest((0.9, 0.1, 0))[0][0]==key
+    True
+    >>> palette[key]
+    Color(0.878431, 0.062745, 0.0, 1.0)
+
+  """
+
+  def __init__(self, colors=(), wref=_DEFAULT_WREF):
+    """Instantiate a new grapefruit.Palette object.
+
+    Parameters:
+      :colors:
+        A sequence of grapefruit.Color or of (r, g, b) tuples, or an (N, 3)
+        array of RGB values [0...1]
+      :wref:
+        The whitepoint reference of the L*a*b* values, default is 2° D65.
+
+    """
+    self.__wref = wref
+    self.__colors = self.__entries(colors)
+    self.__tree = _KDTree(self.__lab(self.__colors))
+
+  def __entries(self, colors):
+    if np is not None and isinstance(colors, np.ndarray):
+      colors = colors.tolist()
+    return [isinstance(c, Color) and c or tuple([float(v) for v in c]) for c in colors]
+
+  def __lab(self, entries):
+    """Return the CIE L*a*b* values of a list of entries."""
+    if not entries:
+      return []
+    rgb = [isinstance(c, Color) and c.rgb or c for c in entries]
+    lab = _batch_rows(xyz_to_lab_batch(rgb_to_xyz_batch(rgb), self.__wref))
+    return [_cie_lab(*v) for v in lab]
 
   def __len__(self):
-    return 4
+    return len(self.__tree)
 
-  # --============--------------------------------------------------------------
-  # -- Properties --
-  # --============--
+  def __repr__(self):
+    return "Palette(<%d colors>)" % len(self)
+
+  def __contains__(self, key):
+    return 0 <= key < len(self.__colors) and self.__colors[key] is not None
+
+  def __getitem__(self, key):
+    if key not in self:
+      raise KeyError(key)
+    col = self.__colors[key]
+    if not isinstance(col, Color):
+      col = Color(col, 'rgb', 1.0, self.__wref)
+    return col
+
+  def keys(self):
+    """Return the keys of the colors of this palette, in insertion order."""
+    return [key for key, col in enumerate(self.__colors) if col is not None]
 
   @property
-  def is_legal(self):
-    """Boolean indicating whether the color is within the legal gamut."""
-    return all(0.0 <= v <= 1.0 for v in self)
+  def white_ref(self):
+    """The white reference point of the L*a*b* values of this palette."""
+    return self.__wref
+
+  def add(self, color):
+    """Add a color to this palette.
+
+    Parameters:
+      :color:
+        A grapefruit.Color or an (r, g, b) tuple.
+
+    Returns:
+      The key of the color.
+
+    """
+    entries = self.__entries([color])
+    key = self.__tree.insert(self.__lab(entries)[0])
+    self.__colors.append(entries[0])
+    return key
+
+  def remove(self, key):
+    """Remove the color with the specified key from this palette.
+
+    Throws:
+      :KeyError:
+        If there is no color with this key.
+
+    """
+    if key not in self:
+      raise KeyError(key)
+    self.__tree.remove(key)
+    self.__colors[key] = None
+
+  def nearest(self, color, k=1):
+    """Find the colors of this palette nearest to a color.
+
+    Parameters:
+      :color:
+        A grapefruit.Color or an (r, g, b) tuple.
+      :k:
+        The number of colors to return.
+
+    Returns:
+      A list of at most k (key, delta E) tuples, nearest first.
+
+    """
+    return self.nearest_batch([color], k)[0]
+
+  def within(self, color, radius):
+    """Find the colors of this palette within a delta E radius of a color.
+
+    Parameters:
+      :color:
+        A grapefruit.Color or an (r, g, b) tuple.
+      :radius:
+        The maximum CIE76 delta E.
+
+    Returns:
+      A list of (key, delta E) tuples, nearest first.
+
+    """
+    return self.within_batch([color], radius)[0]
+
+  def nearest_batch(self, colors, k=1):
+    """Find the colors of this palette nearest to each of a batch of colors.
+
+    The L*a*b* values of the colors are computed in a single batch.
+
+    Parameters:
+      :colors:
+        A sequence of grapefruit.Color or of (r, g, b) tuples, or an (N, 3)
+        array of RGB values [0...1]
+      :k:
+        The number of colors to return for each color.
+
+    Returns:
+      A list with the result of nearest for each color.
+
+    """
+    tree = self.__tree
+    if k==1:
+      hits = [[tree.nearest(lab)] for lab in self.__lab(self.__entries(colors))]
+      return [[(i, math.sqrt(d)) for i, d in h if i is not None] for h in hits]
+    return [[(i, math.sqrt(d)) for i, d in tree.knearest(lab, k)]
+      for lab in self.__lab(self.__entries(colors))]
+
+  def within_batch(self, colors, radius):
+    """Find the colors of this palette within a delta E radius of each color.
+
+    Parameters:
+      :colors:
+        A sequence of grapefruit.Color or of (r, g, b) tuples, or an (N, 3)
+        array of RGB values [0...1]
+      :radius:
+        The maximum CIE76 delta E.
+
+    Returns:
+      A list with the result of within for each color.
+
+    """
+    tree = self.__tree
+    return [[(i, math.sqrt(d)) for i, d in tree.within(lab, radius)]
+      for lab in self.__lab(self.__entries(colors))]
+
+# --===========---------------------------------------------------------------
+# -- Gradients --
+# --===========--
+
+# The interpolation spaces of the gradients.
+GRADIENT_SPACES = ('rgb', 'linear_rgb', 'lab', 'lch', 'oklab')
+
+_OKLAB_LMS = (
+  (0.4122214708, 0.5363325363, 0.0514459929),
+  (0.2119034982, 0.6806995451, 0.1073969566),
+  (0.0883024619, 0.2817188376, 0.6299787005))
+_OKLAB_LAB = (
+  (0.2104542553, 0.7936177850, -0.0040720468),
+  (1.9779984951, -2.4285922050, 0.4505937099),
+  (0.0259040371, 0.7827717662, -0.8086757660))
+_OKLAB_LAB_INV = (
+  (1.0, 0.3963377774, 0.2158037573),
+  (1.0, -0.1055613458, -0.0638541728),
+  (1.0, -0.0894841775, -1.2914855480))
+_OKLAB_LMS_INV = (
+  (4.0767416621, -3.3077115913, 0.2309699292),
+  (-1.2684380046, 2.6097574011, -0.3413193965),
+  (-0.0041960863, -0.7034186147, 1.7076147010))
+
+def _rgb_to_gradient_space(rgb, space, wref):
+  """Convert sRGB values to the coordinates of a gradient space."""
+  if space=='rgb':
+    return tuple(rgb)
+  if space=='linear_rgb':
+    return tuple([_srgb_to_linear(v) for v in rgb])
+  if space=='oklab':
+    lms = _mat_vec(_OKLAB_LMS, [_srgb_to_linear(v) for v in rgb])
+    return _mat_vec(_OKLAB_LAB, [math.copysign(abs(v) ** (1.0 / 3), v) for v in lms])
+  l, a, b = xyz_to_lab(wref=wref, *rgb_to_xyz(*rgb))
+  if space=='lab':
+    return (l, a, b)
+  return (l, math.sqrt(a * a + b * b), math.degrees(math.atan2(b, a)) % 360)
+
+def _gradient_space_to_rgb(values, space, wref):
+  """Convert the coordinates of a gradient space to sRGB values."""
+  if space=='rgb':
+    return tuple(values)
+  if space=='linear_rgb':
+    return tuple([_linear_to_srgb(v) for v in values])
+  if space=='oklab':
+    lms = [v * v * v for v in _mat_vec(_OKLAB_LAB_INV, values)]
+    return tuple([_linear_to_srgb(v) for v in _mat_vec(_OKLAB_LMS_INV, lms)])
+  l, a, b = values
+  if space=='lch':
+    h = math.radians(b)
+    l, a, b = l, a * math.cos(h), a * math.sin(h)
+  return xyz_to_rgb(lab_to_xyz(l, a, b, wref))
+
+def _np_gradient_space_to_rgb(values, space, wref):
+  """Convert an (N, 3) array of gradient space coordinates to sRGB."""
+  if space=='rgb':
+    return values
+  if space=='linear_rgb':
+    return _np_linear_to_srgb(values)
+  if space=='oklab':
+    lms = np.dot(values, np.array(_OKLAB_LAB_INV).T) ** 3
+    return _np_linear_to_srgb(np.dot(lms, np.array(_OKLAB_LMS_INV).T))
+  if space=='lch':
+    h = np.radians(values[:, 2])
+    values = np.column_stack((values[:, 0], values[:, 1] * np.cos(h), values[:, 1] * np.sin(h)))
+  return xyz_to_rgb_batch(lab_to_xyz_batch(values, wref))
+
+def _color_rgba(col):
+  """Return the (r, g, b, alpha) of a Color, HTML string or RGB(A) tuple."""
+  if isinstance(col, Color):
+    return col.rgb + (float(col.alpha),)
+  if isinstance(col, str):
+    return html_to_rgb(col) + (1.0,)
+  col = tuple([float(v) for v in col])
+  return len(col) > 3 and col[:4] or col + (1.0,)
+
+class Gradient(object):
+  """A color gradient through several color stops.
+
+  The colors are interpolated linearly between the stops, in one of the
+  GRADIENT_SPACES: 'rgb' (sRGB, as make_gradient), 'linear_rgb', 'lab',
+  'lch' (taking the shortest way around the hue circle) or 'oklab'. The alpha
+  values are interpolated linearly too.
+
+  The stops are converted to the interpolation space, and the start and the
+  slope of every segment computed, once; a sample then only costs a search
+  of its segment, a multiply-add and the conversion back to sRGB, clipped to
+  [0...1] unless told otherwise. The samples can be taken one at a
+  time, as grapefruit.Color, or many at once, as an array.
+
+  Example usage:
+
+    >>> gradient = Gradient(['#ff0000', (0.25, '#ffffff'), '#0000ff'], 'rgb')
+    Traceback (most recent call last):
+      ...
+    ValueError: Either all the stops or none of them must have a position
+    >>> gradient = Gradient([(0, '#ff0000'), (0.25, '#ffffff'), (1, '#0000ff')], 'lab')
+    >>> gradient.sample(0.25).html
+    '#ffffff'
+    >>> [col.html for col in gradient.colors(5)]
+    ['#ff0000', '#ffffff', '#cfb1ff', '#9265ff', '#0000ff']
+    >>> [round(v, 3) for v in gradient.ramp(3, out=array.array('d', [0.0] * 12))]
+    [1.0, 0.0, 0.0, 1.0, 0.812, 0.695, 1.0, 1.0, 0.0, 0.0, 1.0, 1.0]
+
+  """
+
+  def __init__(self, stops, space='lab', wref=_DEFAULT_WREF):
+    """Instantiate a new grapefruit.Gradient object.
+
+    Parameters:
+      :stops:
+        The sequence of the colors of the gradient, evenly spaced from 0 to
+        1, or of (position, color) tuples with non decreasing positions. The
+        colors are grapefruit.Color, HTML color strings, or (r, g, b) or
+        (r, g, b, alpha) tuples.
+      :space:
+        The interpolation space, one of GRADIENT_SPACES.
+      :wref:
+        The whitepoint reference of the L*a*b* and LCh spaces, default is
+        2° D65.
+
+    """
+    if space not in GRADIENT_SPACES:
+      raise ValueError("Invalid gradient space: %s" % space)
+    stops = list(stops)
+    if not stops:
+      raise ValueError("A gradient needs at least one stop")
+    positioned = [isinstance(s, (tuple, list)) and len(s)==2 for s in stops]
+    if any(positioned) and not all(positioned):
+      raise ValueError("Either all the stops or none of them must have a position")
+    if not all(positioned):
+      last = float(max(len(stops) - 1, 1))
+      stops = [(i / last, s) for i, s in enumerate(stops)]
+    if len(stops)==1:
+      stops = [(stops[0][0], stops[0][1]), (stops[0][0], stops[0][1])]
+
+    self.__space = space
+    self.__wref = wref
+    positions = [float(p) for p, col in stops]
+    if any([p1 > p2 for p1, p2 in zip(positions, positions[1:])]):
+      raise ValueError("The positions of the stops must not decrease")
+    values = []
+    for p, col in stops:
+      rgba = _color_rgba(col)
+      values.append(_rgb_to_gradient_space(rgba[:3], space, wref) + rgba[3:])
+
+    starts = []
+    slopes = []
+    for i in range(len(values) - 1):
+      v1, v2 = list(values[i]), list(values[i+1])
+      if space=='lch':
+        # An achromatic stop takes the hue of the other end of the segment.
+        # The sRGB greys keep a chroma of about 1e-4 through the rounded
+        # matrices of rgb_to_xyz.
+        if v1[1] < 5e-4: v1[2] = v2[2]
+        if v2[1] < 5e-4: v2[2] = v1[2]
+        dh = v2[2] - v1[2]
+        v2[2] = v1[2] + dh - 360 * round(dh / 360.0)
+      length = positions[i+1] - positions[i]
+      starts.append(tuple(v1))
+      slopes.append(tuple([length and (b - a) / length or 0.0 for a, b in zip(v1, v2)]))
+    self.__positions = positions
+    self.__starts = starts
+    self.__slopes = slopes
+    self.__arrays = None
+    if np is not None:
+      self.__arrays = tuple([np.array(v) for v in (positions, starts, slopes)])
+
+  def __repr__(self):
+    return "Gradient(<%d stops, %s>)" % (len(self.__positions), self.__space)
 
   @property
-  def alpha(self):
-    """The transparency of this color. 0.0 is transparent and 1.0 is fully opaque."""
-    return self.__a
-  @alpha.setter
-  def alpha(self, value):
-    self.__a = value
+  def space(self):
+    """The interpolation space of this gradient."""
+    return self.__space
+
+  @property
+  def white_ref(self):
+    """The white reference point of this gradient."""
+    return self.__wref
+
+  @property
+  def domain(self):
+    """The (first, last) positions of the stops of this gradient."""
+    return (self.__positions[0], self.__positions[-1])
+
+  def __rgba(self, t, clip=True):
+    positions = self.__positions
+    t = min(max(float(t), positions[0]), positions[-1])
+    i = min(max(bisect.bisect_right(positions, t) - 1, 0), len(self.__starts) - 1)
+    d = t - positions[i]
+    values = [s + k * d for s, k in zip(self.__starts[i], self.__slopes[i])]
+    if self.__space=='lch':
+      values[2] %= 360
+    rgb = _gradient_space_to_rgb(values[:3], self.__space, self.__wref)
+    if clip:
+      rgb = [min(max(v, 0.0), 1.0) for v in rgb]
+    return tuple(rgb), values[3]
+
+  def sample(self, t, clip=True):
+    """Return the color of this gradient at a position.
+
+    Parameters:
+      :t:
+        The position, clamped to the domain of the gradient.
+      :clip:
+        Whether to clip the RGB values to [0...1], default is True.
+
+    Returns:
+      A grapefruit.Color instance.
+
+    """
+    rgb, alpha = self.__rgba(t, clip)
+    return Color(rgb, 'rgb', alpha, self.__wref)
+
+  __call__ = sample
+
+  def colors(self, steps):
+    """Iterate over evenly spaced colors of this gradient.
+
+    The colors are computed one at a time, as they are requested.
+
+    Parameters:
+      :steps:
+        The number of colors, including both ends of the gradient.
+
+    Returns:
+      An iterator of grapefruit.Color instances.
+
+    """
+    first, last = self.domain
+    for i in range(steps):
+      yield self.sample(first + (last - first) * (steps > 1 and i / (steps - 1.0) or 0.0))
 
-  @property
-  def white_ref(self):
-    """the white reference point of this color."""
-    return self.__wref
-  @white_ref.setter
-  def white_ref(self, value):
-    self.__wref = value
+  def sample_batch(self, positions, out=None, clip=True):
+    """Return the colors of this gradient at an array of positions.
 
+    This is the vectorized equivalent of sample.
 
-  @property
-  def rgb(self):
-    """The RGB values of this Color."""
-    return self.__rgb
-  @rgb.setter
-  def rgb(self, value):
-    self.__rgb = tuple([float(v) for v in value])
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+    Parameters:
+      :positions:
+        The (N,) array of positions.
+      :out:
+        An optional (N, 4) float array, or any writable buffer of interleaved
+        components, receiving the result.
+      :clip:
+        Whether to clip the RGB values to [0...1], default is True.
 
-  @property
-  def rgba(self):
-    """The RGBA values of this Color."""
-    return (self.__rgb + (self.__a,))
-  @rgba.setter
-  def rgba(self, value):
-    self.__rgb = tuple([float(v) for v in value[:3]])
-    self.__a = float(value[3])
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+    Returns:
+      The (N, 4) array of RGBA values. Without numpy, a flat array.array('d')
+      of interleaved RGBA values.
 
-  @property
-  def red(self):
-    return self.__rgb[0]
-  @red.setter
-  def red(self, value):
-    self.__rgb = (float(value), self.__rgb[1], self.__rgb[2])
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+    """
+    if np is None:
+      result = array.array('d', [v for t in positions for rgb, a in [self.__rgba(t, clip)] for v in rgb + (a,)])
+      return _py_batch_out(result, out)
+
+    if self.__arrays is None:
+      # The gradient was made while numpy was not available.
+      self.__arrays = tuple([np.array(v) for v in (self.__positions, self.__starts, self.__slopes)])
+    stops, starts, slopes = self.__arrays
+    positions = np.clip(np.asarray(positions, dtype=np.float64).ravel(), stops[0], stops[-1])
+    index = np.clip(np.searchsorted(stops, positions, 'right') - 1, 0, len(starts) - 1)
+    values = starts[index]
+    values += slopes[index] * (positions - stops[index])[:, np.newaxis]
+    if self.__space=='lch':
+      values[:, 2] %= 360
+    if out is None:
+      result = out = np.empty((len(positions), 4))
+    else:
+      result, out = out, _np_batch_out(out, (len(positions), 4))
+    out[:, :3] = _np_gradient_space_to_rgb(values[:, :3], self.__space, self.__wref)
+    if clip:
+      np.clip(out[:, :3], 0.0, 1.0, out=out[:, :3])
+    out[:, 3] = values[:, 3]
+    return result
 
-  @property
-  def green(self):
-    return self.__rgb[1]
-  @green.setter
-  def green(self, value):
-    self.__rgb = (self.__rgb[0], float(value), self.__rgb[2])
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+  def ramp(self, steps, out=None, clip=True):
+    """Return evenly spaced colors of this gradient, as an array.
 
-  @property
-  def blue(self):
-    return self.__rgb[2]
-  @blue.setter
-  def blue(self, value):
-    self.__rgb = (self.__rgb[0], self.__rgb[1], float(value))
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+    Parameters:
+      :steps:
+        The number of colors, including both ends of the gradient.
+      :out:
+        An optional (steps, 4) float array receiving the result.
+      :clip:
+        Whether to clip the RGB values to [0...1], default is True.
 
+    Returns:
+      The (steps, 4) array of RGBA values, see sample_batch.
 
-  @property
-  def hsl(self):
-    """The HSL values of this Color."""
-    return self.__hsl
-  @hsl.setter
-  def hsl(self, value):
-    self.__hsl = tuple([float(v) for v in value])
-    self.__rgb = hsl_to_rgb(*self.__hsl)
+    """
+    first, last = self.domain
+    positions = [first + (last - first) * (steps > 1 and i / (steps - 1.0) or 0.0) for i in range(steps)]
+    if np is not None:
+      positions = np.linspace(first, last, steps)
+    return self.sample_batch(positions, out, clip)
 
-  @property
-  def hsl_hue(self):
-    """The hue of this color."""
-    return self.__hsl[0]
-  @hsl_hue.setter
-  def hsl_hue(self, value):
-    self.__hsl = (float(value), self.__hsl[1], self.__hsl[2])
-    self.__rgb = hsl_to_rgb(*self.__hsl)
+class Colormap(object):
+  """Map scalar values to colors through a lookup table.
 
-  @property
-  def hsv(self):
-    """The HSV values of this Color."""
-    return rgb_to_hsv(*self.__rgb)
-  @hsv.setter
-  def hsv(self, value):
-    self.__rgb = hsv_to_rgb(*value)
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+  The colors of a Gradient are sampled once into a table of size entries.
+  The values in [vmin...vmax] are split in size bins of equal width, each
+  mapped to one entry; the values under vmin, over vmax and the NaN values
+  get the under, over and bad colors.
 
-  @property
-  def yiq(self):
-    """The YIQ values of this Color."""
-    return rgb_to_yiq(*self.__rgb)
-  @yiq.setter
-  def yiq(self, value):
-    self.__rgb = yiq_to_rgb(*value)
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+  Whole arrays of values are mapped by apply, straight into pixel buffers,
+  a chunk at a time, through tables precomputed for each pixel layout.
 
-  @property
-  def yuv(self):
-    """The YUV values of this Color."""
-    return rgb_to_yuv(*self.__rgb)
-  @yuv.setter
-  def yuv(self, value):
-    self.__rgb = yuv_to_rgb(*value)
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+  Example usage:
 
-  @property
-  def xyz(self):
-    """The CIE-XYZ values of this Color."""
-    return rgb_to_xyz(*self.__rgb)
-  @xyz.setter
-  def xyz(self, value):
-    self.__rgb = xyz_to_rgb(*value)
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+    >>> cmap = Colormap(['#000080', '#ffffff', '#800000'], size=4, vmin=-1, vmax=1, bad='#00ff00')
+    >>> cmap(-1).html, cmap(0.2).html, cmap(5).html, cmap(float('nan')).html
+    ('#000080', '#dfaea3', '#800000', '#00ff00')
+    >>> list(cmap.apply(array.array('d', [-2, 0, float('nan')]), 'RGB8'))  # doctest: +SKIP
+    [0, 0, 128, 223, 174, 163, 0, 255, 0]
 
-  @property
-  def lab(self):
-    """The CIE-LAB values of this Color."""
-    return xyz_to_lab(wref=self.__wref, *rgb_to_xyz(*self.__rgb))
-  @lab.setter
-  def lab(self, value):
-    self.__rgb = xyz_to_rgb(lab_to_xyz(*value))
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+  """
 
-  @property
-  def cmy(self):
-    """The CMY values of this Color."""
-    return rgb_to_cmy(*self.__rgb)
-  @cmy.setter
-  def cmy(self, value):
-    self.__rgb = cmy_to_rgb(*value)
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+  def __init__(self, stops, space='lab', size=256, vmin=0.0, vmax=1.0, under=None, over=None, bad=(0.0, 0.0, 0.0, 0.0), wref=_DEFAULT_WREF):
+    """Instantiate a new grapefruit.Colormap object.
 
-  @property
-  def cmyk(self):
-    """The CMYK values of this Color."""
-    return cmy_to_cmyk(*rgb_to_cmy(*self.__rgb))
-  @cmyk.setter
-  def cmyk(self, value):
-    self.__rgb = cmy_to_rgb(*cmyk_to_cmy(*value))
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+    Parameters:
+      :stops:
+        A grapefruit.Gradient, or its stops (see Gradient).
+      :space:
+        The interpolation space of the gradient, one of GRADIENT_SPACES.
+      :size:
+        The number of entries of the lookup table, e.g. 256 or 4096.
+      :vmin:
+        The value mapped to the start of the gradient.
+      :vmax:
+        The value mapped to the end of the gradient.
+      :under:
+        The color of the values under vmin, default is the first entry.
+      :over:
+        The color of the values over vmax, default is the last entry.
+      :bad:
+        The color of the NaN values, default is transparent black.
+      :wref:
+        The whitepoint reference of the gradient, default is 2° D65.
 
-  @property
-  def ints(self):
-    """This Color as a tuple of integers in the range [0...255]"""
-    return rgb_to_ints(*self.__rgb)
-  @ints.setter
-  def ints(self, value):
-    self.__rgb = ints_to_rgb(*value)
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+    """
+    if size < 1:
+      raise ValueError("size must be at least 1")
+    if not vmin <= vmax:
+      raise ValueError("vmin must not be greater than vmax")
+    if not isinstance(stops, Gradient):
+      stops = Gradient(stops, space, wref)
+    self.__gradient = stops
+    self.__size = size
+    self.__vmin = float(vmin)
+    self.__vmax = float(vmax)
+    entries = _batch_rows(stops.ramp(size), 4)
+    under = under is None and entries[0] or _color_rgba(under)
+    over = over is None and entries[-1] or _color_rgba(over)
+    # The lookup table: under, the size entries, over, then bad.
+    self.__table = [tuple(under)] + entries + [tuple(over), _color_rgba(bad)]
+    self.__layoutTables = {}
 
-  @property
-  def html(self):
-    """This Color as an HTML color definition."""
-    return rgb_to_html(*self.__rgb)
-  @html.setter
-  def html(self, value):
-    self.__rgb = html_to_rgb(value)
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+  def __repr__(self):
+    return "Colormap(<%d entries, %g...%g>)" % (self.__size, self.__vmin, self.__vmax)
 
-  @property
-  def pil(self):
-    """This Color as a PIL compatible value."""
-    return rgb_to_pil(*self.__rgb)
-  @pil.setter
-  def pil(self, value):
-    self.__rgb = pil_to_rgb(value)
-    self.__hsl = rgb_to_hsl(*self.__rgb)
+  def __len__(self):
+    return self.__size
 
   @property
-  def websafe(self):
-    """The web safe color nearest to this one (RGB)."""
-    return rgb_to_websafe(*self.__rgb)
+  def gradient(self):
+    """The grapefruit.Gradient of this colormap."""
+    return self.__gradient
 
   @property
-  def greyscale(self):
-    """The greyscale equivalent to this color (RGB)."""
-    return rgb_to_greyscale(*self.rgb)
+  def range(self):
+    """The (vmin, vmax) range of the values mapped to the gradient."""
+    return (self.__vmin, self.__vmax)
+
+  def __index(self, value):
+    """Return the index in the lookup table of a value."""
+    if value != value:
+      return self.__size + 2
+    if value < self.__vmin:
+      return 0
+    if value > self.__vmax:
+      return self.__size + 1
+    if self.__vmax==self.__vmin:
+      return 1
+    return min(int((value - self.__vmin) * self.__size / (self.__vmax - self.__vmin)), self.__size - 1) + 1
+
+  def __call__(self, value):
+    """Return the color of a value, as a grapefruit.Color."""
+    r, g, b, a = self.__table[self.__index(float(value))]
+    return Color((r, g, b), 'rgb', a, self.__gradient.white_ref)
+
+  def __layout_table(self, layout):
+    """Return the lookup table of the pixels in layout, as a numpy array."""
+    table = self.__layoutTables.get(layout)
+    if table is None:
+      fmt, channels, order, alpha = _pixel_layout(layout)
+      rgba = np.array(self.__table)
+      table = np.zeros((len(rgba), channels), dtype=fmt)
+      table[:, list(order)] = _float_to_levels(rgba[:, :3], fmt)
+      if alpha is not None:
+        table[:, alpha] = _float_to_levels(rgba[:, 3], fmt)
+      self.__layoutTables[layout] = table
+    return table
+
+  def apply(self, values, layout='RGBA8', out=None):
+    """Map an array of values to a pixel buffer.
 
-  def with_alpha(self, alpha):
-    """Create a new instance based on this one with a new alpha value.
+    .. note::
+
+       This method requires numpy.
 
     Parameters:
-      :alpha:
-        The transparency of the new color [0...1].
+      :values:
+        A numpy array of any shape, or a buffer (e.g. an array.array) of
+        numbers.
+      :layout:
+        The layout of the pixels, one of PIXEL_LAYOUTS.
+      :out:
+        An optional writable buffer receiving the pixels.
 
     Returns:
-      A grapefruit.Color instance.
-
-    >>> Color.from_rgb(1.0, 0.5, 0.0, 1.0).with_alpha(0.5)
-    Color(1.0, 0.5, 0.0, 0.5)
+      out, or a new bytearray holding one pixel per value.
 
     """
-    return Color(self.__rgb, 'rgb', alpha, self.__wref)
+    _require_numpy('Colormap.apply')
+    values = _as_array(values)
+    if not isinstance(values, np.ndarray):
+      values = np.asarray(values)
+    values = values.reshape(-1)
+    if values.dtype.kind != 'f':
+      values = values.astype(np.float64)
+    table = self.__layout_table(layout)
+    if out is None:
+      out = bytearray(len(values) * table.shape[1] * table.dtype.itemsize)
+    dst = _pixel_array(out, layout)
+    if len(dst) != len(values):
+      raise ValueError("out must hold %d pixels" % len(values))
+
+    size = self.__size
+    vmin, vmax = self.__vmin, self.__vmax
+    # The infinite values give NaN when vmin==vmax, and are then replaced.
+    with np.errstate(invalid='ignore'):
+      for start in range(0, len(values), _PIXEL_CHUNK):
+        v = values[start:start + _PIXEL_CHUNK]
+        f = v.astype(np.float64)
+        f -= vmin
+        if vmax > vmin:
+          # The same operations as __index, so that both agree on the bin edges.
+          f *= size
+          f /= vmax - vmin
+        else:
+          f *= 0.0
+        np.floor(f, out=f)
+        np.clip(f, -1, size - 1, out=f)
+        f[v < vmin] = -1
+        f[v > vmax] = size
+        f[np.isnan(v)] = size + 1
+        f += 1
+        table.take(f.astype(np.intp), axis=0, out=dst[start:start + _PIXEL_CHUNK])
+    return out
+
+# --===========--------------------------------------------------------------
+# -- Pipelines --
+# --===========--
+
+# Batch conversions between the pipeline color spaces and RGB, as
+# space: (to_rgb(values, wref), from_rgb(values, wref), components).
+_PIPELINE_SPACES = {
+  'rgb'  : (None, None, 3),
+  'hsl'  : (lambda v, wref: hsl_to_rgb_batch(v), lambda v, wref: rgb_to_hsl_batch(v), 3),
+  'hsv'  : (lambda v, wref: hsv_to_rgb_batch(v), lambda v, wref: rgb_to_hsv_batch(v), 3),
+  'yiq'  : (lambda v, wref: yiq_to_rgb_batch(v), lambda v, wref: rgb_to_yiq_batch(v), 3),
+  'yuv'  : (lambda v, wref: yuv_to_rgb_batch(v), lambda v, wref: rgb_to_yuv_batch(v), 3),
+  'xyz'  : (lambda v, wref: xyz_to_rgb_batch(v), lambda v, wref: rgb_to_xyz_batch(v), 3),
+  'lab'  : (lambda v, wref: xyz_to_rgb_batch(lab_to_xyz_batch(v, wref)),
+            lambda v, wref: xyz_to_lab_batch(rgb_to_xyz_batch(v), wref), 3),
+  'cmy'  : (lambda v, wref: cmy_to_rgb_batch(v), lambda v, wref: rgb_to_cmy_batch(v), 3),
+  'cmyk' : (lambda v, wref: cmy_to_rgb_batch(cmyk_to_cmy_batch(v)),
+            lambda v, wref: cmy_to_cmyk_batch(rgb_to_cmy_batch(v)), 4),
+  'ints' : (lambda v, wref: ints_to_rgb_batch(v), lambda v, wref: rgb_to_ints_batch(v), 3)}
+
+def _pipeline_convert(values, space, target, wref):
+  if space==target:
+    return values
+  if space!='rgb':
+    values = _PIPELINE_SPACES[space][0](values, wref)
+  if target!='rgb':
+    values = _PIPELINE_SPACES[target][1](values, wref)
+  return values
+
+def _batch_rows(values, width=3):
+  """Return the values of a batch as a list of tuples."""
+  if isinstance(values, list):
+    return [tuple(v) for v in values]
+  if np is not None and isinstance(values, np.ndarray):
+    return [tuple(v) for v in values.tolist()]
+  return [tuple(values[i:i+width]) for i in range(0, len(values), width)]
+
+def _pipeline_batch(values):
+  """Return a list of color tuples as a new batch of components."""
+  if np is not None:
+    return np.array(values, dtype=np.float64).reshape(-1, 3)
+  return array.array('d', [v for c in values for v in c])
+
+def _pipeline_hsl_ops(hsl, ops):
+  """Apply HSL operations in place to a batch of HSL values.
+
+  Each operation is a tuple (channel, add, value, low, high): the channel is
+  incremented by value, or set to it if add is False, then clipped to
+  [low...high] (None meaning no bound).
 
-  def with_white_ref(self, wref, labAsRef=False):
-    """Create a new instance based on this one with a new white reference.
+  """
+  if np is not None:
+    for channel, add, value, low, high in ops:
+      column = hsl[:, channel]
+      if add:
+        column += value
+      else:
+        column[:] = value
+      if low is not None or high is not None:
+        np.clip(column, low, high, out=column)
+    return hsl
+
+  for channel, add, value, low, high in ops:
+    for i in range(channel, len(hsl), 3):
+      if add:
+        v = hsl[i] + value
+      else:
+        v = value
+      if low is not None and v < low: v = low
+      if high is not None and v > high: v = high
+      hsl[i] = v
+  return hsl
+
+class Pipeline(object):
+  """A lazy chain of transformations applied to a stream of colors.
+
+  A pipeline is built by chaining its methods, each one returning a new
+  pipeline, then applied to an iterable or an async iterable of colors with
+  run. The colors are read and converted a chunk at a time, with the batch
+  conversions, so the stream never needs to fit in memory.
+
+  Adjacent HSL operations (darker, saturate, with_hue...) are fused: the
+  colors are converted to HSL once, every operation is applied, then they
+  are converted back once, instead of creating an intermediate Color for
+  each step.
+
+  Example usage:
+
+    >>> p = pipeline().parse_html().darker(0.25).saturate(0.5).to('html')
+    >>> list(p.run(['#ff8000', 'grey']))
+    [['#804000', '#602020']]
+
+  """
+
+  def __init__(self, chunkSize=1024, wref=_DEFAULT_WREF, source='rgb', stages=(), target='rgb'):
+    """Instantiate a new grapefruit.Pipeline object.
+
+    Use the pipeline function instead of calling this constructor directly.
 
     Parameters:
+      :chunkSize:
+        The number of colors converted at once.
       :wref:
-        The whitepoint reference.
-      :labAsRef:
-        If True, the L*a*b* values of the current instance are used as reference
-        for the new color; otherwise, the RGB values are used as reference.
+        The whitepoint reference of the L*a*b* conversions.
+      :source:
+        The representation of the input colors.
+      :stages:
+        A tuple of ('hsl', ops) or ('map', func) stages.
+      :target:
+        The representation of the results.
 
-    Returns:
-      A grapefruit.Color instance.
+    """
+    if chunkSize < 1:
+      raise ValueError("chunkSize must be positive")
+    self.__chunkSize = chunkSize
+    self.__wref = wref
+    self.__source = source
+    self.__stages = tuple(stages)
+    self.__target = target
 
+  def __repr__(self):
+    stages = ''.join(['.%s(...)' % stage[0] for stage in self.__stages])
+    return 'Pipeline(%s%s -> %s)' % (self.__source, stages, self.__target)
 
-    >>> c = Color.from_rgb(1.0, 0.5, 0.0, 1.0, WHITE_REFERENCE['std_D65'])
+  def __copy(self, source=None, stages=None, target=None):
+    return Pipeline(self.__chunkSize, self.__wref,
+      source or self.__source,
+      self.__stages if stages is None else stages,
+      target or self.__target)
 
-    >>> c2 = c.with_white_ref(WHITE_REFERENCE['sup_D50'])
-    >>> c2.rgb
-    (1.0, 0.5, 0.0)
-    >>> '(%g, %g, %g)' % c2.white_ref
-    '(0.967206, 1, 0.81428)'
+  def __hsl_op(self, op):
+    stages = self.__stages
+    if stages and stages[-1][0]=='hsl':
+      # Fuse with the previous HSL operations.
+      return self.__copy(stages=stages[:-1] + (('hsl', stages[-1][1] + (op,)),))
+    return self.__copy(stages=stages + (('hsl', (op,)),))
 
-    >>> c2 = c.with_white_ref(WHITE_REFERENCE['sup_D50'], labAsRef=True)
-    >>> '(%g, %g, %g)' % c2.rgb
-    '(1.01463, 0.490341, -0.148133)'
-    >>> '(%g, %g, %g)' % c2.white_ref
-    '(0.967206, 1, 0.81428)'
-    >>> '(%g, %g, %g)' % c.lab
-    '(66.9518, 0.430841, 0.739692)'
-    >>> '(%g, %g, %g)' % c2.lab
-    '(66.9518, 0.430841, 0.739693)'
+  # --=========--
+  # -- Input --
+  # --=========--
+
+  def parse_html(self):
+    """Read the colors as HTML definitions (#RRGGBB, #RGB or a color name).
+
+    Returns:
+      A grapefruit.Pipeline instance.
 
     """
-    if labAsRef:
-      l, a, b = self.lab
-      return Color.from_lab(l, a, b, self.__a, wref)
-    else:
-      return Color(self.__rgb, 'rgb', self.__a, wref)
+    return self.__copy(source='html')
 
-  def with_hue(self, hue):
-    """Create a new instance based on this one with a new hue.
+  def parse(self, mode):
+    """Read the colors as tuples of values in the specified representation.
 
     Parameters:
-      :hue:
-        The hue of the new color [0...360].
+      :mode:
+        One of 'rgb', 'hsl', 'hsv', 'yiq', 'yuv', 'xyz', 'lab', 'cmy',
+        'cmyk' or 'ints'. The default is 'rgb'.
 
     Returns:
-      A grapefruit.Color instance.
-
-    >>> Color.from_hsl(30, 1, 0.5).with_hue(60)
-    Color(1.0, 1.0, 0.0, 1.0)
-    >>> Color.from_hsl(30, 1, 0.5).with_hue(60).hsl
-    (60.0, 1.0, 0.5)
+      A grapefruit.Pipeline instance.
 
     """
-    h, s, l = self.__hsl
-    return Color((hue, s, l), 'hsl', self.__a, self.__wref)
+    if mode not in _PIPELINE_SPACES:
+      raise ValueError("Invalid color mode: " + mode)
+    return self.__copy(source=mode)
+
+  # --================--
+  # -- Transformations --
+  # --================--
+
+  def darker(self, level):
+    """Darken the colors, see Color.darker."""
+    return self.__hsl_op((2, True, -level, 0.0, None))
+
+  def lighter(self, level):
+    """Lighten the colors, see Color.lighter."""
+    return self.__hsl_op((2, True, level, None, 1.0))
+
+  def saturate(self, level):
+    """Saturate the colors, see Color.saturate."""
+    return self.__hsl_op((1, True, level, None, 1.0))
+
+  def desaturate(self, level):
+    """Desaturate the colors, see Color.desaturate."""
+    return self.__hsl_op((1, True, -level, 0.0, None))
+
+  def with_hue(self, hue):
+    """Set the hue of the colors, see Color.with_hue."""
+    return self.__hsl_op((0, False, hue, None, None))
 
   def with_saturation(self, saturation):
-    """Create a new instance based on this one with a new saturation value.
+    """Set the saturation of the colors, see Color.with_saturation."""
+    return self.__hsl_op((1, False, saturation, None, None))
 
-    .. note::
+  def with_lightness(self, lightness):
+    """Set the lightness of the colors, see Color.with_lightness."""
+    return self.__hsl_op((2, False, lightness, None, None))
 
-       The saturation is defined for the HSL mode.
+  def map(self, func):
+    """Transform each color with a function.
 
     Parameters:
-      :saturation:
-        The saturation of the new color [0...1].
+      :func:
+        A function called with the r, g, b values [0...1] of a color and
+        returning a new (r, g, b) tuple.
 
     Returns:
-      A grapefruit.Color instance.
-
-    >>> Color.from_hsl(30, 1, 0.5).with_saturation(0.5)
-    Color(0.75, 0.5, 0.25, 1.0)
-    >>> Color.from_hsl(30, 1, 0.5).with_saturation(0.5).hsl
-    (30.0, 0.5, 0.5)
+      A grapefruit.Pipeline instance.
 
     """
-    h, s, l = self.__hsl
-    return Color((h, saturation, l), 'hsl', self.__a, self.__wref)
+    return self.__copy(stages=self.__stages + (('map', func),))
 
-  def with_lightness(self, lightness):
-    """Create a new instance based on this one with a new lightness value.
+  # --==========--
+  # -- Output --
+  # --==========--
+
+  def to(self, mode):
+    """Set the representation of the results.
 
     Parameters:
-      :lightness:
-        The lightness of the new color [0...1].
+      :mode:
+        One of the modes of parse, 'html' or 'color' for Color instances.
 
     Returns:
-      A grapefruit.Color instance.
-
-    >>> Color.from_hsl(30, 1, 0.5).with_lightness(0.25)
-    Color(0.5, 0.25, 0.0, 1.0)
-    >>> Color.from_hsl(30, 1, 0.5).with_lightness(0.25).hsl
-    (30.0, 1.0, 0.25)
+      A grapefruit.Pipeline instance.
 
     """
-    h, s, l = self.__hsl
-    return Color((h, s, lightness), 'hsl', self.__a, self.__wref)
+    if mode not in _PIPELINE_SPACES and mode not in ('html', 'color'):
+      raise ValueError("Invalid color mode: " + mode)
+    return self.__copy(target=mode)
 
-  def darker(self, level):
-    """Create a new instance based on this one but darker.
+  def process(self, colors):
+    """Apply the pipeline to a list of colors.
 
     Parameters:
-      :level:
-        The amount by which the color should be darkened to produce
-        the new one [0...1].
+      :colors:
+        A list of colors, in the representation set by parse.
 
     Returns:
-      A grapefruit.Color instance.
+      The list of results, in the representation set by to.
 
-    >>> Color.from_hsl(30, 1, 0.5).darker(0.25)
-    Color(0.5, 0.25, 0.0, 1.0)
-    >>> Color.from_hsl(30, 1, 0.5).darker(0.25).hsl
-    (30.0, 1.0, 0.25)
+    >>> pipeline().parse('hsl').lighter(0.25).to('hsl').process([(30, 1, 0.5)])
+    [(30.0, 1.0, 0.75)]
 
     """
-    h, s, l = self.__hsl
-    return Color((h, s, max(l - level, 0)), 'hsl', self.__a, self.__wref)
-
-  def lighter(self, level):
-    """Create a new instance based on this one but lighter.
+    if not colors:
+      return []
+    wref = self.__wref
+    if self.__source=='html':
+      values, space = [html_to_rgb(html) for html in colors], 'rgb'
+    else:
+      values, space = list(colors), self.__source
+
+    for kind, arg in self.__stages:
+      if kind=='hsl':
+        if space=='hsl' and isinstance(values, list):
+          values = _pipeline_batch(values)
+        values = _pipeline_hsl_ops(_pipeline_convert(values, space, 'hsl', wref), arg)
+        space = 'hsl'
+      else:
+        values = _batch_rows(_pipeline_convert(values, space, 'rgb', wref))
+        values, space = [tuple(arg(*rgb)) for rgb in values], 'rgb'
+
+    target = self.__target
+    if target in ('html', 'color'):
+      rgb = _batch_rows(_pipeline_convert(values, space, 'rgb', wref))
+      if target=='html':
+        return [rgb_to_html(*v) for v in rgb]
+      return [Color(v, 'rgb', 1.0, wref) for v in rgb]
+    values = _pipeline_convert(values, space, target, wref)
+    return _batch_rows(values, _PIPELINE_SPACES[target][2])
+
+  def run(self, colors):
+    """Apply the pipeline to a stream of colors.
 
     Parameters:
-      :level:
-        The amount by which the color should be lightened to produce
-        the new one [0...1].
+      :colors:
+        An iterable or an async iterable of colors, in the representation
+        set by parse.
 
     Returns:
-      A grapefruit.Color instance.
+      An iterator over lists of results of at most chunkSize items, or an
+      async iterator if colors is an async iterable.
+
+    """
+    if hasattr(colors, '__aiter__'):
+      return _AsyncPipelineRun(self, colors, self.__chunkSize)
+    return self.__run(colors)
+
+  __call__ = run
+
+  def __run(self, colors):
+    chunkSize = self.__chunkSize
+    chunk = []
+    for color in colors:
+      chunk.append(color)
+      if len(chunk)==chunkSize:
+        yield self.process(chunk)
+        chunk = []
+    if chunk:
+      yield self.process(chunk)
+
+class _AsyncPipelineRun(object):
+  """Async iterator over the chunks of results of a pipeline.
+
+  The futures are chained with callbacks rather than coroutines, so that
+  the module keeps a syntax importable by Python 2.
+
+  """
+
+  def __init__(self, pipeline, colors, chunkSize):
+    self.__pipeline = pipeline
+    self.__colors = colors.__aiter__()
+    self.__chunkSize = chunkSize
+    self.__done = False
+
+  def __aiter__(self):
+    return self
+
+  def __anext__(self):
+    import asyncio
+    result = asyncio.get_event_loop().create_future()
+    if self.__done:
+      result.set_exception(StopAsyncIteration())
+      return result
+    chunk = []
+
+    def complete():
+      try:
+        result.set_result(self.__pipeline.process(chunk))
+      except Exception as e:
+        result.set_exception(e)
+
+    def received(future):
+      if result.cancelled():
+        return
+      if future.cancelled():
+        result.cancel()
+        return
+      error = future.exception()
+      if isinstance(error, StopAsyncIteration):
+        self.__done = True
+        if chunk:
+          complete()
+        else:
+          result.set_exception(StopAsyncIteration())
+      elif error is not None:
+        result.set_exception(error)
+      else:
+        chunk.append(future.result())
+        if len(chunk)==self.__chunkSize:
+          complete()
+        else:
+          fetch()
+
+    def fetch():
+      asyncio.ensure_future(self.__colors.__anext__()).add_done_callback(received)
+
+    fetch()
+    return result
+
+def pipeline(chunkSize=1024, wref=_DEFAULT_WREF):
+  """Create an empty pipeline of color transformations.
+
+  Parameters:
+    :chunkSize:
+      The number of colors converted at once.
+    :wref:
+      The whitepoint reference of the L*a*b* conversions, default is 2° D65.
+
+  Returns:
+    A grapefruit.Pipeline instance, reading and returning RGB tuples.
+
+  >>> p = pipeline().darker(0.25).to('ints')
+  >>> list(p.run([(1, 0.5, 0), (0, 0, 1)]))
+  [[(128, 64, 0), (0, 0, 128)]]
+
+  """
+  return Pipeline(chunkSize, wref)
+
+# --===============--------------------------------------------------------------
+# -- Pixel buffers --
+# --===============--
+
+# The layouts of raw pixel buffers, as
+# (item format, channels per pixel, positions of r, g, b, position of alpha).
+# The 16 bits layouts use the native byte order. The float layouts hold the
+# components of any color space, e.g. the L*a*b* values of a conversion.
+PIXEL_LAYOUTS = {
+  'RGB8'    : ('B', 3, (0, 1, 2), None),
+  'RGBA8'   : ('B', 4, (0, 1, 2), 3),
+  'BGRA8'   : ('B', 4, (2, 1, 0), 3),
+  'BGR8'    : ('B', 3, (2, 1, 0), None),
+  'RGB16'   : ('H', 3, (0, 1, 2), None),
+  'RGBA16'  : ('H', 4, (0, 1, 2), 3),
+  'RGBF32'  : ('f', 3, (0, 1, 2), None),
+  'RGBAF32' : ('f', 4, (0, 1, 2), 3),
+  'RGBF64'  : ('d', 3, (0, 1, 2), None),
+  'RGBAF64' : ('d', 4, (0, 1, 2), 3)}
+
+# Number of pixels converted at once, so that the float intermediates stay
+# small whatever the size of the buffer.
+_PIXEL_CHUNK = 1 << 16
+
+def _pixel_layout(layout):
+  try:
+    return PIXEL_LAYOUTS[layout]
+  except KeyError:
+    raise ValueError("Invalid pixel layout: %s" % layout)
+
+def _pixel_size(layout):
+  """Return the size of a pixel in bytes."""
+  fmt, channels = _pixel_layout(layout)[:2]
+  return array.array(fmt).itemsize * channels
+
+def _pixel_array(buf, layout):
+  """Return an (N, channels) numpy view of a raw pixel buffer."""
+  fmt, channels = _pixel_layout(layout)[:2]
+  if isinstance(buf, np.ndarray):
+    if not buf.flags.c_contiguous:
+      raise ValueError("pixel arrays must be C-contiguous")
+    buf = buf.reshape(-1).view(np.uint8)
+  pixels = np.frombuffer(buf, dtype=fmt)
+  if pixels.size % channels:
+    raise ValueError("the buffer size is not a multiple of the %s pixel size" % layout)
+  return pixels.reshape(-1, channels)
+
+def _levels_to_float(levels, fmt):
+  if fmt=='B': return levels / 255.0
+  if fmt=='H': return levels / 65535.0
+  return levels.astype(np.float64)
+
+def _float_to_levels(values, fmt):
+  if fmt=='B': return np.rint(np.clip(values, 0.0, 1.0) * 255.0)
+  if fmt=='H': return np.rint(np.clip(values, 0.0, 1.0) * 65535.0)
+  return values
+
+def convert_pixels(src, srcLayout='RGB8', dstLayout='RGBA8', conversion=None, out=None, alpha=1.0):
+  """Convert a raw pixel buffer to another layout and/or color space.
+
+  The buffers are read and written in place through numpy views, a chunk of
+  pixels at a time, without creating any object per pixel.
+
+  .. note::
+
+     This function requires numpy.
+
+  Parameters:
+    :src:
+      The source pixels: bytes, bytearray, memoryview, array.array, numpy
+      array or any other buffer holding pixels in srcLayout.
+    :srcLayout:
+      The layout of the source pixels, one of PIXEL_LAYOUTS.
+    :dstLayout:
+      The layout of the converted pixels, one of PIXEL_LAYOUTS.
+    :conversion:
+      An optional batch conversion, called with (N, 3) float arrays of RGB
+      values [0...1] and returning (N, 3) arrays, e.g. rgb_to_hsl_batch.
+      Without conversion, the pixels are only reordered and requantized.
+    :out:
+      An optional writable buffer receiving the pixels in dstLayout.
+    :alpha:
+      The alpha value [0...1] of the converted pixels when srcLayout has no
+      alpha channel.
 
-    >>> Color.from_hsl(30, 1, 0.5).lighter(0.25)
-    Color(1.0, 0.75, 0.5, 1.0)
-    >>> Color.from_hsl(30, 1, 0.5).lighter(0.25).hsl
-    (30.0, 1.0, 0.75)
+  Returns:
+    out, or a new bytearray holding the converted pixels.
 
-    """
-    h, s, l = self.__hsl
-    return Color((h, s, min(l + level, 1)), 'hsl', self.__a, self.__wref)
+  >>> list(convert_pixels(bytearray((255, 128, 0)), 'RGB8', 'BGRA8'))  # doctest: +SKIP
+  [0, 128, 255, 255]
+  >>> hsl = convert_pixels(bytearray((255, 128, 0)), 'RGB8', 'RGBF64', rgb_to_hsl_batch)  # doctest: +SKIP
+  >>> np.frombuffer(hsl).round(4).tolist()  # doctest: +SKIP
+  [30.1176, 1.0, 0.5]
 
-  def saturate(self, level):
-    """Create a new instance based on this one but more saturated.
+  """
+  _require_numpy('convert_pixels')
+  srcFmt, srcChannels, srcOrder, srcAlpha = _pixel_layout(srcLayout)
+  dstFmt, dstChannels, dstOrder, dstAlpha = _pixel_layout(dstLayout)
+
+  pixels = _pixel_array(src, srcLayout)
+  if out is None:
+    out = bytearray(len(pixels) * dstChannels * np.dtype(dstFmt).itemsize)
+  dst = _pixel_array(out, dstLayout)
+  if len(dst) != len(pixels):
+    raise ValueError("out must hold %d pixels" % len(pixels))
+  if not dst.flags.writeable:
+    raise ValueError("out must be a writable buffer")
+
+  srcOrder = list(srcOrder)
+  dstOrder = list(dstOrder)
+  for start in range(0, len(pixels), _PIXEL_CHUNK):
+    s = pixels[start:start+_PIXEL_CHUNK]
+    d = dst[start:start+_PIXEL_CHUNK]
+
+    if conversion is None and srcFmt==dstFmt:
+      d[:, dstOrder] = s[:, srcOrder]
+    else:
+      rgb = _levels_to_float(s[:, srcOrder], srcFmt)
+      if conversion is not None:
+        rgb = conversion(rgb)
+      d[:, dstOrder] = _float_to_levels(rgb, dstFmt)
+
+    if dstAlpha is None:
+      continue
+    if srcAlpha is None:
+      d[:, dstAlpha] = _float_to_levels(np.float64(alpha), dstFmt)
+    elif srcFmt==dstFmt:
+      d[:, dstAlpha] = s[:, srcAlpha]
+    else:
+      d[:, dstAlpha] = _float_to_levels(_levels_to_float(s[:, srcAlpha], srcFmt), dstFmt)
 
-    Parameters:
-      :level:
-        The amount by which the color should be saturated to produce
-        the new one [0...1].
+  return out
 
-    Returns:
-      A grapefruit.Color instance.
+if hasattr(os, 'replace'):
+  _replace_file = os.replace
+else:
+  def _replace_file(src, dst):
+    if os.path.exists(dst):
+      os.remove(dst)
+    os.rename(src, dst)
 
-    >>> Color.from_hsl(30, 0.5, 0.5).saturate(0.25)
-    Color(0.875, 0.5, 0.125, 1.0)
-    >>> Color.from_hsl(30, 0.5, 0.5).saturate(0.25).hsl
-    (30.0, 0.75, 0.5)
+def convert_file(srcPath, dstPath, srcLayout='RGB16', dstLayout='RGB16', conversion=None, tileSize=1 << 20, offset=0, resume=True):
+  """Convert a raw pixel file to another file, one tile at a time.
 
-    """
-    h, s, l = self.__hsl
-    return Color((h, min(s + level, 1), l), 'hsl', self.__a, self.__wref)
+  Both files are memory-mapped a tile at a time, so the memory used stays
+  bounded by the tile size whatever the size of the image. The number of
+  finished tiles is recorded in a dstPath + '.progress' file, removed once
+  the conversion completes: if the process dies, calling convert_file again
+  with the same arguments resumes after the last finished tile.
 
-  def desaturate(self, level):
-    """Create a new instance based on this one but less saturated.
+  .. note::
 
-    Parameters:
-      :level:
-        The amount by which the color should be desaturated to produce
-        the new one [0...1].
+     This function requires numpy.
 
-    Returns:
-      A grapefruit.Color instance.
+  Parameters:
+    :srcPath:
+      The path of the raw source file.
+    :dstPath:
+      The path of the raw file to write.
+    :srcLayout:
+      The layout of the source pixels, one of PIXEL_LAYOUTS.
+    :dstLayout:
+      The layout of the converted pixels, one of PIXEL_LAYOUTS.
+    :conversion:
+      An optional batch conversion, see convert_pixels.
+    :tileSize:
+      The number of pixels converted per tile.
+    :offset:
+      The size of the header to skip at the start of the source file.
+    :resume:
+      If False, always restart the conversion from the first tile.
 
-    >>> Color.from_hsl(30, 0.5, 0.5).desaturate(0.25)
-    Color(0.625, 0.5, 0.375, 1.0)
-    >>> Color.from_hsl(30, 0.5, 0.5).desaturate(0.25).hsl
-    (30.0, 0.25, 0.5)
+  Returns:
+    The number of pixels in the file.
 
-    """
-    h, s, l = self.__hsl
-    return Color((h, max(s - level, 0), l), 'hsl', self.__a, self.__wref)
+  """
+  _require_numpy('convert_file')
+  srcPixelSize = _pixel_size(srcLayout)
+  dstPixelSize = _pixel_size(dstLayout)
+
+  size = os.path.getsize(srcPath) - offset
+  if size < 0 or size % srcPixelSize:
+    raise ValueError("%s does not hold %s pixels" % (srcPath, srcLayout))
+  count = size // srcPixelSize
+
+  progressPath = dstPath + '.progress'
+  signature = '%s %s %d %d' % (srcLayout, dstLayout, count, tileSize)
+  tile = 0
+  if resume and os.path.exists(progressPath) and os.path.exists(dstPath):
+    with open(progressPath) as f:
+      done, _, previous = f.read().strip().partition(' ')
+    if previous==signature:
+      tile = int(done)
+  if tile==0:
+    with open(dstPath, 'wb') as f:
+      f.truncate(count * dstPixelSize)
+
+  for start in range(tile * tileSize, count, tileSize):
+    n = min(tileSize, count - start)
+    src = np.memmap(srcPath, np.uint8, 'r', offset + (start * srcPixelSize), (n * srcPixelSize,))
+    dst = np.memmap(dstPath, np.uint8, 'r+', start * dstPixelSize, (n * dstPixelSize,))
+    convert_pixels(src, srcLayout, dstLayout, conversion, dst)
+    dst.flush()
+    del src, dst
+
+    tile += 1
+    with open(progressPath + '.tmp', 'w') as f:
+      f.write('%d %s' % (tile, signature))
+    _replace_file(progressPath + '.tmp', progressPath)
+
+  if os.path.exists(progressPath):
+    os.remove(progressPath)
+  return count
+
+# --======================----------------------------------------------------
+# -- Palette extraction --
+# --======================--
+
+# Number of pixels binned at once by the histograms.
+_HISTOGRAM_CHUNK = 1 << 20
+
+def _pixel_histogram(src, layout, bits, sample=None):
+  """Return the (mean RGB values, pixel counts) of the non-empty bins.
+
+  Each RGB component is quantized to bits, and the fully transparent pixels
+  are left out. With sample, only about that many evenly spaced pixels are
+  binned.
 
-  def nearest_legal(self):
-    """Create a new instance that is the nearest legal color to this one.
+  """
+  fmt, channels, order, alpha = _pixel_layout(layout)
+  pixels = _pixel_array(src, layout)
+  if sample and len(pixels) > sample:
+    pixels = pixels[::-(-len(pixels) // sample)]
+  levels = 1 << bits
+  size = levels ** 3
+  counts = np.zeros(size)
+  sums = np.zeros((3, size))
+  if fmt in 'BH':
+    shift = 8 * np.dtype(fmt).itemsize - bits
+    if shift < 0:
+      raise ValueError("bits must be at most %d for the %s layout" % (bits + shift, layout))
+  for start in range(0, len(pixels), _HISTOGRAM_CHUNK):
+    chunk = pixels[start:start + _HISTOGRAM_CHUNK]
+    if alpha is not None:
+      chunk = chunk[chunk[:, alpha] > 0]
+    rgb = [chunk[:, i] for i in order]
+    if fmt in 'BH':
+      q = [(c >> shift).astype(np.intp) for c in rgb]
+    else:
+      rgb = [np.clip(c, 0.0, 1.0) for c in rgb]
+      q = [np.floor(np.minimum(c * levels, levels - 1)).astype(np.intp) for c in rgb]
+    index = (q[0] * levels + q[1]) * levels + q[2]
+    counts += np.bincount(index, minlength=size)
+    for i in range(3):
+      sums[i] += np.bincount(index, rgb[i], size)
+
+  index = np.flatnonzero(counts)
+  counts = counts[index]
+  rgb = (sums[:, index] / counts).T
+  if fmt in 'BH':
+    rgb /= (1 << (8 * np.dtype(fmt).itemsize)) - 1
+  return rgb, counts
+
+def _median_cut(lab, weights, count):
+  """Split the weighted points in count boxes, return their point indexes.
+
+  The box with the largest weighted squared error is split at the weighted
+  median of its axis of largest variance, until there are count boxes or
+  none of them can be split.
 
-    >>> Color.from_rgb(2.0, 0.0, 3.0).nearest_legal()
-    Color(1.0, 0.0, 1.0, 1.0)
-    """
-    return Color.from_rgb(*[max(min(v, 1.0), 0.0) for v in self])
+  """
+  def stats(box):
+    w = weights[box]
+    var = np.average((lab[box] - np.average(lab[box], axis=0, weights=w)) ** 2, axis=0, weights=w)
+    return var.sum() * w.sum(), var.argmax()
+
+  boxes = [(np.arange(len(lab)),) + stats(np.arange(len(lab)))]
+  while len(boxes) < count:
+    best = max(range(len(boxes)), key=lambda i: boxes[i][1])
+    box, error, axis = boxes[best]
+    if len(box) < 2 or error <= 0:
+      break
+    del boxes[best]
+    box = box[np.argsort(lab[box, axis], kind='mergesort')]
+    cumul = np.cumsum(weights[box])
+    split = min(max(np.searchsorted(cumul, cumul[-1] / 2) + 1, 1), len(box) - 1)
+    boxes.extend([(half,) + stats(half) for half in (box[:split], box[split:])])
+  return [box for box, error, axis in boxes]
+
+def _kmeans(lab, weights, centers, iterations):
+  """Refine the centers of weighted points with Lloyd's algorithm.
+
+  A center left without points is moved to the point the farthest from its
+  own center. Returns the (centers, labels) of the clusters.
 
-  def websafe_dither(self):
-    """Return the two websafe colors nearest to this one.
+  """
+  def assign(centers):
+    d = lab[:, np.newaxis, :] - centers[np.newaxis, :, :]
+    d = np.einsum('ijk,ijk->ij', d, d)
+    labels = d.argmin(axis=1)
+    return labels, d[np.arange(len(lab)), labels]
+
+  labels, error = assign(centers)
+  for i in range(iterations):
+    total = np.bincount(labels, weights, len(centers))
+    new = centers.copy()
+    used = total > 0
+    for axis in range(3):
+      new[used, axis] = np.bincount(labels, weights * lab[:, axis], len(centers))[used] / total[used]
+    for empty in np.flatnonzero(~used)[:len(lab)]:
+      far = error.argmax()
+      new[empty] = lab[far]
+      error[far] = 0
+    moved = np.abs(new - centers).max()
+    centers = new
+    labels, error = assign(centers)
+    if moved < 1e-3:
+      break
+  return centers, labels
+
+def extract_palette(src, count=8, layout='RGB8', method='kmeans', bits=5, sample=1 << 22, iterations=20, wref=_DEFAULT_WREF):
+  """Extract the dominant colors of a raw pixel buffer.
+
+  The pixels are first binned in a histogram of (2**bits)**3 RGB cells, so
+  the clustering works on a few thousand weighted L*a*b* points whatever the
+  size of the image; the larger images are also sampled down to about sample
+  evenly spaced pixels before binning. The cells are then grouped by median cut; with the
+  'kmeans' method, the median cut clusters seed a weighted k-means, which
+  gives the clusters of similar colors more evenly sized in L*a*b*.
+
+  The fully transparent pixels are ignored.
 
-    Returns:
-      A tuple of two grapefruit.Color instances which are the two
-      web safe colors closest this one.
+  .. note::
 
-    >>> c = Color.from_rgb(1.0, 0.45, 0.0)
-    >>> c1, c2 = c.websafe_dither()
-    >>> c1
-    Color(1.0, 0.4, 0.0, 1.0)
-    >>> c2
-    Color(1.0, 0.6, 0.0, 1.0)
+     This function requires numpy.
 
-    """
-    return (
-      Color(rgb_to_websafe(*self.__rgb), 'rgb', self.__a, self.__wref),
-      Color(rgb_to_websafe(alt=True, *self.__rgb), 'rgb', self.__a, self.__wref))
+  Parameters:
+    :src:
+      The pixels: bytes, bytearray, memoryview, array.array, numpy array or
+      any other buffer holding pixels in layout.
+    :count:
+      The maximum number of colors to extract.
+    :layout:
+      The layout of the pixels, one of PIXEL_LAYOUTS.
+    :method:
+      The clustering method, 'kmeans' or 'median_cut'.
+    :bits:
+      The number of bits per RGB component of the histogram.
+    :sample:
+      The number of pixels binned from the larger images, None to bin all of
+      them.
+    :iterations:
+      The maximum number of k-means iterations.
+    :wref:
+      The whitepoint reference of the L*a*b* values, default is 2° D65.
 
-  def complementary_color(self, mode='ryb'):
-    """Create a new instance which is the complementary color of this one.
+  Returns:
+    A list of (grapefruit.Color, weight) tuples, where weight is the fraction
+    [0...1] of the pixels in the cluster, the most populated first.
 
-    Parameters:
-      :mode:
-        Select which color wheel to use for the generation (ryb/rgb).
+  >>> pixels = bytearray((255, 128, 0) * 3 + (0, 0, 255))
+  >>> [(col.html, w) for col, w in extract_palette(pixels, 2)]  # doctest: +SKIP
+  [('#ff8000', 0.75), ('#0000ff', 0.25)]
 
+  """
+  _require_numpy('extract_palette')
+  if method not in ('kmeans', 'median_cut'):
+    raise ValueError("Invalid palette extraction method: %s" % method)
+  rgb, weights = _pixel_histogram(src, layout, bits, sample)
+  if not len(rgb):
+    return []
+  lab = xyz_to_lab_batch(rgb_to_xyz_batch(rgb), wref)
+  lab[:, 1:] *= _LAB_AB_SCALE
+
+  boxes = _median_cut(lab, weights, count)
+  centers = np.array([np.average(lab[box], axis=0, weights=weights[box]) for box in boxes])
+  if method=='kmeans':
+    centers, labels = _kmeans(lab, weights, centers, iterations)
+    totals = np.bincount(labels, weights, len(centers))
+  else:
+    totals = np.array([weights[box].sum() for box in boxes])
+
+  keep = np.argsort(-totals, kind='mergesort')
+  keep = keep[totals[keep] > 0]
+  centers = centers[keep]
+  centers[:, 1:] /= _LAB_AB_SCALE
+  rgb = np.clip(xyz_to_rgb_batch(lab_to_xyz_batch(centers, wref)), 0.0, 1.0)
+  totals = totals[keep] / weights.sum()
+  return [(Color(tuple(c), 'rgb', 1.0, wref), w) for c, w in zip(rgb.tolist(), totals.tolist())]
+
+# --===========---------------------------------------------------------------
+# -- Dithering --
+# --===========--
+#
+# The pixels are dithered in level units (0...255 for the 8 bits layouts),
+# where the palette colors are integers. The diffused errors are then sums of
+# integers divided by powers of two, which the floats hold exactly: the
+# result does not depend on the order in which the errors are accumulated,
+# and the vectorized and pure python paths give the same pixels.
+
+# The error diffusion kernels, as (divisor, ((dx, dy, weight), ...)).
+_DITHER_KERNELS = {
+  'floyd_steinberg': (16.0, ((1, 0, 7), (-1, 1, 3), (0, 1, 5), (1, 1, 1))),
+  'atkinson': (8.0, ((1, 0, 1), (2, 0, 1), (-1, 1, 1), (0, 1, 1), (1, 1, 1), (0, 2, 1)))}
+
+# Number of pixels in the bands of rows dithered together with numpy.
+_DITHER_BAND = 1 << 18
+
+def _bayer_matrix(size):
+  """Return the size x size Bayer threshold matrix, as lists of [0...1) values."""
+  m = [[0]]
+  while len(m) < size:
+    n = len(m)
+    m = ([[4 * v for v in row] + [4 * v + 2 for v in row] for row in m] +
+         [[4 * v + 3 for v in row] + [4 * v + 1 for v in row] for row in m])
+  area = float(size * size)
+  return [[(v + 0.5) / area for v in row] for row in m]
+
+def _dither_method(method):
+  if method=='bayer':
+    return None
+  try:
+    divisor, taps = _DITHER_KERNELS[method]
+  except KeyError:
+    raise ValueError("Invalid dithering method: %s" % method)
+  return [(dx, dy, w / divisor) for dx, dy, w in taps]
+
+def _dither_levels(fmt):
+  """Return the value of the full intensity in the levels of fmt."""
+  return {'B': 255.0, 'H': 65535.0}.get(fmt, 1.0)
+
+def _dither_palette(palette, maxLevel):
+  """Return the palette colors in levels, or None for the web safe cube."""
+  if palette is None:
+    return None
+  if isinstance(palette, Palette):
+    palette = [palette[key] for key in palette.keys()]
+  colors = []
+  for col in palette:
+    if isinstance(col, Color):
+      col = col.rgb
+    col = [min(max(v, 0.0), 1.0) * maxLevel for v in col]
+    if maxLevel > 1:
+      col = [float(int(v + 0.5)) for v in col]
+    colors.append(tuple(col))
+  if not colors:
+    raise ValueError("the palette is empty")
+  return colors
+
+def _bayer_spread(colors, maxLevel):
+  """Return the amplitude of the ordered dithering threshold, in levels.
+
+  This is the spacing of an evenly spaced palette with as many colors, e.g.
+  one step of the web safe cube for 216 colors.
 
-    Returns:
-      A grapefruit.Color instance.
+  """
+  count = colors is None and 216 or len(colors)
+  return maxLevel / max(int(round(count ** (1.0 / 3))) - 1, 1)
+
+def _py_quantizer(colors, maxLevel):
+  """Return a function mapping (r, g, b) levels to the nearest palette color."""
+  if colors is None:
+    step = maxLevel / 5
+    def quantize(r, g, b):
+      # The closed form quantizer of the 6 levels of the web safe cube.
+      return tuple([min(max(math.floor(v / step + 0.5), 0.0), 5.0) * step for v in (r, g, b)])
+    return quantize
+
+  def quantize(r, g, b):
+    best, bestDist = None, None
+    for col in colors:
+      dr = r - col[0]
+      dg = g - col[1]
+      db = b - col[2]
+      d = dr * dr + dg * dg + db * db
+      if bestDist is None or d < bestDist:
+        best, bestDist = col, d
+    return best
+  return quantize
+
+def _np_quantizer(colors, maxLevel):
+  """Return a function mapping an (N, 3) array of levels to the palette."""
+  if colors is None:
+    step = maxLevel / 5
+    return lambda v: np.clip(np.floor(v / step + 0.5), 0.0, 5.0) * step
+  colors = np.array(colors)
+  def quantize(v):
+    d = v[:, np.newaxis, :] - colors[np.newaxis, :, :]
+    d *= d
+    return colors[(d[:, :, 0] + d[:, :, 1] + d[:, :, 2]).argmin(axis=1)]
+  return quantize
+
+def _py_row_values(row, fmt):
+  if not _TYPED_MEMORYVIEWS:
+    # The Python 2 memoryviews cannot be cast, an array.array reads the bytes.
+    values = array.array(fmt)
+    values.fromstring(_array_bytes(row) if isinstance(row, array.array) else memoryview(row).tobytes())
+    return values.tolist()
+  view = memoryview(row)
+  if view.format != fmt or view.ndim != 1:
+    view = view.cast('B').cast(fmt)
+  return view.tolist()
+
+def _py_dither_rows(rows, colors, taps, layout):
+  fmt, channels, order, alpha = _pixel_layout(layout)
+  maxLevel = _dither_levels(fmt)
+  quantize = _py_quantizer(colors, maxLevel)
+  ri, gi, bi = order
+  toLevel = fmt in 'BH' and int or float
+  if taps is None:
+    spread = _bayer_spread(colors, maxLevel)
+    matrix = [[(t - 0.5) * spread for t in row] for row in _bayer_matrix(8)]
+  else:
+    depth = max([dy for dx, dy, w in taps]) + 1
+  errors = None
+  for y, row in enumerate(rows):
+    values = _py_row_values(row, fmt)
+    if y==0:
+      width = len(values) // channels
+      if taps is not None:
+        errors = [[0.0] * (3 * (width + 4)) for i in range(depth)]
+    elif len(values) != width * channels:
+      raise ValueError("the rows must hold %d pixels" % width)
+    if taps is None:
+      thresholds = matrix[y % 8]
+    for x in range(width):
+      p = x * channels
+      r, g, b = values[p + ri], values[p + gi], values[p + bi]
+      if taps is None:
+        t = thresholds[x % 8]
+        r, g, b = quantize(r + t, g + t, b + t)
+      else:
+        e = 3 * (x + 2)
+        err = errors[0]
+        r += err[e]
+        g += err[e + 1]
+        b += err[e + 2]
+        qr, qg, qb = quantize(r, g, b)
+        r, g, b = r - qr, g - qg, b - qb
+        for dx, dy, w in taps:
+          err = errors[dy]
+          k = e + 3 * dx
+          err[k] += r * w
+          err[k + 1] += g * w
+          err[k + 2] += b * w
+        r, g, b = qr, qg, qb
+      values[p + ri] = toLevel(r)
+      values[p + gi] = toLevel(g)
+      values[p + bi] = toLevel(b)
+    if errors is not None:
+      errors.pop(0)
+      errors.append([0.0] * (3 * (width + 4)))
+    yield bytearray(_array_bytes(array.array(fmt, values)))
+
+def _np_dither_band(band, carry, quantize, taps):
+  """Diffuse the errors over a band of rows, in place.
+
+  The pixel (x, y) only depends on pixels earlier in the row or in the rows
+  above, at most 2 columns to its right per row. All the pixels on the line
+  x + 2y = t are thus independent, and are quantized together, from t = 0 to
+  the end of the band. In the flattened rows, these pixels are evenly spaced
+  and are processed through strided views. carry holds the errors diffused
+  to the next rows, and is updated for the next band.
 
-    >>> Color.from_hsl(30, 1, 0.5).complementary_color(mode='rgb')
-    Color(0.0, 0.5, 1.0, 1.0)
-    >>> Color.from_hsl(30, 1, 0.5).complementary_color(mode='rgb').hsl
-    (210.0, 1.0, 0.5)
+  """
+  height, width = band.shape[:2]
+  depth = len(carry)
+  stride = width + 4
+  errors = np.zeros(((height + depth) * stride, 3))
+  errors[:depth * stride] = carry.reshape(-1, 3)
+  pixels = band.reshape(-1, 3)
+  offsets = [(dy * stride + dx, w) for dx, dy, w in taps]
+  for t in range(width + 2 * (height - 1)):
+    y0 = max(0, (t - width + 2) // 2)
+    count = min(height - 1, t // 2) + 1 - y0
+    if count <= 0:
+      continue
+    p = y0 * width + t - 2 * y0
+    e = y0 * stride + t - 2 * y0 + 2
+    if count==1:
+      pixelStep = errorStep = 1
+    else:
+      pixelStep, errorStep = width - 2, stride - 2
+    pixelSlice = slice(p, p + (count - 1) * pixelStep + 1, pixelStep)
+    values = pixels[pixelSlice] + errors[e:e + (count - 1) * errorStep + 1:errorStep]
+    quantized = quantize(values)
+    pixels[pixelSlice] = quantized
+    values -= quantized
+    for offset, w in offsets:
+      start = e + offset
+      errors[start:start + (count - 1) * errorStep + 1:errorStep] += values * w
+  carry[:] = errors[height * stride:].reshape(carry.shape)
+
+def _np_dither_rows(rows, colors, taps, layout):
+  fmt, channels, order, alpha = _pixel_layout(layout)
+  maxLevel = _dither_levels(fmt)
+  quantize = _np_quantizer(colors, maxLevel)
+  order = list(order)
+  if taps is None:
+    spread = _bayer_spread(colors, maxLevel)
+    matrix = (np.array(_bayer_matrix(8)) - 0.5) * spread
+  else:
+    depth = max([dy for dx, dy, w in taps]) + 1
+
+  rows = iter(rows)
+  try:
+    first = _pixel_array(next(rows), layout)
+  except StopIteration:
+    return
+  width = len(first)
+  bandHeight = max(8, _DITHER_BAND // max(width, 1))
+  rows = itertools.chain([first], rows)
+  if taps is not None:
+    carry = np.zeros((depth, width + 4, 3))
+
+  y = 0
+  while True:
+    band = [_pixel_array(row, layout) for row in itertools.islice(rows, bandHeight)]
+    if not band:
+      return
+    if [len(row) for row in band] != [width] * len(band):
+      raise ValueError("the rows must hold %d pixels" % width)
+    pixels = np.array(band)
+    values = pixels[:, :, order].astype(np.float64)
+    height = len(values)
+    if taps is None:
+      t = np.tile(matrix[np.arange(y, y + height) % 8], (1, -(-width // 8)))
+      values = quantize((values + t[:, :width, np.newaxis]).reshape(-1, 3))
+    else:
+      _np_dither_band(values, carry, quantize, taps)
+    pixels[:, :, order] = values.reshape(height, width, 3)
+    for row in pixels:
+      yield bytearray(row.tobytes())
+    y += height
 
-    """
-    h, s, l = self.__hsl
+def dither_rows(rows, palette=None, method='floyd_steinberg', layout='RGB8'):
+  """Dither a stream of pixel rows to the web safe colors or to a palette.
 
-    if mode == 'ryb': h = rgb_to_ryb(h)
-    h = (h+180)%360
-    if mode == 'ryb': h = ryb_to_rgb(h)
+  The rows are read and dithered one at a time (or by small bands of rows
+  with numpy), so the memory used only depends on the width of the image.
 
-    return Color((h, s, l), 'hsl', self.__a, self.__wref)
+  Parameters:
+    :rows:
+      An iterable of rows of the same width, each being a buffer (bytes,
+      bytearray, memoryview, array.array...) of pixels in layout.
+    :palette:
+      The colors to dither to, as a sequence of grapefruit.Color or of
+      (r, g, b) tuples, or a grapefruit.Palette. Default is the 216 web safe
+      colors.
+    :method:
+      The dithering method: 'floyd_steinberg' or 'atkinson' error diffusion,
+      or 'bayer' ordered dithering with an 8x8 threshold matrix.
+    :layout:
+      The layout of the pixels, one of PIXEL_LAYOUTS. The alpha channel, if
+      any, is left as is.
 
-  def make_gradient(self, target, steps=100):
-    """Create a list with the gradient colors between this and the other color.
+  Returns:
+    An iterator of bytearray rows of dithered pixels in layout.
 
-    Parameters:
-      :target:
-        The grapefruit.Color at the other end of the gradient.
-      :steps:
-        The number of gradients steps to create.
+  >>> rows = [bytearray((100, 100, 100) * 4)] * 2
+  >>> [list(row) for row in dither_rows(rows)]
+  [[102, 102, 102, 102, 102, 102, 102, 102, 102, 102, 102, 102], [102, 102, 102, 102, 102, 102, 102, 102, 102, 102, 102, 102]]
 
+  """
+  taps = _dither_method(method)
+  colors = _dither_palette(palette, _dither_levels(_pixel_layout(layout)[0]))
+  if np is None:
+    return _py_dither_rows(rows, colors, taps, layout)
+  return _np_dither_rows(rows, colors, taps, layout)
 
-    Returns:
-      A list of grapefruit.Color instances.
+def dither_pixels(src, width, palette=None, method='floyd_steinberg', layout='RGB8', out=None):
+  """Dither a raw pixel buffer to the web safe colors or to a palette.
 
-    >>> c1 = Color.from_rgb(1.0, 0.0, 0.0, alpha=1)
-    >>> c2 = Color.from_rgb(0.0, 1.0, 0.0, alpha=0)
-    >>> c1.make_gradient(c2, 3)
-    [Color(0.75, 0.25, 0.0, 0.75), Color(0.5, 0.5, 0.0, 0.5), Color(0.25, 0.75, 0.0, 0.25)]
+  See dither_rows for the details of the dithering.
 
-    """
-    gradient = []
-    rgba1 = self.__rgb + (self.__a,)
-    rgba2 = target.__rgb + (target.__a,)
+  Parameters:
+    :src:
+      The pixels: bytes, bytearray, memoryview, array.array, numpy array or
+      any other buffer holding rows of pixels in layout.
+    :width:
+      The number of pixels in a row.
+    :palette:
+      The colors to dither to, default is the 216 web safe colors.
+    :method:
+      The dithering method: 'floyd_steinberg', 'atkinson' or 'bayer'.
+    :layout:
+      The layout of the pixels, one of PIXEL_LAYOUTS.
+    :out:
+      An optional writable buffer receiving the dithered pixels, which can be
+      src itself.
 
-    steps += 1
-    for n in range(1, steps):
-      d = 1.0*n/steps
-      r = (rgba1[0]*(1-d)) + (rgba2[0]*d)
-      g = (rgba1[1]*(1-d)) + (rgba2[1]*d)
-      b = (rgba1[2]*(1-d)) + (rgba2[2]*d)
-      a = (rgba1[3]*(1-d)) + (rgba2[3]*d)
+  Returns:
+    out, or a new bytearray holding the dithered pixels.
 
-      gradient.append(Color((r, g, b), 'rgb', a, self.__wref))
+  >>> list(dither_pixels(bytearray((0, 128, 255) * 4), 2, method='bayer'))
+  [0, 102, 255, 0, 153, 255, 0, 153, 255, 0, 102, 255]
+
+  """
+  view = memoryview(src)
+  if view.ndim != 1 or view.format != 'B':
+    view = view.cast('B')
+  rowSize = width * _pixel_size(layout)
+  if len(view) % rowSize:
+    raise ValueError("the buffer size is not a multiple of the row size")
+  if out is None:
+    out = bytearray(len(view))
+  dst = memoryview(out)
+  if dst.ndim != 1 or dst.format != 'B':
+    dst = dst.cast('B')
+  if len(dst) != len(view):
+    raise ValueError("out must hold %d bytes" % len(view))
+  rows = (view[start:start + rowSize] for start in range(0, len(view), rowSize))
+  start = 0
+  for row in dither_rows(rows, palette, method, layout):
+    dst[start:start + rowSize] = row
+    start += rowSize
+  return out
+
+# --=============-------------------------------------------------------------
+# -- Compositing --
+# --=============--
+#
+# The pixels are composited with premultiplied colors, where every operator
+# is a few in-place products on the chunks: sa and da are the source and
+# destination alphas, s and d the premultiplied r, g, b, a values. The chunks
+# are stored as (4, N) planes rather than (N, 4) pixels, so that the products
+# by the alpha plane run over contiguous memory. In
+# this form the blend modes of the W3C compositing spec,
+#   (1 - da) * s + (1 - sa) * d + sa * da * B(Cd, Cs)
+# also give the source-over alpha when applied to the alpha channel, so the
+# four channels go through the same formula.
+#
+# The 8 and 16 bits pixels are composited in float32, which keeps more than
+# enough precision for them at half the memory traffic of float64.
+
+COMPOSITE_OPERATORS = ('over', 'in', 'out', 'atop', 'xor', 'multiply', 'screen', 'overlay')
+
+def _composite_over(s, d):
+  d *= 1.0 - s[3:]
+  d += s
+
+def _composite_in(s, d):
+  np.multiply(s, d[3:].copy(), out=d)
+
+def _composite_out(s, d):
+  np.multiply(s, 1.0 - d[3:], out=d)
+
+def _composite_atop(s, d):
+  da = d[3:].copy()
+  d *= 1.0 - s[3:]
+  d += s * da
+
+def _composite_xor(s, d):
+  da = 1.0 - d[3:]
+  d *= 1.0 - s[3:]
+  d += s * da
+
+def _composite_multiply(s, d):
+  # sa * da * Cs * Cd is just s * d.
+  sd = s * d
+  _composite_xor(s, d)
+  d += sd
+
+def _composite_screen(s, d):
+  # The xor terms and sa * da * (Cs + Cd - Cs * Cd) add up to s + d - s * d.
+  sd = s * d
+  d += s
+  d -= sd
+
+def _composite_overlay(s, d):
+  # Cd <= 0.5 is 2 * d <= da, and the hard light terms multiplied by sa * da
+  # need no division either. The two terms are mixed with a 0 or 1 factor
+  # rather than a mask, which is much faster on noisy images.
+  sa = s[3:]
+  da = d[3:].copy()
+  mix = sa - s
+  mix *= da - d
+  mix *= -2.0
+  mix += sa * da
+  low = 2.0 * s * d
+  low -= mix
+  low *= 2.0 * d <= da
+  mix += low
+  _composite_xor(s, d)
+  d += mix
+
+_COMPOSITE_KERNELS = {
+  'over': _composite_over,
+  'in': _composite_in,
+  'out': _composite_out,
+  'atop': _composite_atop,
+  'xor': _composite_xor,
+  'multiply': _composite_multiply,
+  'screen': _composite_screen,
+  'overlay': _composite_overlay}
+
+def _composite_kernel(operator):
+  try:
+    return _COMPOSITE_KERNELS[operator]
+  except KeyError:
+    raise ValueError("Invalid compositing operator: %s" % operator)
+
+def _composite_scale(fmt):
+  return {'B': 255.0, 'H': 65535.0}.get(fmt)
+
+def _composite_inverse(a):
+  """Return 1 / a, or 0 where a is 0 since the premultiplied colors are 0."""
+  return np.divide(1.0, a, out=np.zeros_like(a), where=a > 0)
+
+def _composite_srgb_lut(fmt):
+  """Return the float32 table of the linear values of the 8 or 16 bits levels."""
+  key = ('composite', fmt)
+  lut = _srgbLuts.get(key)
+  if lut is None:
+    lut = _srgbLuts[key] = _np_srgb_lut(fmt=='B' and 8 or 16).astype(np.float32)
+  return lut
+
+def _composite_load(pixels, layout, order, premultiplied, linear):
+  """Return the pixels as premultiplied (4, N) float planes.
+
+  The color planes are in the order of the destination channels, given as
+  the positions of r, g, b like in PIXEL_LAYOUTS, and alpha comes last.
+  """
+  fmt, channels, layoutOrder, alpha = _pixel_layout(layout)
+  scale = _composite_scale(fmt)
+  v = np.empty((4, len(pixels)), dtype=fmt=='d' and np.float64 or np.float32)
+  color, a = v[:3], v[3:]
+  if alpha is None:
+    premultiplied = True
+    a[...] = 1.0
+  if linear and scale and alpha is not None and not premultiplied:
+    # The straight levels are linearized with a lookup table, which is much
+    # faster than the transfer function.
+    np.take(_composite_srgb_lut(fmt), pixels.T[[layoutOrder[order.index(i)] for i in range(3)]], out=color)
+    np.multiply(pixels[:, alpha], 1.0 / scale, out=v[3])
+    color *= a
+    return v
+
+  if channels==4 and layoutOrder==order:
+    v[...] = pixels.T
+  else:
+    color[...] = pixels.T[[layoutOrder[order.index(i)] for i in range(3)]]
+    if alpha is not None:
+      v[3] = pixels[:, alpha]
+  if scale:
+    if alpha is None:
+      color *= 1.0 / scale
+    else:
+      v *= 1.0 / scale
+  if linear:
+    if premultiplied:
+      color *= _composite_inverse(a)
+    color[...] = _np_srgb_to_linear(color)
+  if linear or not premultiplied:
+    color *= a
+  return v
+
+def _composite_store(v, pixels, layout, premultiplied, linear):
+  """Write premultiplied (4, N) float planes back to the pixels."""
+  fmt, channels, order, alpha = _pixel_layout(layout)
+  scale = _composite_scale(fmt)
+  if alpha is None:
+    # Without alpha channel, the result is kept as composited on black.
+    premultiplied = True
+  color, a = v[:3], v[3:]
+  if linear or not premultiplied:
+    color *= _composite_inverse(a)
+  if linear:
+    color[...] = _np_linear_to_srgb(color)
+    if premultiplied:
+      color *= a
+  if scale:
+    np.clip(v, 0.0, 1.0, out=v)
+    v *= scale
+    np.rint(v, out=v)
+  if alpha is None:
+    pixels[...] = color.T
+  else:
+    pixels[...] = v.T
 
-    return gradient
+def _composite_layer(layer):
+  if not isinstance(layer, tuple):
+    layer = (layer,)
+  if not 1 <= len(layer) <= 3:
+    raise ValueError("the layers must be (src, operator, opacity) tuples")
+  src, operator, opacity = layer + ('over', 1.0)[len(layer)-1:]
+  return src, _composite_kernel(operator), float(opacity)
 
-  def make_monochrome_scheme(self):
-    """Return 4 colors in the same hue with varying saturation/lightness.
+def composite_layers(layers, dst, layout='RGBA8', srcLayout=None, premultiplied=False, linear=False):
+  """Composite a stack of layers on a raw pixel buffer, in place.
 
-    Returns:
-      A tuple of 4 grapefruit.Color in the same hue as this one,
-      with varying saturation/lightness.
+  The buffers are processed a chunk of pixels at a time: every layer is
+  composited on the chunk of dst before it is written back, so dst is read
+  and quantized only once whatever the number of layers.
 
-    >>> c = Color.from_hsl(30, 0.5, 0.5)
-    >>> ['(%g, %g, %g)' % clr.hsl for clr in c.make_monochrome_scheme()]
-    ['(30, 0.2, 0.8)', '(30, 0.5, 0.3)', '(30, 0.2, 0.6)', '(30, 0.5, 0.8)']
+  .. note::
 
-    """
-    def _wrap(x, min, thres, plus):
-      if (x-min) < thres: return x + plus
-      else: return x-min
+     This function requires numpy.
 
-    h, s, l = self.__hsl
+  Parameters:
+    :layers:
+      The layers, from bottom to top. Each layer is a buffer of pixels in
+      srcLayout (bytes, bytearray, memoryview, array.array, numpy array...)
+      or a (src, operator) or (src, operator, opacity) tuple. The operator
+      is one of COMPOSITE_OPERATORS, default is 'over', and the opacity
+      [0...1] scales the source alpha.
+    :dst:
+      The writable buffer of pixels in layout the layers are composited on.
+    :layout:
+      The layout of dst, one of PIXEL_LAYOUTS. A layout without alpha channel
+      is opaque, and the result is stored as composited on black.
+    :srcLayout:
+      The layout of the layers, default is layout. A layout without alpha
+      channel is opaque.
+    :premultiplied:
+      True if the colors of the buffers are stored premultiplied by alpha.
+    :linear:
+      If True, composite in linear light: the sRGB colors are linearized
+      before compositing, and converted back to sRGB after it.
 
-    s1 = _wrap(s, 0.3, 0.1, 0.3)
-    l1 = _wrap(l, 0.5, 0.2, 0.3)
+  Returns:
+    dst.
 
-    s2 = s
-    l2 = _wrap(l, 0.2, 0.2, 0.6)
+  >>> dst = bytearray((0, 0, 255, 255) * 2)
+  >>> layers = [(bytearray((255, 0, 0, 128) * 2), 'over'), (bytearray((128, 128, 128, 255) * 2), 'screen')]
+  >>> list(composite_layers(layers, dst))  # doctest: +SKIP
+  [192, 128, 191, 255, 192, 128, 191, 255]
 
-    s3 = s1
-    l3 = max(0.2, l + (1-l)*0.2)
+  """
+  _require_numpy('composite_layers')
+  srcLayout = srcLayout or layout
+  layers = [_composite_layer(layer) for layer in layers]
+
+  pixels = _pixel_array(dst, layout)
+  if not pixels.flags.writeable:
+    raise ValueError("dst must be a writable buffer")
+  order = _pixel_layout(layout)[2]
+  sources = []
+  for src, kernel, opacity in layers:
+    src = _pixel_array(src, srcLayout)
+    if len(src) != len(pixels):
+      raise ValueError("the layers must hold %d pixels" % len(pixels))
+    sources.append(src)
+
+  with np.errstate(invalid='ignore', divide='ignore'):
+    for start in range(0, len(pixels), _PIXEL_CHUNK):
+      d = pixels[start:start+_PIXEL_CHUNK]
+      v = _composite_load(d, layout, order, premultiplied, linear)
+      for src, (_, kernel, opacity) in zip(sources, layers):
+        s = _composite_load(src[start:start+_PIXEL_CHUNK], srcLayout, order, premultiplied, linear)
+        if opacity != 1.0:
+          s *= opacity
+        kernel(s, v)
+      _composite_store(v, d, layout, premultiplied, linear)
+  return dst
+
+def composite(src, dst, operator='over', layout='RGBA8', srcLayout=None, opacity=1.0, premultiplied=False, linear=False):
+  """Composite a raw pixel buffer on another one, in place.
+
+  This is composite_layers with a single layer.
 
-    s4 = s
-    l4 = _wrap(l, 0.5, 0.2, 0.3)
+  .. note::
 
-    return (
-      Color((h, s1,  l1), 'hsl', self.__a, self.__wref),
-      Color((h, s2,  l2), 'hsl', self.__a, self.__wref),
-      Color((h, s3,  l3), 'hsl', self.__a, self.__wref),
-      Color((h, s4,  l4), 'hsl', self.__a, self.__wref))
+     This function requires numpy.
 
-  def make_triadic_scheme(self, angle=120, mode='ryb'):
-    """Return two colors forming a triad or a split complementary with this one.
+  Parameters:
+    :src:
+      The source pixels: bytes, bytearray, memoryview, array.array, numpy
+      array or any other buffer holding pixels in srcLayout.
+    :dst:
+      The writable buffer of destination pixels in layout, which receives
+      the result.
+    :operator:
+      The Porter-Duff operator ('over', 'in', 'out', 'atop' or 'xor') or the
+      blend mode ('multiply', 'screen' or 'overlay', composited over dst).
+    :layout:
+      The layout of dst, one of PIXEL_LAYOUTS.
+    :srcLayout:
+      The layout of src, default is layout.
+    :opacity:
+      The opacity [0...1] of src, which scales its alpha.
+    :premultiplied:
+      True if the colors of the buffers are stored premultiplied by alpha.
+    :linear:
+      If True, composite in linear light rather than on the sRGB values.
 
-    Parameters:
-      :angle:
-        The angle between the hues of the created colors.
-        The default value makes a triad.
-      :mode:
-        Select which color wheel to use for the generation (ryb/rgb).
+  Returns:
+    dst.
 
-    Returns:
-      A tuple of two grapefruit.Color forming a color triad with
-      this one or a split complementary.
+  >>> dst = bytearray((0, 0, 255, 255))
+  >>> list(composite(bytearray((255, 0, 0, 128)), dst))  # doctest: +SKIP
+  [128, 0, 127, 255]
+  >>> list(composite(bytearray((255, 0, 0, 128)), bytearray((0, 0, 255, 255)), linear=True))  # doctest: +SKIP
+  [188, 0, 187, 255]
+  >>> list(composite(bytearray((255, 0, 0, 128)), bytearray((0, 0, 255, 255)), 'in'))  # doctest: +SKIP
+  [255, 0, 0, 128]
 
-    >>> c1 = Color.from_hsl(30, 1, 0.5)
+  """
+  return composite_layers([(src, operator, opacity)], dst, layout, srcLayout, premultiplied, linear)
 
-    >>> c2, c3 = c1.make_triadic_scheme(mode='rgb')
-    >>> c2.hsl
-    (150.0, 1.0, 0.5)
-    >>> c3.hsl
-    (270.0, 1.0, 0.5)
+# --==================--------------------------------------------------------
+# -- 3D lookup tables --
+# --==================--
 
-    >>> c2, c3 = c1.make_triadic_scheme(angle=40, mode='rgb')
-    >>> c2.hsl
-    (190.0, 1.0, 0.5)
-    >>> c3.hsl
-    (230.0, 1.0, 0.5)
+def build_lut(func, size=33, batch=False, domainMin=(0.0, 0.0, 0.0), domainMax=(1.0, 1.0, 1.0), title=None):
+  """Sample a color transformation on a 3D grid.
 
-    """
-    h, s, l = self.__hsl
-    angle = min(angle, 120) / 2.0
+  The transformation is evaluated once for every node of a size*size*size
+  grid covering the input domain. The resulting grapefruit.Lut3D then
+  applies it to any number of colors by interpolating between the nodes.
 
-    if mode == 'ryb': h = rgb_to_ryb(h)
-    h += 180
-    h1 = (h - angle) % 360
-    h2 = (h + angle) % 360
-    if mode == 'ryb':
-      h1 = ryb_to_rgb(h1)
-      h2 = ryb_to_rgb(h2)
+  .. note::
 
-    return (
-      Color((h1, s,  l), 'hsl', self.__a, self.__wref),
-      Color((h2, s,  l), 'hsl', self.__a, self.__wref))
+     This function requires numpy.
 
-  def make_tetradic_scheme(self, angle=30, mode='ryb'):
-    """Return three colors froming a tetrad with this one.
+  Parameters:
+    :func:
+      The transformation to sample. Unless batch is True, it is called as
+      func(r, g, b) for every node and must return a triple, e.g. a
+      composition of the grapefruit conversion functions.
+    :size:
+      The number of nodes along each axis of the grid.
+    :batch:
+      If True, func is called once with the (size**3, 3) array of all the
+      nodes and must return an array of the same shape, e.g. a composition
+      of *_batch functions.
+    :domainMin:
+      The lower bound of the input values, for each channel.
+    :domainMax:
+      The upper bound of the input values, for each channel.
+    :title:
+      An optional title, stored in the .cube files.
 
-    Parameters:
-      :angle:
-        The angle to substract from the adjacent colors hues [-90...90].
-        You can use an angle of zero to generate a square tetrad.
-      :mode:
-        Select which color wheel to use for the generation (ryb/rgb).
+  Returns:
+    A grapefruit.Lut3D instance.
 
-    Returns:
-      A tuple of three grapefruit.Color forming a color tetrad with
-      this one.
+  >>> lut = build_lut(lambda r, g, b: xyz_to_lab(*rgb_to_xyz(r, g, b)), size=17)  # doctest: +SKIP
+  >>> lut.apply([(1, 0.5, 0)]).round(2).tolist()  # doctest: +SKIP
+  [[66.95, 0.43, 0.74]]
 
-    >>> col = Color.from_hsl(30, 1, 0.5)
-    >>> [c.hsl for c in col.make_tetradic_scheme(mode='rgb', angle=30)]
-    [(90.0, 1.0, 0.5), (210.0, 1.0, 0.5), (270.0, 1.0, 0.5)]
+  """
+  _require_numpy('build_lut')
+  if size < 2:
+    raise ValueError("a 3D LUT needs at least 2 nodes per axis")
+
+  lo = np.asarray(domainMin, dtype=np.float64)
+  hi = np.asarray(domainMax, dtype=np.float64)
+  axis = np.linspace(0.0, 1.0, size)
+  r, g, b = np.meshgrid(axis, axis, axis, indexing='ij')
+  nodes = lo + (np.column_stack((r.ravel(), g.ravel(), b.ravel())) * (hi - lo))
+
+  if batch:
+    table = _as_components(func(nodes))
+  else:
+    table = np.array([func(*node) for node in nodes.tolist()], dtype=np.float64)
+  return Lut3D(table.reshape(size, size, size, 3), domainMin, domainMax, title)
 
-    """
-    h, s, l = self.__hsl
 
-    if mode == 'ryb': h = rgb_to_ryb(h)
-    h1 = (h + 90 - angle) % 360
-    h2 = (h + 180) % 360
-    h3 = (h + 270 - angle) % 360
-    if mode == 'ryb':
-      h1 = ryb_to_rgb(h1)
-      h2 = ryb_to_rgb(h2)
-      h3 = ryb_to_rgb(h3)
+class Lut3D(object):
+  """Hold a 3D lookup table.
 
-    return (
-      Color((h1, s,  l), 'hsl', self.__a, self.__wref),
-      Color((h2, s,  l), 'hsl', self.__a, self.__wref),
-      Color((h3, s,  l), 'hsl', self.__a, self.__wref))
+  The table stores the output triple of a color transformation for every
+  node of a regular grid over the input domain, indexed as table[r, g, b].
+  Use grapefruit.build_lut to create one from a function, or
+  Lut3D.load_cube to read an Adobe .cube file.
 
-  def make_analogous_scheme(self, angle=30, mode='ryb'):
-    """Return two colors analogous to this one.
+  .. note::
 
-    Args:
-      :angle:
-        The angle between the hues of the created colors and this one.
-      :mode:
-        Select which color wheel to use for the generation (ryb/rgb).
+     This class requires numpy.
 
-    Returns:
-      A tuple of grapefruit.Colors analogous to this one.
+  >>> lut = build_lut(lambda r, g, b: (b, g, r), size=2)  # doctest: +SKIP
+  >>> lut.apply([(1, 0.5, 0)]).tolist()  # doctest: +SKIP
+  [[0.0, 0.5, 1.0]]
 
-    >>> c1 = Color.from_hsl(30, 1, 0.5)
+  """
 
-    >>> c2, c3 = c1.make_analogous_scheme(angle=60, mode='rgb')
-    >>> c2.hsl
-    (330.0, 1.0, 0.5)
-    >>> c3.hsl
-    (90.0, 1.0, 0.5)
+  def __init__(self, table, domainMin=(0.0, 0.0, 0.0), domainMax=(1.0, 1.0, 1.0), title=None):
+    """Instantiate a new grapefruit.Lut3D object.
 
-    >>> c2, c3 = c1.make_analogous_scheme(angle=10, mode='rgb')
-    >>> c2.hsl
-    (20.0, 1.0, 0.5)
-    >>> c3.hsl
-    (40.0, 1.0, 0.5)
+    Parameters:
+      :table:
+        The (size, size, size, 3) array of output values, indexed by the
+        red, green and blue nodes.
+      :domainMin:
+        The lower bound of the input values, for each channel.
+      :domainMax:
+        The upper bound of the input values, for each channel.
+      :title:
+        An optional title, stored in the .cube files.
 
     """
-    h, s, l = self.__hsl
+    _require_numpy('Lut3D')
+    table = np.ascontiguousarray(table, dtype=np.float64)
+    size = table.shape[0]
+    if size < 2 or table.shape != (size, size, size, 3):
+      raise ValueError("table must be a (size, size, size, 3) array")
+
+    self.__table = table
+    self.__flat = table.reshape(-1, 3)
+    self.__min = tuple(float(v) for v in domainMin)
+    self.__max = tuple(float(v) for v in domainMax)
+    self.title = title
 
-    if mode == 'ryb': h = rgb_to_ryb(h)
-    h += 360
-    h1 = (h - angle) % 360
-    h2 = (h + angle) % 360
-    if mode == 'ryb':
-      h1 = ryb_to_rgb(h1)
-      h2 = ryb_to_rgb(h2)
+  def __repr__(self):
+    return "Lut3D(<%d nodes per axis>)" % self.size
 
-    return (Color((h1, s,  l), 'hsl', self.__a, self.__wref),
-        Color((h2, s,  l), 'hsl', self.__a, self.__wref))
+  @property
+  def size(self):
+    """The number of nodes along each axis."""
+    return self.__table.shape[0]
 
-  def alpha_blend(self, other):
-    """Alpha-blend this color on the other one.
+  @property
+  def table(self):
+    """The (size, size, size, 3) array of output values."""
+    return self.__table
 
-    Args:
-      :other:
-        The grapefruit.Color to alpha-blend with this one.
+  @property
+  def domain(self):
+    """The (domainMin, domainMax) bounds of the input values."""
+    return (self.__min, self.__max)
 
-    Returns:
-      A grapefruit.Color instance which is the result of alpha-blending
-      this color on the other one.
+  def apply(self, values, method='trilinear', out=None):
+    """Apply the table to an array of colors.
 
-    >>> c1 = Color.from_rgb(1, 0.5, 0, 0.2)
-    >>> c2 = Color.from_rgb(1, 1, 1, 0.8)
-    >>> c3 = c1.alpha_blend(c2)
-    >>> c3
-    Color(1.0, 0.875, 0.75, 0.84)
+    The input values are clipped to the domain of the table.
 
-    """
-    # get final alpha channel
-    fa = self.__a + other.__a - (self.__a * other.__a)
+    Parameters:
+      :values:
+        The (N, 3) array of input values.
+      :method:
+        The interpolation between the nodes, trilinear or tetrahedral.
+        Tetrahedral interpolation only uses 4 of the 8 surrounding nodes and
+        preserves the neutral axis.
+      :out:
+        An optional (N, 3) float array receiving the result.
 
-    # get percentage of source alpha compared to final alpha
-    if fa==0: sa = 0
-    else: sa = min(1.0, self.__a/other.__a)
+    Returns:
+      The (N, 3) array of output values.
 
-    # destination percentage is just the additive inverse
-    da = 1.0 - sa
+    >>> lut = build_lut(lambda r, g, b: (r * g, g, b), size=5)  # doctest: +SKIP
+    >>> lut.apply([(0.5, 0.5, 0.5)], 'trilinear').round(6).tolist()  # doctest: +SKIP
+    [[0.25, 0.5, 0.5]]
+    >>> lut.apply([(0.1, 0.1, 0.1)], 'tetrahedral').round(6).tolist()  # doctest: +SKIP
+    [[0.025, 0.1, 0.1]]
 
-    sr, sg, sb = [v * sa for v in self.__rgb]
-    dr, dg, db = [v * da for v in other.__rgb]
+    """
+    if method not in ('trilinear', 'tetrahedral'):
+      raise ValueError("Invalid interpolation method: " + method)
+    values = _as_components(values)
+    if out is None:
+      out = np.empty(values.shape)
+
+    size = self.size
+    lo = np.asarray(self.__min)
+    hi = np.asarray(self.__max)
+    pos = np.clip((values - lo) / (hi - lo), 0.0, 1.0) * (size - 1)
+    i = np.minimum(pos.astype(np.intp), size - 2)
+    f = pos - i
+
+    sr, sg, sb = size * size, size, 1
+    base = (i[:, 0] * sr) + (i[:, 1] * sg) + i[:, 2]
+    table = self.__flat
+    corner = lambda offset: np.take(table, base + offset, axis=0)
+
+    if method=='trilinear':
+      fr, fg, fb = [f[:, n:n+1] for n in range(3)]
+      c000 = corner(0)
+      c00 = c000 + ((corner(sb) - c000) * fb)
+      c010 = corner(sg)
+      c01 = c010 + ((corner(sg + sb) - c010) * fb)
+      c100 = corner(sr)
+      c10 = c100 + ((corner(sr + sb) - c100) * fb)
+      c110 = corner(sr + sg)
+      c11 = c110 + ((corner(sr + sg + sb) - c110) * fb)
+      c0 = c00 + ((c01 - c00) * fg)
+      c1 = c10 + ((c11 - c10) * fg)
+      out[...] = c0 + ((c1 - c0) * fr)
+      return out
+
+    # Tetrahedral: walk from the lower corner to the upper one, stepping
+    # along the axes in decreasing order of their fractional position.
+    fr, fg, fb = f[:, 0], f[:, 1], f[:, 2]
+    rg = fr >= fg
+    gb = fg >= fb
+    rb = fr >= fb
+    stepMax = np.where(rg & rb, sr, np.where(gb, sg, sb))
+    stepMin = np.where(gb & rb, sb, np.where(rg, sg, sr))
+    fMax = f.max(axis=1)
+    fMin = f.min(axis=1)
+    fMid = fr + fg + fb - fMax - fMin
+    last = sr + sg + sb
+    out[...] = (
+      ((1.0 - fMax)[:, np.newaxis] * corner(0)) +
+      ((fMax - fMid)[:, np.newaxis] * corner(stepMax)) +
+      ((fMid - fMin)[:, np.newaxis] * corner(last - stepMin)) +
+      (fMin[:, np.newaxis] * corner(last)))
+    return out
+
+  __call__ = apply
+
+  def save_cube(self, path):
+    """Write the table to an Adobe .cube file.
 
-    return Color((sr+dr, sg+dg, sb+db), 'rgb', fa, self.__wref)
+    Parameters:
+      :path:
+        The path of the file to write.
 
-  def blend(self, other, percent=0.5):
-    """blend this color with the other one.
+    """
+    with open(path, 'w') as f:
+      if self.title:
+        f.write('TITLE "%s"\n' % self.title)
+      f.write('LUT_3D_SIZE %d\n' % self.size)
+      f.write('DOMAIN_MIN %.10g %.10g %.10g\n' % self.__min)
+      f.write('DOMAIN_MAX %.10g %.10g %.10g\n' % self.__max)
+      # In .cube files the red index changes fastest.
+      for r, g, b in self.__table.transpose(2, 1, 0, 3).reshape(-1, 3).tolist():
+        f.write('%.10g %.10g %.10g\n' % (r, g, b))
 
-    Args:
-      :other:
-        the grapefruit.Color to blend with this one.
+  @staticmethod
+  def load_cube(path):
+    """Read a table from an Adobe .cube file.
+
+    Parameters:
+      :path:
+        The path of the file to read.
 
     Returns:
-      A grapefruit.Color instance which is the result of blending
-      this color on the other one.
+      A grapefruit.Lut3D instance.
 
-    >>> c1 = Color.from_rgb(1, 0.5, 0, 0.2)
-    >>> c2 = Color.from_rgb(1, 1, 1, 0.6)
-    >>> c3 = c1.blend(c2)
-    >>> c3
-    Color(1.0, 0.75, 0.5, 0.4)
+    Throws:
+      :ValueError:
+        If the file is not a valid 3D .cube file.
 
     """
-    dest = 1.0 - percent
-    rgb = tuple(((u * percent) + (v * dest) for u, v in zip(self.__rgb, other.__rgb)))
-    a = (self.__a * percent) + (other.__a * dest)
-    return Color(rgb, 'rgb', a, self.__wref)
+    _require_numpy('Lut3D')
+    title = None
+    size = None
+    domain = {'DOMAIN_MIN': (0.0, 0.0, 0.0), 'DOMAIN_MAX': (1.0, 1.0, 1.0)}
+    rows = []
+    with open(path) as f:
+      for line in f:
+        line = line.strip()
+        if not line or line[0]=='#':
+          continue
+        keyword = line.split(None, 1)[0]
+        if keyword=='TITLE':
+          title = line[len(keyword):].strip().strip('"')
+        elif keyword=='LUT_3D_SIZE':
+          size = int(line.split()[1])
+        elif keyword in domain:
+          domain[keyword] = tuple(float(v) for v in line.split()[1:4])
+        elif keyword=='LUT_1D_SIZE':
+          raise ValueError("%s is a 1D LUT" % path)
+        else:
+          rows.append(line)
+
+    if size is None:
+      raise ValueError("%s has no LUT_3D_SIZE" % path)
+    if len(rows) != size**3:
+      raise ValueError("%s has %d entries, expected %d" % (path, len(rows), size**3))
+    table = np.array([row.split()[:3] for row in rows], dtype=np.float64)
+    table = table.reshape(size, size, size, 3).transpose(2, 1, 0, 3)
+    return Lut3D(table, domain['DOMAIN_MIN'], domain['DOMAIN_MAX'], title)
+
 
 def _test():
   import doctest
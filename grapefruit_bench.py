@@ -0,0 +1,390 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-#
+
+# Copyright (c) 2008-2016, Xavier Basty
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks for the grapefruit module.
+
+Run all the benchmarks with::
+
+  python grapefruit_bench.py
+
+or only some of them by passing their names::
+
+  python grapefruit_bench.py srgb_lut workers
+
+"""
+
+from __future__ import print_function
+
+import array
+import random
+import sys
+import timeit
+
+import grapefruit
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+def _best(func, number=1, repeat=3):
+  """Return the best time of func, in seconds per call."""
+  return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+def _report(title, rows):
+  print(title)
+  base = rows[0][1]
+  for label, t in rows:
+    print('  %-40s %10.3f ms  x%.1f' % (label, t * 1000, base / t))
+
+def bench_srgb_lut(size=1000000):
+  """sRGB decode/encode: pow based path vs lookup tables."""
+  rnd = random.Random(0)
+  levels = [rnd.randrange(256) for i in range(size * 3)]
+
+  pixels = array.array('B', levels)
+  floats = array.array('d', [v / 255.0 for v in levels])
+  xyz = array.array('d', [0.0]) * len(floats)
+  out = array.array('B', [0]) * len(floats)
+
+  numpyModule = grapefruit.np
+  grapefruit.np = None
+  try:
+    count = size // 10
+    _report('rgb_to_xyz_batch, %d pixels, pure python' % count, [
+      ('float input (pow)', _best(lambda: grapefruit.rgb_to_xyz_batch(floats[:count*3], xyz[:count*3]))),
+      ('8 bits input (LUT)', _best(lambda: grapefruit.rgb_to_xyz_batch(pixels[:count*3], xyz[:count*3])))])
+    def quantized():
+      rgb = grapefruit.xyz_to_rgb_batch(xyz[:count*3])
+      return array.array('B', [min(max(int(round(v * 255)), 0), 255) for v in rgb])
+    _report('xyz_to_rgb_batch, %d pixels, pure python' % count, [
+      ('float output (pow) + quantization', _best(quantized)),
+      ('8 bits output (interpolated LUT)', _best(lambda: grapefruit.xyz_to_rgb_batch(xyz[:count*3], out[:count*3])))])
+  finally:
+    grapefruit.np = numpyModule
+
+  if numpy is None:
+    return
+  pixels = numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(-1, 3)
+  floats = pixels / 255.0
+  xyz = numpy.empty(floats.shape)
+  out = numpy.empty(pixels.shape, dtype=numpy.uint8)
+  _report('rgb_to_xyz_batch, %d pixels, numpy' % size, [
+    ('float input (pow)', _best(lambda: grapefruit.rgb_to_xyz_batch(floats, xyz))),
+    ('8 bits input (LUT)', _best(lambda: grapefruit.rgb_to_xyz_batch(pixels, xyz)))])
+  _report('xyz_to_rgb_batch, %d pixels, numpy' % size, [
+    ('float output (pow) + quantization', _best(lambda: numpy.rint(grapefruit.xyz_to_rgb_batch(xyz) * 255, out=out, casting='unsafe'))),
+    ('8 bits output (uint8 out)', _best(lambda: grapefruit.xyz_to_rgb_batch(xyz, out)))])
+
+def bench_workers(size=200000, maxWorkers=None):
+  """Batch conversions split across 1 to N worker processes."""
+  import multiprocessing
+  if grapefruit.shared_memory is None:
+    print('workers: multiprocessing.shared_memory is not available')
+    return
+  maxWorkers = maxWorkers or multiprocessing.cpu_count()
+  rnd = random.Random(0)
+  flat = array.array('d', [rnd.random() for i in range(size * 3)])
+  counts = [1]
+  while counts[-1] < maxWorkers:
+    counts.append(min(counts[-1] * 2, maxWorkers))
+
+  numpyModule = grapefruit.np
+  grapefruit.np = None
+  try:
+    count = size // 10
+    src = flat[:count*3]
+    _report('rgb_to_hsl_batch, %d colors, pure python' % count, [
+      ('%d worker(s)' % n, _best(lambda: grapefruit.rgb_to_hsl_batch(src, workers=n))) for n in counts])
+  finally:
+    grapefruit.np = numpyModule
+    # The workers were forked without numpy.
+    grapefruit._close_worker_pools()
+
+  if numpy is None:
+    return
+  rgb = numpy.frombuffer(flat).reshape(-1, 3)
+  xyz = grapefruit.rgb_to_xyz_batch(rgb)
+  _report('xyz_to_lab_batch, %d colors, numpy' % size, [
+    ('%d worker(s)' % n, _best(lambda: grapefruit.xyz_to_lab_batch(xyz, workers=n))) for n in counts])
+
+def bench_threads(size=2000000, maxThreads=None):
+  """numpy batch conversions split across 1 to N threads."""
+  import multiprocessing
+  if numpy is None:
+    print('threads: numpy is not installed')
+    return
+  maxThreads = maxThreads or multiprocessing.cpu_count()
+  counts = [1]
+  while counts[-1] < maxThreads:
+    counts.append(min(counts[-1] * 2, maxThreads))
+  rgb = numpy.random.RandomState(0).random_sample((size, 3))
+  xyz = numpy.empty_like(rgb)
+  lab = numpy.empty_like(rgb)
+  def rgb_to_lab(n):
+    grapefruit.rgb_to_xyz_batch(rgb, xyz, threads=n)
+    grapefruit.xyz_to_lab_batch(xyz, out=lab, threads=n)
+  _report('rgb_to_xyz_batch + xyz_to_lab_batch, %d colors' % size, [
+    ('%d thread(s)' % n, _best(lambda: rgb_to_lab(n))) for n in counts])
+
+class _EagerColor(grapefruit.Color):
+  """Color with a __dict__ and its HSL values computed up front.
+
+  It mimics the layout of Color before __slots__ and the lazy HSL values.
+
+  """
+  def __init__(self, values, mode='rgb', alpha=1.0, wref=grapefruit._DEFAULT_WREF):
+    grapefruit.Color.__init__(self, values, mode, alpha, wref)
+    self.hsl
+
+def _allocated(func):
+  """Return the result of func and the memory it allocated, in bytes."""
+  import gc
+  import tracemalloc
+  gc.collect()
+  tracemalloc.start()
+  try:
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    return result, tracemalloc.get_traced_memory()[0] - before
+  finally:
+    tracemalloc.stop()
+
+def bench_color(count=100000):
+  """Color construction: compact lazy instances vs eager ones with a __dict__."""
+  rnd = random.Random(0)
+  rgb = [(rnd.random(), rnd.random(), rnd.random()) for i in range(count)]
+  rows = []
+  for label, cls in (('eager HSL + __dict__', _EagerColor), ('lazy HSL + __slots__', grapefruit.Color)):
+    colors, size = _allocated(lambda: [cls(v) for v in rgb])
+    rows.append((label, _best(lambda: [cls(v) for v in rgb]), size / count))
+  print('Color(rgb), %d colors' % count)
+  base = rows[0][1]
+  for label, t, size in rows:
+    print('  %-40s %10.3f ms  x%.1f  %6.1f bytes/color' % (label, t * 1000, base / t, size))
+
+  start = grapefruit.Color.from_rgb(1.0, 0.5, 0.0)
+  end = start.complementary_color()
+  _report('make_gradient, 10000 steps', [
+    ('with the HSL of every step (eager cost)', _best(lambda: [c.hsl for c in start.make_gradient(end, 10000)])),
+    ('lazy HSL', _best(lambda: start.make_gradient(end, 10000)))])
+
+def bench_html(size=1000000):
+  """Hex color parsing/formatting: per color functions vs batch ones."""
+  rnd = random.Random(0)
+  flat = array.array('d', [rnd.randrange(256) / 255.0 for i in range(size * 3)])
+  html = ['#%02x%02x%02x' % tuple(rnd.randrange(256) for c in range(3)) for i in range(size)]
+  blob = ''.join([h + '\n' for h in html]).encode('ascii')
+
+  numpyModule = grapefruit.np
+  grapefruit.np = None
+  try:
+    count = size // 10
+    rgb = [tuple(flat[i:i+3]) for i in range(0, count * 3, 3)]
+    _report('parse %d #rrggbb, pure python' % count, [
+      ('html_to_rgb per color (uncached)', _best(lambda: [grapefruit._parse_html(h) for h in html[:count]])),
+      ('html_to_rgb_batch', _best(lambda: grapefruit.html_to_rgb_batch(html[:count])))])
+    _report('format %d colors, pure python' % count, [
+      ('rgb_to_html per color', _best(lambda: [grapefruit.rgb_to_html(v) for v in rgb])),
+      ('rgb_to_html_batch', _best(lambda: grapefruit.rgb_to_html_batch(flat[:count*3])))])
+  finally:
+    grapefruit.np = numpyModule
+
+  if numpy is None:
+    return
+  rgb = numpy.frombuffer(flat).reshape(-1, 3)
+  _report('parse %d #rrggbb, numpy' % size, [
+    ('html_to_rgb per color (uncached)', _best(lambda: [grapefruit._parse_html(h) for h in html])),
+    ('html_to_rgb_batch (list)', _best(lambda: grapefruit.html_to_rgb_batch(html))),
+    ('html_to_rgb_batch (bytes blob)', _best(lambda: grapefruit.html_to_rgb_batch(blob)))])
+  _report('format %d colors, numpy' % size, [
+    ('rgb_to_html per color', _best(lambda: [grapefruit.rgb_to_html(v) for v in rgb.tolist()])),
+    ('rgb_to_html_batch (list)', _best(lambda: grapefruit.rgb_to_html_batch(rgb))),
+    ('rgb_to_html_batch (bytes blob)', _best(lambda: grapefruit.rgb_to_html_batch(rgb, blob=True)))])
+
+def bench_nearest_names(size=100000):
+  """Nearest named color: linear scan vs k-d tree vs vectorized scan."""
+  rnd = random.Random(0)
+  rgb = [(rnd.random(), rnd.random(), rnd.random()) for i in range(size)]
+  named = [(name, grapefruit.Color.from_html(name).lab) for name in sorted(grapefruit.NAMED_COLOR)]
+  def linear_scan(col):
+    l, a, b = col.lab
+    return min(named, key=lambda n: (n[1][0]-l)**2 + (n[1][1]-a)**2 + (n[1][2]-b)**2)[0]
+  count = size // 100
+  colors = [grapefruit.Color(v) for v in rgb]
+  rows = [
+    ('linear scan of the named colors', _best(lambda: [linear_scan(c) for c in colors[:count]]) * 100),
+    ('Color.nearest_name (k-d tree)', _best(lambda: [c.nearest_name() for c in colors]))]
+  if numpy is not None:
+    rgb = numpy.array(rgb)
+    rows.append(('nearest_names (numpy)', _best(lambda: grapefruit.nearest_names(rgb))))
+  _report('nearest named color, %d colors' % size, rows)
+
+def bench_palette(size=20000, queries=2000):
+  """Palette queries: linear scan vs k-d tree, and incremental edits."""
+  rnd = random.Random(0)
+  rgb = [(rnd.random(), rnd.random(), rnd.random()) for i in range(size)]
+  query = [(rnd.random(), rnd.random(), rnd.random()) for i in range(queries)]
+  palette = grapefruit.Palette(rgb)
+  lab = [grapefruit._cie_lab(*grapefruit.Color(v).lab) for v in rgb]
+  def linear_scan(col):
+    l, a, b = grapefruit._cie_lab(*grapefruit.Color(col).lab)
+    return min(range(size), key=lambda i: (lab[i][0]-l)**2 + (lab[i][1]-a)**2 + (lab[i][2]-b)**2)
+  def edits():
+    for v in query:
+      palette.remove(palette.add(v))
+  def sorted_inserts():
+    tree = grapefruit._KDTree()
+    for p in ordered:
+      tree.insert(p)
+  ordered = sorted(lab)
+  count = queries // 100
+  _report('palette of %d colors, %d queries' % (size, queries), [
+    ('linear scan', _best(lambda: [linear_scan(c) for c in query[:count]]) * 100),
+    ('Palette.nearest_batch', _best(lambda: palette.nearest_batch(query))),
+    ('Palette.nearest_batch, k=8', _best(lambda: palette.nearest_batch(query, 8))),
+    ('Palette.within_batch, radius=5', _best(lambda: palette.within_batch(query, 5))),
+    ('Palette.add + remove', _best(edits)),
+    ('k-d tree sorted inserts', _best(sorted_inserts)),
+    ('Palette() build', _best(lambda: grapefruit.Palette(rgb)))])
+
+def bench_delta_e(size=100000, rows=2000):
+  """CIEDE2000: scalar loop vs batch vs chunked all-pairs matrix."""
+  rnd = random.Random(0)
+  lab1 = [(rnd.uniform(0, 100), rnd.uniform(-1, 1), rnd.uniform(-1, 1)) for i in range(size)]
+  lab2 = [(rnd.uniform(0, 100), rnd.uniform(-1, 1), rnd.uniform(-1, 1)) for i in range(size)]
+  count = size // 10
+  def matrix():
+    for start, block in grapefruit.delta_e_matrix(lab1[:rows], lab2[:rows]):
+      block.min()
+  results = [
+    ('delta_e2000 loop', _best(lambda: [grapefruit.delta_e2000(c1, c2) for c1, c2 in zip(lab1[:count], lab2[:count])]) * 10)]
+  if numpy is not None:
+    lab1 = numpy.array(lab1)
+    lab2 = numpy.array(lab2)
+    results.append(('delta_e_batch', _best(lambda: grapefruit.delta_e_batch(lab1, lab2))))
+    results.append(('delta_e_matrix (%d x %d, per pair)' % (rows, rows),
+      _best(matrix) * size / float(rows * rows)))
+  _report('CIEDE2000, %d pairs' % size, results)
+
+def bench_extract_palette(size=24000000):
+  """Dominant colors of a 24 megapixels RGB8 image."""
+  if numpy is None:
+    print('extract_palette: numpy is not installed')
+    return
+  rnd = numpy.random.RandomState(0)
+  base = rnd.randint(0, 256, (6, 3))
+  pixels = base[rnd.randint(0, 6, size)] + rnd.randint(-20, 21, (size, 3))
+  pixels = numpy.clip(pixels, 0, 255).astype(numpy.uint8)
+  _report('extract_palette, %d pixels' % size, [
+    ('median cut, every pixel', _best(lambda: grapefruit.extract_palette(pixels, 8, method='median_cut', sample=None))),
+    ('median cut', _best(lambda: grapefruit.extract_palette(pixels, 8, method='median_cut'))),
+    ('k-means', _best(lambda: grapefruit.extract_palette(pixels, 8)))])
+
+def bench_dither(width=512, height=512):
+  """Floyd-Steinberg, Atkinson and Bayer dithering to the web safe colors."""
+  rnd = random.Random(0)
+  pixels = bytearray([rnd.randint(0, 255) for i in range(width * height * 3)])
+  numpy_module = grapefruit.np
+  grapefruit.np = None
+  try:
+    rows = [('floyd_steinberg, pure python', _best(lambda: grapefruit.dither_pixels(pixels, width), 1, 1))]
+  finally:
+    grapefruit.np = numpy_module
+  if numpy is not None:
+    for method in ('floyd_steinberg', 'atkinson', 'bayer'):
+      rows.append((method + ', numpy', _best(lambda: grapefruit.dither_pixels(pixels, width, method=method))))
+  _report('dithering %dx%d pixels' % (width, height), rows)
+
+def bench_gradient(steps=4096):
+  """A 4096 entries ramp: make_gradient vs Gradient.colors vs Gradient.ramp."""
+  c1 = grapefruit.Color.from_html('#ff0000')
+  c2 = grapefruit.Color.from_html('#0000ff')
+  stops = ['#000000', '#5000a0', '#e03030', '#ffd000', '#ffffff']
+  rows = [('make_gradient (sRGB)', _best(lambda: c1.make_gradient(c2, steps)))]
+  for space in ('rgb', 'lab', 'oklab'):
+    gradient = grapefruit.Gradient(stops, space)
+    rows.append(('Gradient.colors, ' + space, _best(lambda: list(gradient.colors(steps)))))
+    if numpy is not None:
+      rows.append(('Gradient.ramp, ' + space, _best(lambda: gradient.ramp(steps))))
+  _report('gradient of %d colors' % steps, rows)
+
+def bench_colormap(size=10000000):
+  """Colormap: one value at a time vs apply to an RGBA8 buffer."""
+  rnd = random.Random(0)
+  cmap = grapefruit.Colormap(['#000000', '#ff0000', '#ffff00', '#ffffff'], size=4096)
+  values = [rnd.random() for i in range(size // 100)]
+  rows = [('Colormap(value).ints', _best(lambda: [cmap(v).ints for v in values]) * 100)]
+  if numpy is not None:
+    values = numpy.random.RandomState(0).rand(size).astype(numpy.float32)
+    out = numpy.empty((size, 4), dtype=numpy.uint8)
+    rows.append(('Colormap.apply, RGBA8', _best(lambda: cmap.apply(values, 'RGBA8', out))))
+  _report('colormap of %d values' % size, rows)
+
+def bench_schemes(size=200000):
+  """Triadic schemes: Color.make_triadic_scheme vs triadic_scheme_batch."""
+  rnd = random.Random(0)
+  rgb = [(rnd.random(), rnd.random(), rnd.random()) for i in range(size)]
+  count = size // 20
+  colors = [grapefruit.Color(v) for v in rgb[:count]]
+  rows = [('Color.make_triadic_scheme', _best(lambda: [[c.rgb for c in col.make_triadic_scheme()] for col in colors]) * 20)]
+  if numpy is not None:
+    rgb = numpy.array(rgb)
+    rows.append(('triadic_scheme_batch', _best(lambda: grapefruit.triadic_scheme_batch(rgb))))
+    rows.append(('monochrome_scheme_batch', _best(lambda: grapefruit.monochrome_scheme_batch(rgb))))
+  _report('color schemes of %d colors' % size, rows)
+
+def bench_composite(width=3840, height=2160, layers=4):
+  """Compositing: Color.alpha_blend per pixel vs composite on RGBA8 buffers."""
+  rnd = random.Random(0)
+  size = width * height
+  colors = [(grapefruit.Color.from_rgb(rnd.random(), rnd.random(), rnd.random(), rnd.random()),
+             grapefruit.Color.from_rgb(rnd.random(), rnd.random(), rnd.random(), rnd.random())) for i in range(size // 1000)]
+  rows = [('Color.alpha_blend', _best(lambda: [s.alpha_blend(d) for s, d in colors]) * 1000)]
+  if numpy is not None:
+    state = numpy.random.RandomState(0)
+    src = [state.randint(0, 256, size * 4).astype(numpy.uint8) for i in range(layers)]
+    dst = state.randint(0, 256, size * 4).astype(numpy.uint8)
+    rows.append(('composite, over', _best(lambda: grapefruit.composite(src[0], dst))))
+    rows.append(('composite, overlay', _best(lambda: grapefruit.composite(src[0], dst, 'overlay'))))
+    rows.append(('composite, over, linear', _best(lambda: grapefruit.composite(src[0], dst, linear=True))))
+    rows.append(('composite, over, premultiplied', _best(lambda: grapefruit.composite(src[0], dst, premultiplied=True))))
+    rows.append(('composite_layers, %d layers' % layers, _best(lambda: grapefruit.composite_layers(src, dst))))
+  _report('compositing of %dx%d pixels' % (width, height), rows)
+
+def bench_adaptation(size=1000000):
+  """Chromatic adaptation D65 to D50: adapt_xyz per color vs adapt_xyz_batch."""
+  rnd = random.Random(0)
+  xyz = [(rnd.random(), rnd.random(), rnd.random()) for i in range(size // 10)]
+  d50 = grapefruit.WHITE_REFERENCE['std_D50']
+  rows = [('adapt_xyz', _best(lambda: [grapefruit.adapt_xyz(v, dstWref=d50) for v in xyz]) * 10)]
+  if numpy is not None:
+    xyz = numpy.random.RandomState(0).rand(size, 3)
+    out = numpy.empty_like(xyz)
+    rows.append(('adapt_xyz_batch', _best(lambda: grapefruit.adapt_xyz_batch(xyz, dstWref=d50, out=out))))
+  _report('chromatic adaptation of %d colors' % size, rows)
+
+def main(names):
+  benchmarks = sorted(k[6:] for k in globals() if k.startswith('bench_'))
+  for name in names or benchmarks:
+    globals()['bench_' + name]()
+    print()
+
+if __name__=='__main__':
+  main(sys.argv[1:])
+
+# vim: ts=2 sts=2 sw=2 et
@@ -17,9 +17,17 @@
 
 """Unit tests for the grapefruit module."""
 
+import array
+from unittest import SkipTest
+
 import grapefruit
 from nose.tools import *
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
 def assert_items_almost_equal(first, second, places=3, msg=None, delta=None):
   """assert_almost_equal for iterables"""
   assert_equal(len(first), len(second))
@@ -104,6 +112,22 @@ class TestConversion():
     assert_items_almost_equal((1.0, 0.4, 0.0), grapefruit.html_to_rgb("f60"))
     assert_items_almost_equal((1.000000, 0.980392, 0.803922), grapefruit.html_to_rgb("lemonchiffon"))
 
+  def test_html_cache(self):
+    try:
+      grapefruit.set_html_cache_size(2)
+      grapefruit.clear_html_cache()
+      for html in ("#ff8000", "red", "#ff8000", "#123", "red", " RED "):
+        grapefruit.html_to_rgb(html)
+      assert_equal(grapefruit.html_cache_stats(), (1, 5, 2, 2))
+      assert_equal(grapefruit.html_to_rgb(" RED "), (1.0, 0.0, 0.0))
+      assert_raises(ValueError, grapefruit.html_to_rgb, "#ff80")
+      assert_raises(ValueError, grapefruit.set_html_cache_size, -1)
+      grapefruit.set_html_cache_size(0)
+      grapefruit.html_to_rgb("red")
+      assert_equal(grapefruit.html_cache_stats()[2:], (0, 0))
+    finally:
+      grapefruit.set_html_cache_size(1024)
+
   def test_rgb_to_pil_tuple(self):
     assert_almost_equal(0x0080ff, grapefruit.rgb_to_pil((1, 0.5, 0)))
   def test_rgb_to_pil(self):
@@ -398,6 +422,38 @@ class TestColorProperties():
     col = grapefruit.Color.from_rgb(1.0, 0.5, 0.0)
     assert_equal(col.greyscale, (0.5, 0.5, 0.5))
 
+  def test_lazy_values(self):
+    col = grapefruit.Color.from_hsl(30, 1, 0.5)
+    assert_false(hasattr(col, '__dict__'))
+    assert_equal(col.rgb, (1.0, 0.5, 0.0))
+    col.hsl_hue = 60
+    assert_equal(col.rgb, (1.0, 1.0, 0.0))
+    col.green = 0.5
+    assert_equal(col.hsl, (30.0, 1.0, 0.5))
+
+  def test_cache(self):
+    col = grapefruit.Color.from_rgb(1.0, 0.5, 0.0)
+    assert_equal(col.cache_stats, (0, 0))
+    col.enable_cache()
+    lab = col.lab
+    assert_equal(col.lab, lab)
+    assert_equal(col.cache_stats, (1, 2))
+    for name, value in (('red', 0.5), ('hsl', (30, 1, 0.25)), ('lab', lab), ('white_ref', grapefruit.WHITE_REFERENCE['std_D50'])):
+      setattr(col, name, value)
+      assert_equal(col.lab, grapefruit.Color(col.rgb, wref=col.white_ref).lab)
+    assert_equal(col.html, col.html)
+    assert_equal(col.cache_stats, (2, 11))
+    col.disable_cache()
+    assert_equal(col.cache_stats, (0, 0))
+
+  def test_pickle(self):
+    import pickle
+    for col in (grapefruit.Color.from_rgb(1.0, 0.5, 0.0, 0.5), grapefruit.Color.from_hsl(30, 1, 0.5)):
+      for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        copy = pickle.loads(pickle.dumps(col, protocol))
+        assert_equal(copy, col)
+        assert_equal(copy.hsl, col.hsl)
+
 
 class TestColorMethods():
   @classmethod
@@ -479,6 +535,10 @@ class TestColorMethods():
     c1 = grapefruit.Color.from_rgb(1.0, 0.0, 0.0)
     c2 = grapefruit.Color.from_rgb(0.0, 1.0, 0.0)
     assert_equal(gradient, c1.make_gradient(c2, 3))
+    # The values out of the sRGB gamut are interpolated, not clipped.
+    col = grapefruit.Color.from_lab(50, 1.2, 0).make_gradient(grapefruit.Color.from_rgb(0, 0, 0), 1)[0]
+    assert_items_almost_equal(col.rgb, [v / 2 for v in grapefruit.Color.from_lab(50, 1.2, 0).rgb])
+    assert_true(col.green < -0.8)
 
   def test_complementary_color(self):
     assert_equal(self.hsl_col.complementary_color(mode='rgb').hsl, (210, 1, 0.5))
@@ -527,3 +587,1498 @@ class TestColorMethods():
       assert_false(c.is_legal)
       assert_items_almost_equal(c.nearest_legal().rgb, (1.0, 0.0, 0.5))
       assert_almost_equal(c.nearest_legal().alpha, 1.0)
+
+
+class TestFrozenColor():
+  def test_immutable(self):
+    col = grapefruit.FrozenColor.from_html('#ff8000')
+    for name, value in (('rgb', (0, 0, 0)), ('red', 0), ('hsl', (0, 0, 0)), ('alpha', 0.5), ('white_ref', (1, 1, 1))):
+      assert_raises(AttributeError, setattr, col, name, value)
+    assert_raises(AttributeError, col.enable_cache)
+    assert_equal(col.ints, (255, 128, 0))
+    assert_true(isinstance(col.darker(0.1), grapefruit.Color))
+
+  def test_hash(self):
+    col = grapefruit.FrozenColor((1.0, 0.5, 0.0), alpha=0.5)
+    assert_equal(hash(col), hash(grapefruit.FrozenColor.from_color(grapefruit.Color.from_rgb(1.0, 0.5, 0.0, 0.5))))
+    assert_equal(len(set([col, grapefruit.FrozenColor.from_color(col), grapefruit.FrozenColor((1.0, 0.5, 0.0))])), 2)
+    assert_equal(hash(col), hash((1.0, 0.5, 0.0, 0.5)))
+    assert_equal(col, (1.0, 0.5, 0.0, 0.5))
+
+  def test_interning(self):
+    col = grapefruit.FrozenColor.from_html('#FF0000')
+    assert_true(col is grapefruit.FrozenColor.from_html('#FF0000'))
+    assert_true(col is grapefruit.FrozenColor.from_html('red'))
+    assert_true(col is grapefruit.FrozenColor.from_ints((255, 0, 0)))
+    assert_true(col is grapefruit.FrozenColor.from_pil(0x0000ff))
+    assert_false(col is grapefruit.FrozenColor.from_html('red', alpha=0.5))
+    assert_false(col is grapefruit.FrozenColor.from_html('red', wref=grapefruit.WHITE_REFERENCE['std_D50']))
+
+  def test_from_values(self):
+    FrozenColor = grapefruit.FrozenColor
+    col = FrozenColor.from_rgb(1.0, 0.5, 0.0)
+    for other in (FrozenColor.from_hsl(30, 1, 0.5), FrozenColor.from_hsv(30, 1, 1), FrozenColor.from_cmy(0, 0.5, 1),
+                  FrozenColor.from_cmyk(0, 0.5, 1, 0), FrozenColor.from_color(grapefruit.Color.from_rgb(1.0, 0.5, 0.0))):
+      assert_true(other is col)
+    for col in (FrozenColor.from_yiq(0.5922, 0.45885, -0.05), FrozenColor.from_yuv(0.5925, -0.2916, 0.3575),
+                FrozenColor.from_xyz(0.488941, 0.365682, 0.0448137), FrozenColor.from_lab(66.951823, 0.43084105, 0.73969231)):
+      assert_true(isinstance(col, FrozenColor))
+      assert_true(col is FrozenColor.from_rgb(*col.rgb))
+    wref = list(grapefruit.WHITE_REFERENCE['std_D50'])
+    col = FrozenColor.from_html('red', wref=wref)
+    assert_true(col is FrozenColor.from_rgb(1.0, 0.0, 0.0, wref=tuple(wref)))
+    assert_equal(col.white_ref, tuple(wref))
+
+  def test_pickle(self):
+    import pickle
+    col = grapefruit.FrozenColor.from_html('#ff8000', 0.5)
+    copy = pickle.loads(pickle.dumps(col))
+    assert_true(isinstance(copy, grapefruit.FrozenColor))
+    assert_equal(copy, col)
+    assert_equal(hash(copy), hash(col))
+
+
+class TestColorArray():
+  @classmethod
+  def setup_class(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    self.rgb = [(1.0, 0.5, 0.0), (0.5, 0.5, 0.5), (0.2, 0.4, 0.9), (0.0, 0.0, 0.0)]
+    self.colors = grapefruit.ColorArray.from_rgb(self.rgb, alpha=0.5)
+
+  def assert_rows_almost_equal(self, rows, conversion):
+    assert_equal(len(rows), len(self.rgb))
+    for row, rgb in zip(rows, self.rgb):
+      assert_items_almost_equal(row, conversion(*rgb), places=9)
+
+  def test_init(self):
+    assert_equal(len(self.colors), 4)
+    assert_equal(self.colors.rgb.shape, (4, 3))
+    assert_equal(self.colors.alpha.tolist(), [0.5] * 4)
+    assert_equal(self.colors.white_ref, grapefruit.WHITE_REFERENCE['std_D65'])
+    assert_raises(ValueError, grapefruit.ColorArray, self.rgb, 'hsv')
+
+  def test_from_hsl(self):
+    colors = grapefruit.ColorArray.from_hsl([(30, 1, 0.5), (240, 0, 0.5)])
+    assert_equal(colors.rgb.tolist(), [[1.0, 0.5, 0.0], [0.5, 0.5, 0.5]])
+
+  def test_from_colors(self):
+    colors = grapefruit.ColorArray.from_colors([grapefruit.Color.from_rgb(1, 0.5, 0, 0.2)])
+    assert_equal(colors.rgba.tolist(), [[1.0, 0.5, 0.0, 0.2]])
+
+  def test_getitem(self):
+    assert_equal(self.colors[0], (1.0, 0.5, 0.0, 0.5))
+    assert_equal(len(self.colors[1:3]), 2)
+    assert_equal(list(self.colors)[2], (0.2, 0.4, 0.9, 0.5))
+
+  def test_conversions(self):
+    self.assert_rows_almost_equal(self.colors.hsl, grapefruit.rgb_to_hsl)
+    self.assert_rows_almost_equal(self.colors.hsv, grapefruit.rgb_to_hsv)
+    self.assert_rows_almost_equal(self.colors.yiq, grapefruit.rgb_to_yiq)
+    self.assert_rows_almost_equal(self.colors.yuv, grapefruit.rgb_to_yuv)
+    self.assert_rows_almost_equal(self.colors.xyz, grapefruit.rgb_to_xyz)
+    self.assert_rows_almost_equal(self.colors.lab, lambda *rgb: grapefruit.Color.from_rgb(*rgb).lab)
+    self.assert_rows_almost_equal(self.colors.cmyk, lambda *rgb: grapefruit.Color.from_rgb(*rgb).cmyk)
+
+  def test_ints(self):
+    assert_equal(self.colors.ints.tolist(), [list(grapefruit.rgb_to_ints(rgb)) for rgb in self.rgb])
+
+  def test_html(self):
+    assert_equal(self.colors.html, ['#ff8000', '#808080', '#3366e6', '#000000'])
+
+
+class TestBatchConversion():
+  @classmethod
+  def setup_class(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    import random
+    rnd = random.Random(42)
+    self.rgb = [(rnd.random(), rnd.random(), rnd.random()) for i in range(200)]
+    self.rgb += [(0.0, 0.0, 0.0), (1.0, 1.0, 1.0), (0.5, 0.5, 0.5), (1.0, 0.5, 0.0), (0.0, 0.0, 1.0)]
+
+  def assert_matches_scalar(self, batch, scalar, values, **kwargs):
+    result = batch(values, **kwargs)
+    assert_equal(len(result), len(values))
+    for row, v in zip(result.tolist(), values):
+      expected = scalar(*v, **kwargs)
+      for r, e in zip(row, expected):
+        assert_almost_equal(r, e, delta=grapefruit.BATCH_TOLERANCE)
+    return result
+
+  def test_round_trips(self):
+    pairs = (
+      ('hsl', grapefruit.rgb_to_hsl_batch, grapefruit.rgb_to_hsl, grapefruit.hsl_to_rgb_batch, grapefruit.hsl_to_rgb),
+      ('hsv', grapefruit.rgb_to_hsv_batch, grapefruit.rgb_to_hsv, grapefruit.hsv_to_rgb_batch, grapefruit.hsv_to_rgb),
+      ('yiq', grapefruit.rgb_to_yiq_batch, grapefruit.rgb_to_yiq, grapefruit.yiq_to_rgb_batch, grapefruit.yiq_to_rgb),
+      ('yuv', grapefruit.rgb_to_yuv_batch, grapefruit.rgb_to_yuv, grapefruit.yuv_to_rgb_batch, grapefruit.yuv_to_rgb),
+      ('xyz', grapefruit.rgb_to_xyz_batch, grapefruit.rgb_to_xyz, grapefruit.xyz_to_rgb_batch, grapefruit.xyz_to_rgb),
+      ('cmy', grapefruit.rgb_to_cmy_batch, grapefruit.rgb_to_cmy, grapefruit.cmy_to_rgb_batch, grapefruit.cmy_to_rgb))
+    for name, to_batch, to_scalar, from_batch, from_scalar in pairs:
+      converted = self.assert_matches_scalar(to_batch, to_scalar, self.rgb)
+      self.assert_matches_scalar(from_batch, from_scalar, converted.tolist())
+
+  def test_lab(self):
+    xyz = grapefruit.rgb_to_xyz_batch(self.rgb).tolist()
+    for wref in (grapefruit.WHITE_REFERENCE['std_D65'], grapefruit.WHITE_REFERENCE['std_D50']):
+      lab = self.assert_matches_scalar(grapefruit.xyz_to_lab_batch, grapefruit.xyz_to_lab, xyz, wref=wref)
+      self.assert_matches_scalar(grapefruit.lab_to_xyz_batch, grapefruit.lab_to_xyz, lab.tolist(), wref=wref)
+
+  def test_cmyk(self):
+    cmy = [grapefruit.rgb_to_cmy(v) for v in self.rgb]
+    cmyk = self.assert_matches_scalar(grapefruit.cmy_to_cmyk_batch, grapefruit.cmy_to_cmyk, cmy)
+    assert_equal(cmyk.shape, (len(cmy), 4))
+    self.assert_matches_scalar(grapefruit.cmyk_to_cmy_batch, grapefruit.cmyk_to_cmy, cmyk.tolist())
+
+  def test_ints(self):
+    ints = grapefruit.rgb_to_ints_batch(self.rgb)
+    assert_equal(ints.tolist(), [list(grapefruit.rgb_to_ints(v)) for v in self.rgb])
+    self.assert_matches_scalar(grapefruit.ints_to_rgb_batch, grapefruit.ints_to_rgb, ints.tolist())
+
+  def test_out(self):
+    values = numpy.array(self.rgb)
+    out = numpy.empty_like(values)
+    assert_true(grapefruit.rgb_to_hsl_batch(values, out=out) is out)
+    assert_items_almost_equal(out[3], grapefruit.rgb_to_hsl(self.rgb[3]))
+    grapefruit.rgb_to_xyz_batch(values, out=values)
+    assert_items_almost_equal(values[3], grapefruit.rgb_to_xyz(self.rgb[3]))
+    assert_raises(ValueError, grapefruit.rgb_to_hsl_batch, self.rgb, out=numpy.empty((2, 3)))
+
+  def test_html(self):
+    html = grapefruit.rgb_to_html_batch(self.rgb)
+    assert_equal(html, [grapefruit.rgb_to_html(v) for v in self.rgb])
+    blob = grapefruit.rgb_to_html_batch(self.rgb, blob=True)
+    assert_equal(blob, ''.join([h + '\n' for h in html]).encode('ascii'))
+    expected = [grapefruit.html_to_rgb(h) for h in html]
+    assert_equal(grapefruit.html_to_rgb_batch(html).tolist(), [list(v) for v in expected])
+    assert_equal(grapefruit.html_to_rgb_batch(blob).tolist(), [list(v) for v in expected])
+    mixed = ['#FF8000', 'f60', 'lemonchiffon', b'00ff00']
+    assert_equal(grapefruit.html_to_rgb_batch(mixed).tolist(), [list(grapefruit.html_to_rgb(h)) for h in ('#FF8000', 'f60', 'lemonchiffon', '00ff00')])
+    assert_raises(ValueError, grapefruit.html_to_rgb_batch, ['#ff8000', '#ff80zz'])
+    assert_raises(ValueError, grapefruit.html_to_rgb_batch, b'#ff8000\n#ff80zz\n')
+    assert_raises(ValueError, grapefruit.html_to_rgb_batch, ['#a###bc', '#d###ef'])
+    assert_raises(ValueError, grapefruit.html_to_rgb_batch, b'#a###bc\n#d###ef\n')
+
+  def test_array_out(self):
+    flat = array.array('d', [c for rgb in self.rgb for c in rgb])
+    out = array.array('d', [0.0]) * len(flat)
+    assert_true(grapefruit.rgb_to_xyz_batch(flat, out=out) is out)
+    assert_items_almost_equal(out[9:12], grapefruit.rgb_to_xyz(self.rgb[3]))
+
+  def test_workers(self):
+    if grapefruit.shared_memory is None:
+      raise SkipTest("multiprocessing.shared_memory is not available")
+    values = numpy.array(self.rgb)
+    assert_true(numpy.array_equal(grapefruit.rgb_to_hsl_batch(values, workers=2), grapefruit.rgb_to_hsl_batch(values)))
+    assert_true(numpy.array_equal(grapefruit.cmy_to_cmyk_batch(values, workers=2), grapefruit.cmy_to_cmyk_batch(values)))
+    wref = grapefruit.WHITE_REFERENCE['std_D50']
+    assert_true(numpy.array_equal(grapefruit.xyz_to_lab_batch(values, wref, workers=3), grapefruit.xyz_to_lab_batch(values, wref)))
+    out = numpy.empty(values.shape, dtype=numpy.uint8)
+    assert_true(grapefruit.xyz_to_rgb_batch(values, out=out, workers=2) is out)
+    assert_equal(out.tolist(), grapefruit.xyz_to_rgb_batch(values, out=numpy.empty_like(out)).tolist())
+
+  def test_shared_batch(self):
+    if grapefruit.shared_memory is None:
+      raise SkipTest("multiprocessing.shared_memory is not available")
+    with grapefruit.SharedBatch(len(self.rgb)) as rgb, grapefruit.SharedBatch(len(self.rgb), 4) as cmyk:
+      rgb.values[:] = self.rgb
+      created = []
+      sharedMemory = grapefruit.shared_memory.SharedMemory
+      class CountingSharedMemory(sharedMemory):
+        def __init__(self, name=None, create=False, size=0):
+          created.append(create)
+          sharedMemory.__init__(self, name, create, size)
+      grapefruit.shared_memory.SharedMemory = CountingSharedMemory
+      try:
+        assert_true(grapefruit.cmy_to_cmyk_batch(rgb.values, out=cmyk.values, workers=2) is cmyk.values)
+        assert_false(any(created))
+        assert_true(numpy.array_equal(grapefruit.rgb_to_hsl_batch(rgb.values[2:], workers=2), grapefruit.rgb_to_hsl_batch(rgb.values[2:])))
+        assert_equal(created, [True])
+      finally:
+        grapefruit.shared_memory.SharedMemory = sharedMemory
+      assert_true(numpy.array_equal(cmyk.values, grapefruit.cmy_to_cmyk_batch(self.rgb)))
+    assert_raises(ValueError, getattr, rgb, 'values')
+
+  def test_threads(self):
+    from concurrent.futures import ThreadPoolExecutor
+    values = numpy.repeat(numpy.array(self.rgb), 100, axis=0)
+    assert_true(len(values) > grapefruit._THREAD_CHUNK)
+    xyz = grapefruit.rgb_to_xyz_batch(values)
+    assert_true(numpy.array_equal(grapefruit.rgb_to_xyz_batch(values, threads=3), xyz))
+    out = numpy.empty((len(values), 4))
+    with ThreadPoolExecutor(2) as executor:
+      assert_true(grapefruit.cmy_to_cmyk_batch(values, out=out, threads=executor) is out)
+    assert_true(numpy.array_equal(out, grapefruit.cmy_to_cmyk_batch(values)))
+    assert_raises(ValueError, grapefruit.rgb_to_xyz_batch, values, workers=2, threads=2)
+
+
+class TestPurePythonBatch():
+  """The batch conversions without numpy."""
+
+  @classmethod
+  def setup_class(self):
+    self.numpy = grapefruit.np
+    grapefruit.np = None
+    grapefruit._close_worker_pools()
+    import random
+    rnd = random.Random(42)
+    self.flat = array.array('d', [rnd.random() for i in range(300)])
+
+  @classmethod
+  def teardown_class(self):
+    grapefruit.np = self.numpy
+    grapefruit._close_worker_pools()
+
+  def assert_matches_scalar(self, result, scalar, values, width=3, **kwargs):
+    out_width = len(result) * width // len(values)
+    for i in range(len(values) // width):
+      expected = scalar(*values[i*width:(i+1)*width], **kwargs)
+      row = result[i*out_width:(i+1)*out_width]
+      for r, e in zip(row, expected):
+        assert_almost_equal(r, e, delta=grapefruit.BATCH_TOLERANCE)
+
+  def test_xyz_lab(self):
+    xyz = grapefruit.rgb_to_xyz_batch(self.flat)
+    assert_true(isinstance(xyz, array.array))
+    self.assert_matches_scalar(xyz, grapefruit.rgb_to_xyz, self.flat)
+    lab = grapefruit.xyz_to_lab_batch(xyz, grapefruit.WHITE_REFERENCE['std_D50'])
+    self.assert_matches_scalar(lab, grapefruit.xyz_to_lab, xyz, wref=grapefruit.WHITE_REFERENCE['std_D50'])
+    self.assert_matches_scalar(grapefruit.lab_to_xyz_batch(lab), grapefruit.lab_to_xyz, lab)
+    self.assert_matches_scalar(grapefruit.xyz_to_rgb_batch(xyz), grapefruit.xyz_to_rgb, xyz)
+
+  def test_scalar_kernels(self):
+    self.assert_matches_scalar(grapefruit.rgb_to_hsl_batch(self.flat), grapefruit.rgb_to_hsl, self.flat)
+    self.assert_matches_scalar(grapefruit.cmy_to_cmyk_batch(self.flat), grapefruit.cmy_to_cmyk, self.flat)
+    cmyk = array.array('d', [1, 0.32, 0, 0.5])
+    assert_items_almost_equal(grapefruit.cmyk_to_cmy_batch(cmyk), (1.0, 0.66, 0.5))
+    assert_equal(list(grapefruit.rgb_to_ints_batch([(1, 0.5, 0)])), [255, 128, 0])
+
+  def test_out(self):
+    out = array.array('d', [0.0]) * len(self.flat)
+    assert_true(grapefruit.rgb_to_xyz_batch(self.flat, out=out) is out)
+    self.assert_matches_scalar(out, grapefruit.rgb_to_xyz, self.flat)
+    assert_raises(ValueError, grapefruit.rgb_to_xyz_batch, self.flat, out=array.array('d', [0.0]))
+    assert_raises(ValueError, grapefruit.rgb_to_xyz_batch, array.array('d', [0.0]))
+    assert_raises(TypeError, grapefruit.rgb_to_hsl_batch, [(1, 0.5, 0)], out=[[0.0] * 3])
+    assert_raises(TypeError, grapefruit.rgb_to_hsl_batch, [(1, 0.5, 0)], out=b'\0' * 24)
+    assert_raises(TypeError, grapefruit.Gradient(['red', 'blue']).sample_batch, [0.5], out=[0.0] * 4)
+
+  def test_portable_out(self):
+    # The same calls with an out buffer give the same results with numpy.
+    if self.numpy is None:
+      raise SkipTest("numpy is not installed")
+    rgb = self.flat[:30]
+    gradient = grapefruit.Gradient(['red', 'blue'])
+    calls = [
+      (lambda out: grapefruit.rgb_to_hsl_batch(rgb, out=out), 30),
+      (lambda out: grapefruit.complementary_color_batch(rgb, out=out), 30),
+      (lambda out: grapefruit.triadic_scheme_batch(rgb, out=out), 60),
+      (lambda out: gradient.sample_batch([0.0, 0.3, 1.0], out=out), 12),
+      (lambda out: grapefruit.delta_e_batch(rgb, (0.5, 0.0, 0.0), out=out), 10)]
+    for call, size in calls:
+      out = array.array('d', [0.0]) * size
+      assert_true(call(out) is out)
+      grapefruit.np = self.numpy
+      try:
+        expected = array.array('d', [0.0]) * size
+        assert_true(call(expected) is expected)
+      finally:
+        grapefruit.np = None
+      assert_items_almost_equal(out, expected, places=9)
+
+  def test_html(self):
+    html = grapefruit.rgb_to_html_batch(self.flat)
+    assert_equal(html, [grapefruit.rgb_to_html(*self.flat[i:i+3]) for i in range(0, len(self.flat), 3)])
+    rgb = grapefruit.html_to_rgb_batch('\n'.join(html))
+    assert_true(isinstance(rgb, array.array))
+    assert_equal(list(rgb), [v for h in html for v in grapefruit.html_to_rgb(h)])
+    assert_equal(list(grapefruit.html_to_rgb_batch(['red', '#00f'])), [1.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+    # A str is text on Python 2 as well, where it is also bytes.
+    assert_equal(list(grapefruit.html_to_rgb_batch(str('#ff0000\n#00f'))), [1.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+    assert_equal(list(grapefruit.html_to_rgb_batch(u'#ff0000 #0000ff')), [1.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+
+  def test_memoryview(self):
+    if not hasattr(memoryview, 'cast'):
+      raise SkipTest("Python 2 memoryviews only hold bytes")
+    view = memoryview(self.flat.tobytes()).cast('d')
+    self.assert_matches_scalar(grapefruit.rgb_to_hsv_batch(view), grapefruit.rgb_to_hsv, self.flat)
+
+  def test_workers(self):
+    if grapefruit.shared_memory is None:
+      raise SkipTest("multiprocessing.shared_memory is not available")
+    hsl = grapefruit.rgb_to_hsl_batch(self.flat, workers=2)
+    assert_true(isinstance(hsl, array.array))
+    assert_equal(hsl, grapefruit.rgb_to_hsl_batch(self.flat))
+    pixels = array.array('B', [int(v * 255) for v in self.flat])
+    assert_equal(grapefruit.rgb_to_xyz_batch(pixels, workers=2), grapefruit.rgb_to_xyz_batch(pixels))
+
+  def test_shared_batch(self):
+    if grapefruit.shared_memory is None:
+      raise SkipTest("multiprocessing.shared_memory is not available")
+    with grapefruit.SharedBatch(len(self.flat) // 3) as rgb, grapefruit.SharedBatch(len(self.flat) // 3) as hsv:
+      assert_true(isinstance(rgb.values, memoryview))
+      rgb.values[:] = self.flat
+      assert_true(grapefruit.rgb_to_hsv_batch(rgb.values, out=hsv.values, workers=2) is hsv.values)
+      assert_equal(hsv.values.tolist(), grapefruit.rgb_to_hsv_batch(self.flat).tolist())
+
+  def test_threads(self):
+    flat = self.flat * 200
+    assert_true(len(flat) > grapefruit._THREAD_CHUNK * 3)
+    assert_equal(grapefruit.rgb_to_hsv_batch(flat, threads=2), grapefruit.rgb_to_hsv_batch(flat))
+
+
+class TestNumpyExamples():
+  """The examples of the numpy only features, skipped by the doctests."""
+
+  def test_examples(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    import doctest
+    runner = doctest.DocTestRunner(optionflags=doctest.ELLIPSIS)
+    count = 0
+    for test in doctest.DocTestFinder().find(grapefruit):
+      skipped = [e for e in test.examples if e.options.get(doctest.SKIP)]
+      if skipped:
+        for example in test.examples:
+          example.options.pop(doctest.SKIP, None)
+        count += len(skipped)
+        runner.run(test, out=lambda s: None)
+    assert_true(count > 0)
+    assert_equal(runner.summarize(verbose=False).failed, 0)
+
+
+class TestAdaptation():
+  @classmethod
+  def setup_class(self):
+    import random
+    rnd = random.Random(25)
+    self.xyz = [(rnd.random(), rnd.random(), rnd.random()) for i in range(100)]
+    self.pairs = [('std_D65', 'std_D50'), ('std_A', 'std_D65'), ('sup_F11', 'std_E'), ('std_D50', 'sup_D50')]
+
+  def test_white_points(self):
+    for method in grapefruit.ADAPTATION_METHODS:
+      for src, dst in self.pairs:
+        src, dst = grapefruit.WHITE_REFERENCE[src], grapefruit.WHITE_REFERENCE[dst]
+        assert_items_almost_equal(grapefruit.adapt_xyz(src, srcWref=src, dstWref=dst, method=method), dst, places=12)
+        for xyz in self.xyz[:10]:
+          back = grapefruit.adapt_xyz(grapefruit.adapt_xyz(xyz, srcWref=src, dstWref=dst, method=method), srcWref=dst, dstWref=src, method=method)
+          assert_items_almost_equal(back, xyz, places=12)
+      d65 = grapefruit.WHITE_REFERENCE['std_D65']
+      assert_items_almost_equal(grapefruit.adapt_xyz(self.xyz[0], srcWref=d65, dstWref=d65, method=method), self.xyz[0], places=12)
+    assert_raises(ValueError, grapefruit.adaptation_matrix, method='xyz')
+
+  def test_matrix(self):
+    # Bradford D65 to D50, with the white points used by Lindbloom.
+    m = grapefruit.adaptation_matrix((0.95047, 1.0, 1.08883), (0.96422, 1.0, 0.82521))
+    expected = [
+      (1.0478112, 0.0228866, -0.0501270),
+      (0.0295424, 0.9904844, -0.0170491),
+      (-0.0092345, 0.0150436, 0.7521316)]
+    for row, ref in zip(m, expected):
+      assert_items_almost_equal(row, ref, places=7)
+    assert_true(grapefruit.adaptation_matrix() is grapefruit.adaptation_matrix())
+    d50 = grapefruit.WHITE_REFERENCE['std_D50']
+    assert_true(grapefruit.adaptation_matrix(dstWref=d50, method='cat02') is grapefruit.adaptation_matrix(dstWref=list(d50), method='cat02'))
+
+  def check_batch(self):
+    for method in grapefruit.ADAPTATION_METHODS:
+      for src, dst in self.pairs:
+        src, dst = grapefruit.WHITE_REFERENCE[src], grapefruit.WHITE_REFERENCE[dst]
+        result = grapefruit.adapt_xyz_batch(array.array('d', [v for xyz in self.xyz for v in xyz]), src, dst, method)
+        if hasattr(result, 'ravel'):
+          result = result.ravel()
+        expected = [v for xyz in self.xyz for v in grapefruit.adapt_xyz(xyz, srcWref=src, dstWref=dst, method=method)]
+        assert_items_almost_equal(result, expected, places=12)
+
+  def test_batch(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    self.check_batch()
+    xyz = numpy.array(self.xyz)
+    expected = grapefruit.adapt_xyz_batch(xyz, method='von_kries')
+    assert_true(grapefruit.adapt_xyz_batch(xyz, method='von_kries', out=xyz) is xyz)
+    assert_true(numpy.array_equal(xyz, expected))
+
+  def test_pure_python(self):
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      self.check_batch()
+    finally:
+      grapefruit.np = numpy_module
+
+  def test_colors(self):
+    a = grapefruit.WHITE_REFERENCE['std_A']
+    col = grapefruit.Color.from_rgb(0.2, 0.6, 0.4, 0.5)
+    adapted = col.adapt(a, 'cat02')
+    assert_equal(adapted.white_ref, a)
+    assert_equal(adapted.alpha, 0.5)
+    assert_items_almost_equal(adapted.xyz, grapefruit.adapt_xyz(col.xyz, srcWref=col.white_ref, dstWref=a, method='cat02'), places=6)
+    assert_items_almost_equal(adapted.adapt(col.white_ref, 'cat02').rgb, col.rgb, places=5)
+    if numpy is None:
+      return
+    colors = grapefruit.ColorArray.from_rgb([col.rgb, (1.0, 0.5, 0.0)], 0.5)
+    adapted = colors.adapt(a, 'cat02')
+    assert_equal(adapted.white_ref, a)
+    assert_equal(adapted.alpha.tolist(), [0.5, 0.5])
+    assert_items_almost_equal(adapted[0].rgb, col.adapt(a, 'cat02').rgb, places=9)
+
+class TestSrgbLut():
+  @classmethod
+  def setup_class(self):
+    self.levels = [(255, 128, 0), (0, 0, 0), (1, 10, 100), (200, 201, 202)]
+    self.flat = [v for c in self.levels for v in c]
+
+  def test_decode_lut(self):
+    for depth in (8, 16):
+      lut = grapefruit._srgb_lut(depth)
+      scale = float((1 << depth) - 1)
+      for level in (0, 1, 10, 128, (1 << depth) - 1):
+        assert_almost_equal(lut[level], grapefruit.rgb_to_xyz(level / scale, 0, 0)[1] / 0.2126, places=12)
+
+  def test_pure_python_pixels(self):
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      xyz = grapefruit.rgb_to_xyz_batch(array.array('B', self.flat))
+      for i, level in enumerate(self.levels):
+        expected = grapefruit.rgb_to_xyz(grapefruit.ints_to_rgb(level))
+        assert_items_almost_equal(xyz[i*3:i*3+3], expected, places=12)
+      out = array.array('B', [0]) * len(self.flat)
+      grapefruit.xyz_to_rgb_batch(xyz, out=out)
+      assert_equal(out.tolist(), self.flat)
+    finally:
+      grapefruit.np = numpy_module
+
+  def test_numpy_pixels(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    for dtype, scale in ((numpy.uint8, 255.0), (numpy.uint16, 65535.0)):
+      pixels = numpy.array(self.levels, dtype=dtype) * (1 if dtype==numpy.uint8 else 257)
+      xyz = grapefruit.rgb_to_xyz_batch(pixels)
+      expected = grapefruit.rgb_to_xyz_batch(pixels / scale)
+      assert_true(numpy.allclose(xyz, expected, rtol=0, atol=1e-12))
+      out = numpy.empty_like(pixels)
+      grapefruit.xyz_to_rgb_batch(xyz, out=out)
+      assert_equal(out.tolist(), pixels.tolist())
+
+
+class TestLut3D():
+  @classmethod
+  def setup_class(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    self.linear = staticmethod(lambda r, g, b: (r + 2*g, g - b, 3*b))
+    self.rgb = [(0.1, 0.2, 0.3), (1.0, 0.5, 0.0), (0.33, 0.66, 0.99), (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)]
+
+  def test_build_lut(self):
+    lut = grapefruit.build_lut(self.linear, size=3)
+    assert_equal(lut.size, 3)
+    assert_equal(lut.table.shape, (3, 3, 3, 3))
+    assert_items_almost_equal(lut.table[2, 1, 0], (2.0, 0.5, 0.0))
+    batch = grapefruit.build_lut(lambda v: numpy.column_stack(self.linear(*v.T)), size=3, batch=True)
+    assert_true(numpy.allclose(lut.table, batch.table))
+    assert_raises(ValueError, grapefruit.build_lut, self.linear, 1)
+
+  def test_apply(self):
+    lut = grapefruit.build_lut(self.linear, size=5)
+    for method in ('trilinear', 'tetrahedral'):
+      result = lut.apply(self.rgb, method)
+      for row, rgb in zip(result, self.rgb):
+        assert_items_almost_equal(row, self.linear(*rgb), places=9)
+    assert_raises(ValueError, lut.apply, self.rgb, 'cubic')
+
+  def test_apply_clips_to_domain(self):
+    lut = grapefruit.build_lut(self.linear, size=5)
+    assert_items_almost_equal(lut.apply([(2.0, -1.0, 0.5)])[0], self.linear(1.0, 0.0, 0.5))
+
+  def test_apply_conversion_chain(self):
+    lut = grapefruit.build_lut(lambda r, g, b: grapefruit.xyz_to_lab(*grapefruit.rgb_to_xyz(r, g, b)), size=33)
+    for method in ('trilinear', 'tetrahedral'):
+      for row, rgb in zip(lut.apply(self.rgb, method), self.rgb):
+        assert_items_almost_equal(row, grapefruit.Color.from_rgb(*rgb).lab, places=0)
+
+  def test_cube_file(self):
+    import os, tempfile
+    lut = grapefruit.build_lut(self.linear, size=4, domainMax=(1.0, 2.0, 1.0), title='linear')
+    fd, path = tempfile.mkstemp(suffix='.cube')
+    os.close(fd)
+    try:
+      lut.save_cube(path)
+      loaded = grapefruit.Lut3D.load_cube(path)
+      assert_equal(loaded.title, 'linear')
+      assert_equal(loaded.domain, ((0.0, 0.0, 0.0), (1.0, 2.0, 1.0)))
+      assert_true(numpy.allclose(loaded.table, lut.table))
+      with open(path, 'a') as f:
+        f.write('0 0 0\n')
+      assert_raises(ValueError, grapefruit.Lut3D.load_cube, path)
+    finally:
+      os.remove(path)
+
+
+class TestConvertPixels():
+  @classmethod
+  def setup_class(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    self.rgba = bytearray((255, 128, 0, 64, 10, 20, 30, 255))
+
+  def test_reorder(self):
+    assert_equal(list(grapefruit.convert_pixels(self.rgba, 'RGBA8', 'BGRA8')), [0, 128, 255, 64, 30, 20, 10, 255])
+    assert_equal(list(grapefruit.convert_pixels(self.rgba, 'RGBA8', 'RGB8')), [255, 128, 0, 10, 20, 30])
+    rgba = grapefruit.convert_pixels(bytearray((1, 2, 3)), 'RGB8', 'RGBA8', alpha=0.5)
+    assert_equal(list(rgba), [1, 2, 3, 128])
+
+  def test_requantize(self):
+    rgba16 = grapefruit.convert_pixels(self.rgba, 'RGBA8', 'RGBA16')
+    assert_equal(array.array('H', bytes(rgba16)).tolist(), [v * 257 for v in self.rgba])
+    rgba8 = grapefruit.convert_pixels(rgba16, 'RGBA16', 'RGBA8')
+    assert_equal(list(rgba8), list(self.rgba))
+
+  def test_conversion(self):
+    xyz = grapefruit.convert_pixels(memoryview(bytes(self.rgba)), 'RGBA8', 'RGBF64', grapefruit.rgb_to_xyz_batch)
+    values = array.array('d', bytes(xyz))
+    assert_items_almost_equal(values[:3], grapefruit.rgb_to_xyz(grapefruit.ints_to_rgb(255, 128, 0)), places=12)
+    assert_items_almost_equal(values[3:], grapefruit.rgb_to_xyz(grapefruit.ints_to_rgb(10, 20, 30)), places=12)
+
+  def test_out(self):
+    out = numpy.zeros((2, 4), dtype=numpy.uint8)
+    assert_true(grapefruit.convert_pixels(self.rgba, 'RGBA8', 'BGRA8', out=out) is out)
+    assert_equal(out.tolist(), [[0, 128, 255, 64], [30, 20, 10, 255]])
+    assert_raises(ValueError, grapefruit.convert_pixels, self.rgba, 'RGBA8', 'RGB8', out=bytearray(3))
+    assert_raises(ValueError, grapefruit.convert_pixels, self.rgba, 'RGBA8', 'RGB8', out=bytes(6))
+
+  def test_invalid(self):
+    assert_raises(ValueError, grapefruit.convert_pixels, self.rgba, 'ARGB8', 'RGB8')
+    assert_raises(ValueError, grapefruit.convert_pixels, bytearray(5), 'RGB8', 'RGB8')
+
+
+class TestConvertFile():
+  @classmethod
+  def setup_class(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    import tempfile
+    self.pixels = array.array('H', range(0, 65535, 2731))[:21]
+    self.dir = tempfile.mkdtemp()
+    self.src = self.dir + '/src.raw'
+    with open(self.src, 'wb') as f:
+      f.write(b'HEAD' + self.pixels.tobytes())
+
+  @classmethod
+  def teardown_class(self):
+    import shutil
+    shutil.rmtree(self.dir)
+
+  def test_convert(self):
+    dst = self.dir + '/lab.raw'
+    lab = lambda rgb: grapefruit.xyz_to_lab_batch(grapefruit.rgb_to_xyz_batch(rgb))
+    count = grapefruit.convert_file(self.src, dst, 'RGB16', 'RGBF64', lab, tileSize=2, offset=4)
+    assert_equal(count, 7)
+    converted = numpy.fromfile(dst)
+    expected = numpy.frombuffer(grapefruit.convert_pixels(self.pixels, 'RGB16', 'RGBF64', lab))
+    assert_true(numpy.allclose(converted, expected, rtol=0, atol=grapefruit.BATCH_TOLERANCE))
+    assert_raises(ValueError, grapefruit.convert_file, self.src, dst, 'RGB16', 'RGB16')
+
+  def test_resume(self):
+    import os
+    dst = self.dir + '/rgb8.raw'
+    calls = []
+    def failing(rgb):
+      calls.append(len(rgb))
+      if len(calls)==3:
+        raise RuntimeError("interrupted")
+      return rgb
+    assert_raises(RuntimeError, grapefruit.convert_file, self.src, dst, 'RGB16', 'RGB8', failing, tileSize=2, offset=4)
+    assert_true(os.path.exists(dst + '.progress'))
+    grapefruit.convert_file(self.src, dst, 'RGB16', 'RGB8', failing, tileSize=2, offset=4)
+    assert_equal(calls, [2, 2, 2, 2, 1])
+    assert_false(os.path.exists(dst + '.progress'))
+    with open(dst, 'rb') as f:
+      assert_equal(f.read(), bytes(grapefruit.convert_pixels(self.pixels, 'RGB16', 'RGB8')))
+
+
+class TestPipeline():
+  @classmethod
+  def setup_class(self):
+    self.html = ['#ff8000', 'red', '#123', 'lemonchiffon', '#000000']
+
+  def assert_matches_colors(self, chunks, expected):
+    results = [v for chunk in chunks for v in chunk]
+    assert_equal(len(results), len(expected))
+    for result, color in zip(results, expected):
+      assert_items_almost_equal(result, color, places=9)
+
+  def test_fused_hsl_operations(self):
+    p = grapefruit.pipeline(chunkSize=2).parse_html().darker(0.1).saturate(0.2).with_hue(120).to('lab')
+    assert_equal(repr(p), 'Pipeline(html.hsl(...) -> lab)')
+    chunks = list(p.run(iter(self.html)))
+    assert_equal([len(chunk) for chunk in chunks], [2, 2, 1])
+    expected = [grapefruit.Color.from_html(h).darker(0.1).saturate(0.2).with_hue(120).lab for h in self.html]
+    self.assert_matches_colors(chunks, expected)
+
+  def test_pure_python(self):
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      self.test_fused_hsl_operations()
+      p = grapefruit.pipeline().parse('hsl').lighter(0.75).desaturate(2).to('hsl')
+      assert_equal(p.process([(30, 0.5, 0.5)]), [(30.0, 0.0, 1.0)])
+    finally:
+      grapefruit.np = numpy_module
+
+  def test_map_and_outputs(self):
+    swap = grapefruit.pipeline().parse('ints').map(lambda r, g, b: (b, g, r))
+    assert_equal(swap.to('html').process([(255, 128, 0)]), ['#0080ff'])
+    assert_equal(swap.to('color').process([(255, 0, 0)]), [grapefruit.Color.from_rgb(0, 0, 1)])
+    self.assert_matches_colors([swap.to('cmyk').process([(0, 0, 255)])], [(0.0, 1.0, 1.0, 0.0)])
+    assert_raises(ValueError, swap.to, 'rgba')
+    assert_raises(ValueError, swap.parse, 'html')
+
+  def test_async(self):
+    try:
+      import asyncio
+    except ImportError:
+      raise SkipTest("asyncio is not available")
+    class Colors():
+      def __init__(self, values):
+        self.values = iter(values)
+      def __aiter__(self):
+        return self
+      def __anext__(self):
+        future = asyncio.get_event_loop().create_future()
+        try:
+          future.set_result(next(self.values))
+        except StopIteration:
+          future.set_exception(StopAsyncIteration())
+        return future
+    p = grapefruit.pipeline(chunkSize=3).parse_html().lighter(0.2).to('html')
+    run = p.run(Colors(self.html))
+    def collect():
+      chunks = []
+      def next_chunk(future=None):
+        if future is not None:
+          if isinstance(future.exception(), StopAsyncIteration):
+            done.set_result(chunks)
+            return
+          chunks.append(future.result())
+        asyncio.ensure_future(run.__anext__()).add_done_callback(next_chunk)
+      done = asyncio.get_event_loop().create_future()
+      next_chunk()
+      return done
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+      chunks = loop.run_until_complete(collect())
+    finally:
+      asyncio.set_event_loop(None)
+      loop.close()
+    assert_equal(chunks, [[grapefruit.Color.from_html(h).lighter(0.2).html for h in self.html[:3]],
+                          [grapefruit.Color.from_html(h).lighter(0.2).html for h in self.html[3:]]])
+
+
+class TestNearestNames():
+  @classmethod
+  def setup_class(self):
+    import random
+    rnd = random.Random(7)
+    self.rgb = [(rnd.random(), rnd.random(), rnd.random()) for i in range(300)]
+
+  def linear_scan(self, rgb, wref=grapefruit.WHITE_REFERENCE['std_D65']):
+    lab = grapefruit._cie_lab(*grapefruit.Color(rgb, wref=wref).lab)
+    best = None
+    for name in sorted(grapefruit.NAMED_COLOR):
+      other = grapefruit._cie_lab(*grapefruit.Color.from_html(name, wref=wref).lab)
+      d = sum([(u - v) ** 2 for u, v in zip(lab, other)])
+      if best is None or d < best[0]:
+        best = (d, name)
+    return best[1]
+
+  def test_kd_tree(self):
+    import random
+    rnd = random.Random(3)
+    points = [(rnd.random(), rnd.random(), rnd.random()) for i in range(200)]
+    tree = grapefruit._KDTree(points)
+    for i in range(100):
+      p = (rnd.random(), rnd.random(), rnd.random())
+      distances = [sum([(u - v) ** 2 for u, v in zip(p, q)]) for q in points]
+      index, d = tree.nearest(p)
+      assert_almost_equal(d, min(distances), places=12)
+      assert_equal(distances[index], d)
+    assert_equal(grapefruit._KDTree([]).nearest((0, 0, 0)), (None, float('inf')))
+
+  def test_nearest_name(self):
+    for rgb in self.rgb[:50]:
+      assert_equal(grapefruit.Color(rgb).nearest_name(), self.linear_scan(rgb))
+    wref = grapefruit.WHITE_REFERENCE['std_A']
+    assert_equal(grapefruit.Color(self.rgb[0], wref=wref).nearest_name(), self.linear_scan(self.rgb[0], wref))
+    assert_equal(grapefruit.Color.from_html('cyan').nearest_name(), 'aqua')
+    wref = list(grapefruit.WHITE_REFERENCE['std_A'])
+    assert_equal(grapefruit.Color(self.rgb[0], wref=wref).nearest_name(), self.linear_scan(self.rgb[0], wref))
+
+  def test_nearest_names(self):
+    expected = [grapefruit.Color(rgb).nearest_name() for rgb in self.rgb]
+    if numpy is not None:
+      assert_equal(grapefruit.nearest_names(self.rgb), expected)
+      assert_equal(grapefruit.ColorArray.from_rgb(self.rgb).nearest_names(), expected)
+      assert_equal(grapefruit.nearest_names(self.rgb, wref=list(grapefruit.WHITE_REFERENCE['std_D65'])), expected)
+    wref = list(grapefruit.WHITE_REFERENCE['std_D65'])
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      assert_equal(grapefruit.nearest_names(self.rgb), expected)
+      assert_equal(grapefruit.nearest_names(self.rgb, wref=wref), expected)
+    finally:
+      grapefruit.np = numpy_module
+
+class TestPalette():
+  @classmethod
+  def setup_class(self):
+    import random
+    rnd = random.Random(11)
+    self.rgb = [(rnd.random(), rnd.random(), rnd.random()) for i in range(150)]
+    self.queries = [(rnd.random(), rnd.random(), rnd.random()) for i in range(40)]
+
+  def linear_scan(self, palette, rgb):
+    lab = grapefruit._cie_lab(*grapefruit.Color(rgb).lab)
+    result = []
+    for key in palette.keys():
+      other = grapefruit._cie_lab(*palette[key].lab)
+      result.append((sum([(u - v) ** 2 for u, v in zip(lab, other)]) ** 0.5, key))
+    return [(key, d) for d, key in sorted(result)]
+
+  def assert_hits(self, hits, expected):
+    assert_equal([key for key, d in hits], [key for key, d in expected])
+    for (k1, d1), (k2, d2) in zip(hits, expected):
+      assert_almost_equal(d1, d2, places=6)
+
+  def test_kd_tree_edits(self):
+    import random
+    rnd = random.Random(5)
+    points = [(rnd.random(), rnd.random(), rnd.random()) for i in range(100)]
+    tree = grapefruit._KDTree(points)
+    live = set(range(len(points)))
+    for i in range(300):
+      if rnd.random() < 0.5 and live:
+        index = rnd.choice(sorted(live))
+        tree.remove(index)
+        live.discard(index)
+      else:
+        points.append((rnd.random(), rnd.random(), rnd.random()))
+        assert_equal(tree.insert(points[-1]), len(points) - 1)
+        live.add(len(points) - 1)
+    assert_equal(len(tree), len(live))
+    assert_raises(KeyError, tree.remove, min(set(range(len(points))) - live))
+    for i in range(30):
+      p = (rnd.random(), rnd.random(), rnd.random())
+      expected = sorted([(sum([(u - v) ** 2 for u, v in zip(p, points[j])]), j) for j in live])
+      assert_equal(tree.nearest(p)[0], expected[0][1])
+      assert_equal([j for j, d in tree.knearest(p, 5)], [j for d, j in expected[:5]])
+      assert_equal([j for j, d in tree.within(p, 0.3)], [j for d, j in expected if d <= 0.09])
+
+  def test_kd_tree_sorted_inserts(self):
+    tree = grapefruit._KDTree()
+    points = [(i / 2000.0, 1 - i / 2000.0, 0.5) for i in range(2000)]
+    for p in points:
+      tree.insert(p)
+    depth = 0
+    stack = [(tree.root, 1)]
+    while stack:
+      node, level = stack.pop()
+      if node is not None:
+        depth = max(depth, level)
+        stack.extend([(node[5], level + 1), (node[6], level + 1)])
+    assert_true(depth <= 30)
+    assert_equal(len(tree), len(points))
+    for p in ((0.25, 0.75, 0.5), (0.6, 0.3, 0.4)):
+      expected = sorted([(sum([(u - v) ** 2 for u, v in zip(p, q)]), j) for j, q in enumerate(points)])
+      assert_equal(tree.nearest(p)[0], expected[0][1])
+      assert_equal([j for j, d in tree.knearest(p, 3)], [j for d, j in expected[:3]])
+
+  def test_kd_tree_partial_rebuilds(self):
+    import random
+    rnd = random.Random(7)
+    points = [(rnd.random(), rnd.random(), rnd.random()) for i in range(1000)]
+    tree = grapefruit._KDTree(points)
+    root = tree.root
+    for i in range(600):
+      points.append((rnd.random(), rnd.random(), rnd.random()))
+      tree.insert(points[-1])
+    removed = rnd.sample(range(len(points)), 400)
+    for index in removed:
+      tree.remove(index)
+    # Only the subtrees left with half of their nodes deleted were rebuilt.
+    assert_true(tree.root is root)
+    assert_true(len(tree.deleted) < len(removed))
+    assert_equal(len(tree), 1200)
+    nodes = 0
+    stack = [tree.root]
+    while stack:
+      node = stack.pop()
+      if node is not None:
+        nodes += 1
+        stack.extend([node[5], node[6]])
+    assert_equal(tree.root[8], nodes)
+    assert_equal(nodes, 1200 + len(tree.deleted))
+    assert_equal(tree.knearest((0.5, 0.5, 0.5), 0), [])
+    palette = grapefruit.Palette(self.rgb)
+    assert_equal(palette.nearest(self.queries[0], 0), [])
+    assert_equal(palette.nearest_batch(self.queries[:2], 0), [[], []])
+
+  def test_queries(self):
+    palette = grapefruit.Palette(self.rgb)
+    assert_equal(len(palette), len(self.rgb))
+    for rgb in self.queries:
+      expected = self.linear_scan(palette, rgb)
+      self.assert_hits(palette.nearest(rgb), expected[:1])
+      self.assert_hits(palette.nearest(grapefruit.Color(rgb), 4), expected[:4])
+      self.assert_hits(palette.within(rgb, 20), [(k, d) for k, d in expected if d <= 20])
+
+  def test_batch(self):
+    palette = grapefruit.Palette(self.rgb)
+    for hits, rgb in zip(palette.nearest_batch(self.queries, 3), self.queries):
+      self.assert_hits(hits, palette.nearest(rgb, 3))
+    for hits, rgb in zip(palette.within_batch(self.queries, 15), self.queries):
+      self.assert_hits(hits, palette.within(rgb, 15))
+    if numpy is not None:
+      assert_equal(grapefruit.Palette(numpy.array(self.rgb)).keys(), palette.keys())
+      assert_equal(palette.nearest_batch(numpy.array(self.queries)), palette.nearest_batch(self.queries))
+
+  def test_edits(self):
+    palette = grapefruit.Palette(self.rgb[:50])
+    for rgb in self.rgb[50:]:
+      palette.add(grapefruit.Color(rgb))
+    for key in range(0, 150, 3):
+      palette.remove(key)
+    assert_equal(len(palette), 100)
+    assert_false(0 in palette)
+    assert_true(1 in palette)
+    assert_raises(KeyError, palette.remove, 0)
+    assert_raises(KeyError, palette.__getitem__, 0)
+    assert_equal(palette[1].rgb, self.rgb[1])
+    for rgb in self.queries:
+      self.assert_hits(palette.nearest(rgb, 2), self.linear_scan(palette, rgb)[:2])
+
+  def test_pure_python(self):
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      palette = grapefruit.Palette(self.rgb)
+      for rgb in self.queries[:10]:
+        self.assert_hits(palette.nearest(rgb, 3), self.linear_scan(palette, rgb)[:3])
+      assert_equal(grapefruit.Palette().nearest(self.queries[0]), [])
+    finally:
+      grapefruit.np = numpy_module
+
+class TestDeltaE():
+  # The CIEDE2000 test data of Sharma, Wu and Dalal (2005), with a* and b*
+  # in the CIE range.
+  SHARMA = [
+    ((50.0, 2.6772, -79.7751), (50.0, 0.0, -82.7485), 2.0425),
+    ((50.0, 3.1571, -77.2803), (50.0, 0.0, -82.7485), 2.8615),
+    ((50.0, -1.3802, -84.2814), (50.0, 0.0, -82.7485), 1.0000),
+    ((50.0, 0.0, 0.0), (50.0, -1.0, 2.0), 2.3669),
+    ((50.0, 2.49, -0.001), (50.0, -2.49, 0.0009), 7.1792),
+    ((50.0, 2.49, -0.001), (50.0, -2.49, 0.0011), 7.2195),
+    ((50.0, -0.001, 2.49), (50.0, 0.0009, -2.49), 4.8045),
+    ((50.0, -0.001, 2.49), (50.0, 0.0011, -2.49), 4.7461),
+    ((50.0, 2.5, 0.0), (73.0, 25.0, -18.0), 27.1492),
+    ((50.0, 2.5, 0.0), (61.0, -5.0, 29.0), 22.8977),
+    ((50.0, 2.5, 0.0), (56.0, -27.0, -3.0), 31.9030),
+    ((50.0, 2.5, 0.0), (58.0, 24.0, 15.0), 19.4535),
+    ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+    ((61.2901, 3.7196, -5.3901), (61.4292, 2.2480, -4.9620), 1.8731),
+    ((22.7233, 20.0904, -46.6940), (23.0331, 14.9730, -42.5619), 2.0373),
+    ((90.9257, -0.5406, -0.9208), (88.6381, -0.8985, -0.7239), 1.5381),
+    ((2.0776, 0.0795, -1.1350), (0.9033, -0.0636, -0.5514), 0.9082)]
+
+  @classmethod
+  def setup_class(self):
+    import random
+    rnd = random.Random(13)
+    lab = lambda: (rnd.uniform(0, 100), rnd.uniform(-1.2, 1.2), rnd.uniform(-1.2, 1.2))
+    self.lab1 = [lab() for i in range(200)]
+    self.lab2 = [lab() for i in range(200)]
+    scale = lambda lab: (lab[0], lab[1] / 100.0, lab[2] / 100.0)
+    self.pairs = [(scale(c1), scale(c2), d) for c1, c2, d in self.SHARMA]
+
+  def test_delta_e2000(self):
+    for c1, c2, d in self.pairs:
+      assert_true(abs(grapefruit.delta_e2000(c1, c2) - d) < 1e-4, (c1, c2, d))
+      assert_true(abs(grapefruit.delta_e2000(c2, c1) - d) < 1e-4, (c2, c1, d))
+
+  def test_delta_e76_94(self):
+    c1, c2 = (50, 0.025, 0), (50, 0, -0.025)
+    assert_almost_equal(grapefruit.delta_e76(c1, c2), 12.5 ** 0.5)
+    assert_almost_equal(grapefruit.delta_e94(c1, c2), 12.5 ** 0.5 / 1.0375)
+    assert_almost_equal(grapefruit.delta_e94(c1, c2, True), 12.5 ** 0.5 / 1.035)
+    assert_almost_equal(grapefruit.delta_e94((40, 0, 0), (60, 0, 0), True), 10.0)
+
+  def test_color(self):
+    c1 = grapefruit.Color.from_html('#ff8000')
+    c2 = grapefruit.Color.from_html('#ff8800')
+    assert_equal(c1.delta_e(c2), grapefruit.delta_e2000(c1.lab, c2.lab))
+    assert_equal(c1.delta_e(c2, 'cie76'), grapefruit.delta_e76(c1.lab, c2.lab))
+    assert_raises(ValueError, c1.delta_e, c2, 'cie2001')
+
+  def check_batch(self):
+    for method in ('cie76', 'cie94', 'ciede2000'):
+      scalar = grapefruit._DELTA_E[method][0]
+      result = grapefruit.delta_e_batch(self.lab1, self.lab2, method)
+      assert_equal(len(result), len(self.lab1))
+      for c1, c2, d in zip(self.lab1, self.lab2, result):
+        assert_almost_equal(d, scalar(c1, c2), places=9)
+      result = grapefruit.delta_e_batch(self.lab1, self.lab2[0], method)
+      for c1, d in zip(self.lab1, result):
+        assert_almost_equal(d, scalar(c1, self.lab2[0]), places=9)
+    result = grapefruit.delta_e_batch([c1 for c1, c2, d in self.pairs], [c2 for c1, c2, d in self.pairs])
+    for (c1, c2, d), r in zip(self.pairs, result):
+      assert_true(abs(r - d) < 1e-4, (c1, c2, d))
+    assert_raises(ValueError, grapefruit.delta_e_batch, self.lab1, self.lab2[:5])
+    assert_raises(ValueError, grapefruit.delta_e_batch, self.lab1, self.lab2, 'cie2001')
+
+  def check_matrix(self):
+    rows = 0
+    for start, block in grapefruit.delta_e_matrix(self.lab1[:30], self.lab2[:40], 'cie94', chunkSize=7):
+      assert_equal(start, rows)
+      for i, row in enumerate(block):
+        assert_equal(len(row), 40)
+        for j, d in enumerate(row):
+          assert_almost_equal(d, grapefruit.delta_e94(self.lab1[start + i], self.lab2[j]), places=9)
+        rows += 1
+    assert_equal(rows, 30)
+    blocks = list(grapefruit.delta_e_matrix(self.lab1[:20]))
+    assert_equal(len(blocks), 1)
+    assert_equal(len(blocks[0][1]), 20)
+    assert_almost_equal(blocks[0][1][3][5], grapefruit.delta_e2000(self.lab1[3], self.lab1[5]), places=9)
+
+  def test_batch(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    self.check_batch()
+    self.check_matrix()
+    out = numpy.empty(len(self.lab1))
+    assert_true(grapefruit.delta_e_batch(numpy.array(self.lab1), numpy.array(self.lab2), out=out) is out)
+
+  def test_pure_python(self):
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      self.check_batch()
+      self.check_matrix()
+    finally:
+      grapefruit.np = numpy_module
+
+class TestExtractPalette():
+  @classmethod
+  def setup_class(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    rnd = numpy.random.RandomState(17)
+    self.base = numpy.array([(230, 40, 40), (20, 120, 30), (30, 40, 200), (240, 230, 220)])
+    self.share = [0.4, 0.3, 0.2, 0.1]
+    index = numpy.repeat(numpy.arange(4), [int(s * 20000) for s in self.share])
+    noise = rnd.randint(-6, 7, (len(index), 3))
+    self.pixels = numpy.clip(self.base[index] + noise, 0, 255).astype(numpy.uint8)
+
+  def check_palette(self, palette):
+    assert_equal(len(palette), 4)
+    assert_almost_equal(sum([w for c, w in palette]), 1.0)
+    for (col, w), base, share in zip(palette, self.base, self.share):
+      assert_almost_equal(w, share, places=2)
+      assert_true(col.delta_e(grapefruit.Color(tuple(base / 255.0))) < 2.0, (col, base))
+
+  def test_methods(self):
+    self.check_palette(grapefruit.extract_palette(self.pixels, 4))
+    palette = grapefruit.extract_palette(self.pixels.tobytes(), 12, method='median_cut')
+    assert_equal(len(palette), 12)
+    assert_almost_equal(sum([w for c, w in palette]), 1.0)
+    assert_equal([w for c, w in palette], sorted([w for c, w in palette], reverse=True))
+    for base in self.base:
+      col = grapefruit.Color(tuple(base / 255.0))
+      assert_true(min([col.delta_e(c) for c, w in palette]) < 2.0, base)
+    self.check_palette(grapefruit.extract_palette(self.pixels, 4, sample=5000))
+    assert_raises(ValueError, grapefruit.extract_palette, self.pixels, 4, method='octree')
+
+  def test_layouts(self):
+    rgba = numpy.zeros((len(self.pixels) + 5000, 4), dtype=numpy.uint8)
+    rgba[:len(self.pixels), :3] = self.pixels
+    rgba[:len(self.pixels), 3] = 255
+    self.check_palette(grapefruit.extract_palette(rgba, 4, 'RGBA8'))
+    floats = (self.pixels / 255.0).astype(numpy.float32)
+    self.check_palette(grapefruit.extract_palette(floats, 4, 'RGBF32', bits=6))
+    assert_raises(ValueError, grapefruit.extract_palette, self.pixels, 4, bits=9)
+    # Less than one bin apart on the green axis, in different blue bins.
+    floats = numpy.array([[0, 2.5 / 32, 0], [0, 2 / 32.0, 0.5]], numpy.float32)
+    assert_equal(len(grapefruit.extract_palette(floats, 2, 'RGBF32')), 2)
+
+  def test_small(self):
+    palette = grapefruit.extract_palette(bytearray((255, 128, 0, 0, 0, 255)), 8)
+    assert_equal(sorted([(c.html, w) for c, w in palette]), [('#0000ff', 0.5), ('#ff8000', 0.5)])
+    assert_equal(grapefruit.extract_palette(bytearray(), 8), [])
+
+class TestDither():
+  @classmethod
+  def setup_class(self):
+    import random
+    rnd = random.Random(19)
+    self.width = 23
+    self.pixels = bytearray([rnd.randint(0, 255) for i in range(self.width * 40 * 3)])
+    self.palette = [(rnd.random(), rnd.random(), rnd.random()) for i in range(10)]
+
+  def dither_all(self):
+    result = []
+    for method in ('floyd_steinberg', 'atkinson', 'bayer'):
+      for palette in (None, self.palette):
+        result.append(grapefruit.dither_pixels(self.pixels, self.width, palette, method))
+    return result
+
+  def test_websafe(self):
+    quantize = grapefruit._py_quantizer(None, 255.0)
+    for v in range(256):
+      expected = grapefruit.rgb_to_websafe(v / 255.0, 0, 0)[0] * 255
+      assert_almost_equal(quantize(v, 0, 0)[0], expected)
+    for method in ('floyd_steinberg', 'atkinson', 'bayer'):
+      flat = bytearray((80, 80, 80) * (self.width * 40))
+      result = grapefruit.dither_pixels(flat, self.width, method=method)
+      assert_equal(set(result), set([51, 102]))
+      assert_true(abs(sum(result) / float(len(result)) - 80) < 1, method)
+
+  def test_palette(self):
+    levels = set([tuple([int(v * 255 + 0.5) for v in c]) for c in self.palette])
+    result = grapefruit.dither_pixels(self.pixels, self.width, self.palette)
+    assert_true(set([tuple(result[i:i+3]) for i in range(0, len(result), 3)]) <= levels)
+    palette = grapefruit.Palette(self.palette)
+    assert_equal(grapefruit.dither_pixels(self.pixels, self.width, palette), result)
+    colors = [grapefruit.Color(c) for c in self.palette]
+    assert_equal(grapefruit.dither_pixels(self.pixels, self.width, colors), result)
+
+  def test_rows(self):
+    size = self.width * 3
+    rows = (bytes(self.pixels[i:i+size]) for i in range(0, len(self.pixels), size))
+    result = bytearray().join(grapefruit.dither_rows(rows, method='atkinson'))
+    assert_equal(result, grapefruit.dither_pixels(self.pixels, self.width, method='atkinson'))
+    pixels = bytearray(self.pixels)
+    assert_true(grapefruit.dither_pixels(pixels, self.width, out=pixels) is pixels)
+    assert_equal(pixels, grapefruit.dither_pixels(self.pixels, self.width))
+    assert_raises(ValueError, list, grapefruit.dither_rows([bytearray(6), bytearray(9)]))
+    assert_raises(ValueError, grapefruit.dither_pixels, self.pixels, 7)
+    assert_raises(ValueError, grapefruit.dither_pixels, self.pixels, self.width, method='random')
+
+  def test_alpha(self):
+    rgba = bytearray()
+    for i in range(0, len(self.pixels), 3):
+      rgba += self.pixels[i:i+3] + bytearray([i % 256])
+    result = grapefruit.dither_pixels(rgba, self.width, layout='RGBA8')
+    assert_equal(result[3::4], rgba[3::4])
+    rgb = bytearray()
+    for i in range(0, len(result), 4):
+      rgb += result[i:i+3]
+    assert_equal(rgb, grapefruit.dither_pixels(self.pixels, self.width))
+    bgr = bytearray()
+    for i in range(0, len(self.pixels), 3):
+      bgr += self.pixels[i:i+3][::-1]
+    result = grapefruit.dither_pixels(bgr, self.width, layout='BGR8')
+    rgb = bytearray()
+    for i in range(0, len(result), 3):
+      rgb += result[i:i+3][::-1]
+    assert_equal(rgb, grapefruit.dither_pixels(self.pixels, self.width))
+
+  def test_pure_python(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    expected = self.dither_all()
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      assert_equal(self.dither_all(), expected)
+    finally:
+      grapefruit.np = numpy_module
+
+class TestComposite():
+  @classmethod
+  def setup_class(self):
+    import random
+    rnd = random.Random(24)
+    self.src = bytearray([rnd.randint(0, 255) for i in range(500 * 4)])
+    self.dst = bytearray([rnd.randint(0, 255) for i in range(500 * 4)])
+    for i in range(0, 40, 4):
+      self.src[i+3] = 0
+      self.dst[i+43] = 0
+      self.src[i+83] = 255
+
+  def reference(self, s, d, operator):
+    """Straight alpha compositing of two (r, g, b, a) tuples."""
+    sa, da = s[3], d[3]
+    fractions = {
+      'over': (1.0, 1.0 - sa),
+      'in': (da, 0.0),
+      'out': (1.0 - da, 0.0),
+      'atop': (da, 1.0 - sa),
+      'xor': (1.0 - da, 1.0 - sa)}
+    if operator in fractions:
+      fa, fb = fractions[operator]
+      a = sa * fa + da * fb
+      rgb = [sa * fa * cs + da * fb * cd for cs, cd in zip(s[:3], d[:3])]
+    else:
+      modes = {
+        'multiply': lambda cs, cd: cs * cd,
+        'screen': lambda cs, cd: cs + cd - cs * cd,
+        'overlay': lambda cs, cd: [1 - 2 * (1 - cs) * (1 - cd), 2 * cs * cd][cd <= 0.5]}
+      a = sa + da - sa * da
+      rgb = [sa * (1 - da) * cs + da * (1 - sa) * cd + sa * da * modes[operator](cs, cd) for cs, cd in zip(s[:3], d[:3])]
+    if a==0:
+      return (0.0, 0.0, 0.0, 0.0)
+    return tuple([v / a for v in rgb]) + (a,)
+
+  def pixels(self, buf):
+    return [tuple([v / 255.0 for v in buf[i:i+4]]) for i in range(0, len(buf), 4)]
+
+  def test_operators(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    for operator in grapefruit.COMPOSITE_OPERATORS:
+      dst = bytearray(self.dst)
+      assert_true(grapefruit.composite(self.src, dst, operator) is dst)
+      for s, d, r in zip(self.pixels(self.src), self.pixels(self.dst), self.pixels(dst)):
+        expected = self.reference(s, d, operator)
+        # The colors of nearly transparent results are very imprecise.
+        if expected[3] < 0.1:
+          r, expected = r[3:], expected[3:]
+        assert_items_almost_equal(r, expected, places=None, delta=0.012)
+
+  def test_float_layouts(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    src = numpy.array(self.src, dtype=float) / 255.0
+    for operator in grapefruit.COMPOSITE_OPERATORS:
+      dst = numpy.array(self.dst, dtype=float) / 255.0
+      grapefruit.composite(src, dst, operator, 'RGBAF64')
+      for s, d, r in zip(self.pixels(self.src), self.pixels(self.dst), dst.reshape(-1, 4).tolist()):
+        assert_items_almost_equal(r, self.reference(s, d, operator), places=9)
+
+  def test_premultiplied(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    src = numpy.array(self.src, dtype=float).reshape(-1, 4) / 255.0
+    dst = numpy.array(self.dst, dtype=float).reshape(-1, 4) / 255.0
+    src[:, :3] *= src[:, 3:]
+    dst[:, :3] *= dst[:, 3:]
+    for operator in grapefruit.COMPOSITE_OPERATORS:
+      straight = numpy.array(self.dst, dtype=float) / 255.0
+      grapefruit.composite(numpy.array(self.src, dtype=float) / 255.0, straight, operator, 'RGBAF64')
+      straight = straight.reshape(-1, 4)
+      straight[:, :3] *= straight[:, 3:]
+      result = grapefruit.composite(src, dst.copy(), operator, 'RGBAF64', premultiplied=True)
+      assert_true(numpy.allclose(result, straight))
+
+  def test_linear(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    src = numpy.array(self.src, dtype=float) / 255.0
+    dst = numpy.array(self.dst, dtype=float) / 255.0
+    grapefruit.composite(src, dst, 'screen', 'RGBAF64', linear=True)
+    for s, d, r in zip(self.pixels(self.src), self.pixels(self.dst), dst.reshape(-1, 4).tolist()):
+      s = tuple([grapefruit._srgb_to_linear(v) for v in s[:3]]) + s[3:]
+      d = tuple([grapefruit._srgb_to_linear(v) for v in d[:3]]) + d[3:]
+      expected = self.reference(s, d, 'screen')
+      expected = tuple([grapefruit._linear_to_srgb(v) for v in expected[:3]]) + expected[3:]
+      assert_items_almost_equal(r, expected, places=9)
+    # The 8 bits levels are linearized with a table.
+    dst = bytearray(self.dst)
+    grapefruit.composite(self.src, dst, 'screen', linear=True)
+    expected = numpy.array(self.dst, dtype=float) / 255.0
+    grapefruit.composite(numpy.array(self.src, dtype=float) / 255.0, expected, 'screen', 'RGBAF64', linear=True)
+    assert_true(numpy.abs(numpy.frombuffer(dst, numpy.uint8) - numpy.rint(expected * 255)).max() <= 1)
+
+  def test_layouts(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    expected = grapefruit.composite(self.src, bytearray(self.dst), 'overlay')
+    bgra = lambda buf: bytearray([buf[i+j] for i in range(0, len(buf), 4) for j in (2, 1, 0, 3)])
+    dst = bgra(self.dst)
+    grapefruit.composite(self.src, dst, 'overlay', 'BGRA8', 'RGBA8')
+    assert_equal(dst, bgra(expected))
+    dst = bgra(self.dst)
+    grapefruit.composite(bgra(self.src), dst, 'overlay', 'BGRA8')
+    assert_equal(dst, bgra(expected))
+
+    # The layouts without alpha are opaque.
+    rgb = bytearray([v for i, v in enumerate(self.dst) if i % 4 != 3])
+    dst = bytearray(rgb)
+    grapefruit.composite(rgb, dst, 'xor', 'RGB8')
+    assert_equal(dst, bytearray(len(rgb)))
+    dst = bytearray(self.dst)
+    grapefruit.composite(rgb, dst, srcLayout='RGB8')
+    assert_equal(bytearray([v for i, v in enumerate(dst) if i % 4 != 3]), rgb)
+    assert_equal(dst[3::4], bytearray([255]) * 500)
+    dst = bytearray(rgb)
+    grapefruit.composite(self.src, dst, 'over', 'RGB8', 'RGBA8')
+    for s, d, r in zip(self.pixels(self.src), self.pixels(bytearray(self.dst)), range(0, len(dst), 3)):
+      d = d[:3] + (1.0,)
+      expected = self.reference(s, d, 'over')
+      assert_items_almost_equal([v / 255.0 for v in dst[r:r+3]], expected[:3], places=None, delta=0.003)
+
+  def test_layers(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    src = numpy.array(self.src, dtype=float) / 255.0
+    layers = [src, (src[::-1].copy(), 'multiply'), (src, 'screen', 0.4), (src, 'atop')]
+    result = numpy.array(self.dst, dtype=float) / 255.0
+    grapefruit.composite_layers(layers, result, 'RGBAF64')
+    expected = numpy.array(self.dst, dtype=float) / 255.0
+    grapefruit.composite(src, expected, layout='RGBAF64')
+    grapefruit.composite(src[::-1].copy(), expected, 'multiply', 'RGBAF64')
+    grapefruit.composite(src, expected, 'screen', 'RGBAF64', opacity=0.4)
+    grapefruit.composite(src, expected, 'atop', 'RGBAF64')
+    assert_true(numpy.allclose(result, expected))
+    dst = bytearray(self.dst)
+    for i in range(0, len(dst), 4):
+      if not dst[i+3]:
+        dst[i:i+3] = bytearray(3)
+    assert_equal(grapefruit.composite(self.src, bytearray(self.dst), opacity=0.0), dst)
+
+  def test_errors(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    assert_raises(ValueError, grapefruit.composite, self.src, bytearray(self.dst), 'plus')
+    assert_raises(ValueError, grapefruit.composite, self.src, bytearray(16))
+    assert_raises(ValueError, grapefruit.composite, self.src, bytes(self.dst))
+    assert_raises(ValueError, grapefruit.composite_layers, [(self.src, 'over', 1.0, 0)], bytearray(self.dst))
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      assert_raises(ImportError, grapefruit.composite, self.src, bytearray(self.dst))
+    finally:
+      grapefruit.np = numpy_module
+
+class TestGradient():
+  @classmethod
+  def setup_class(self):
+    self.stops = [(0, '#ff0000'), (0.3, (0.2, 0.5, 0.7, 0.5)), (1, grapefruit.Color.from_html('#ffee00'))]
+    self.positions = [i / 49.0 for i in range(50)] + [-1, 2]
+
+  def test_stops(self):
+    for space in grapefruit.GRADIENT_SPACES:
+      gradient = grapefruit.Gradient(self.stops, space)
+      assert_equal(gradient.sample(0).html, '#ff0000')
+      assert_items_almost_equal(gradient.sample(0.3).rgb, (0.2, 0.5, 0.7), places=6)
+      assert_almost_equal(gradient.sample(0.3).alpha, 0.5)
+      assert_equal(gradient(1).html, '#ffee00')
+      assert_almost_equal(gradient(0.65).alpha, 0.75)
+      assert_equal(gradient(-1), gradient(0))
+    wide = grapefruit.Gradient([(1.4, -0.2, 0.5), '#000000'], 'rgb')
+    assert_equal(wide.sample(0).rgb, (1.0, 0.0, 0.5))
+    assert_equal(wide.sample(0, clip=False).rgb, (1.4, -0.2, 0.5))
+    evenly = grapefruit.Gradient(['#ff0000', '#00ff00', '#0000ff'], 'rgb')
+    assert_equal(evenly(0.25), (0.5, 0.5, 0.0, 1.0))
+    assert_equal(evenly.domain, (0.0, 1.0))
+    assert_equal(grapefruit.Gradient(['#808080'])(0.7).html, '#808080')
+    assert_raises(ValueError, grapefruit.Gradient, [], 'lab')
+    assert_raises(ValueError, grapefruit.Gradient, ['#ff0000'], 'hsl')
+    assert_raises(ValueError, grapefruit.Gradient, [(0.5, '#ff0000'), (0.2, '#00ff00')])
+    assert_raises(ValueError, grapefruit.Gradient, [(0.5, '#ff0000'), '#00ff00'])
+
+  def test_transparent_stops(self):
+    for space in grapefruit.GRADIENT_SPACES:
+      gradient = grapefruit.Gradient(['#ff0000', (0.0, 0.0, 1.0, 0.0)], space)
+      assert_equal(gradient(1).alpha, 0.0)
+      assert_almost_equal(gradient(0.5).alpha, 0.5)
+      if numpy is not None:
+        assert_equal(gradient.ramp(3)[:, 3].tolist(), [1.0, 0.5, 0.0])
+    gradient = grapefruit.Gradient([grapefruit.Color.from_html('#0000ff', 0.0)] * 2)
+    assert_equal(gradient(0.5).alpha, 0.0)
+
+  def test_hard_stop(self):
+    gradient = grapefruit.Gradient([(0, 'red'), (0.5, 'red'), (0.5, 'blue'), (1, 'blue')], 'oklab')
+    assert_equal(gradient(0.49).html, '#ff0000')
+    assert_equal(gradient(0.5).html, '#0000ff')
+
+  def test_lch_hue(self):
+    hue = lambda col: grapefruit._rgb_to_gradient_space(col.rgb, 'lch', col.white_ref)[2]
+    red = grapefruit.Color.from_html('#ff0000')
+    for other in ('#ff00ff', '#0000ff', '#00ff00'):
+      other = grapefruit.Color.from_html(other)
+      h1, h2 = hue(red), hue(other)
+      expected = (h1 + ((h2 - h1 + 180) % 360 - 180) / 2) % 360
+      for a, b in ((red, other), (other, red)):
+        mid = hue(grapefruit.Gradient([a, b], 'lch')(0.5))
+        assert_true(abs((mid - expected + 180) % 360 - 180) < 10, (mid, expected))
+    grey = grapefruit.Gradient(['#808080', red], 'lch')
+    assert_almost_equal(hue(grey(0.5)), hue(red), places=3)
+
+  def check_batch(self, gradient, rgba):
+    for i, t in enumerate(self.positions):
+      col = gradient(t)
+      assert_items_almost_equal(list(rgba[4*i:4*i+4]), col.rgb + (col.alpha,), places=9)
+
+  def test_batch(self):
+    for space in grapefruit.GRADIENT_SPACES:
+      gradient = grapefruit.Gradient(self.stops, space)
+      if numpy is not None:
+        self.check_batch(gradient, gradient.sample_batch(self.positions).ravel())
+        out = numpy.empty((4096, 4))
+        assert_true(gradient.ramp(4096, out) is out)
+        assert_items_almost_equal(out[0], [1.0, 0.0, 0.0, 1.0], places=6)
+      numpy_module = grapefruit.np
+      grapefruit.np = None
+      try:
+        self.check_batch(gradient, gradient.sample_batch(self.positions))
+        assert_equal(len(gradient.ramp(7)), 28)
+      finally:
+        grapefruit.np = numpy_module
+
+  def test_batch_clip(self):
+    wide = grapefruit.Gradient([(1.4, -0.2, 0.5), (0.0, 0.0, 0.0, 0.5)], 'rgb')
+    if numpy is not None:
+      assert_items_almost_equal(wide.sample_batch([0.0, 0.5])[0], (1.0, 0.0, 0.5, 1.0))
+      assert_items_almost_equal(wide.sample_batch([0.0, 0.5], clip=False).ravel(), (1.4, -0.2, 0.5, 1.0, 0.7, -0.1, 0.25, 0.75))
+      assert_items_almost_equal(wide.ramp(2, clip=False)[0], (1.4, -0.2, 0.5, 1.0))
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      late = grapefruit.Gradient([(1.4, -0.2, 0.5), (0.0, 0.0, 0.0, 0.5)], 'rgb')
+      assert_items_almost_equal(wide.sample_batch([0.0, 0.5], clip=False), (1.4, -0.2, 0.5, 1.0, 0.7, -0.1, 0.25, 0.75))
+      assert_items_almost_equal(wide.sample_batch([0.0])[:], (1.0, 0.0, 0.5, 1.0))
+    finally:
+      grapefruit.np = numpy_module
+    # Made without numpy, sampled with it.
+    if numpy is not None:
+      assert_items_almost_equal(late.sample_batch([0.5], clip=False).ravel(), (0.7, -0.1, 0.25, 0.75))
+
+  def test_colors(self):
+    gradient = grapefruit.Gradient(self.stops, 'oklab')
+    colors = gradient.colors(4)
+    assert_equal(next(colors), gradient(0))
+    assert_equal(list(colors), [gradient(1 / 3.0), gradient(2 / 3.0), gradient(1)])
+
+class TestColormap():
+  @classmethod
+  def setup_class(self):
+    import random
+    rnd = random.Random(23)
+    nan, inf = float('nan'), float('inf')
+    self.values = [rnd.uniform(-150, 1150) for i in range(500)] + [0, 1000, 500, nan, inf, -inf, -0.0]
+    self.cmap = grapefruit.Colormap(['#000000', '#ff0000', '#ffff00', '#ffffff'], 'oklab', 64, 0, 1000, under='#0000ff', over=(0, 1, 0, 0.5))
+
+  def check_pixels(self, pixels, cmap, layout):
+    fmt, channels, order, alpha = grapefruit.PIXEL_LAYOUTS[layout]
+    levels = {'B': 255, 'H': 65535}.get(fmt)
+    for i, value in enumerate(self.values):
+      col = cmap(value)
+      pixel = pixels[i*channels:(i+1)*channels]
+      rgb = [pixel[c] for c in order]
+      if levels:
+        assert_equal(rgb, [int(round(v * levels)) for v in col.rgb])
+        if alpha is not None:
+          assert_equal(pixel[alpha], int(round(col.alpha * levels)))
+      else:
+        assert_items_almost_equal(rgb, col.rgb, places=6)
+
+  def test_call(self):
+    cmap = self.cmap
+    assert_equal(cmap(-1).html, '#0000ff')
+    assert_equal(cmap(1001).rgb, (0, 1, 0))
+    assert_equal(cmap(1001).alpha, 0.5)
+    assert_equal(cmap(float('nan')), (0, 0, 0, 0))
+    assert_equal(cmap(0).html, '#000000')
+    assert_equal(cmap(1000).html, '#ffffff')
+    assert_equal(cmap(15.6), cmap(0))
+    assert_not_equal(cmap(15.7), cmap(0))
+    assert_equal(len(cmap), 64)
+    assert_equal(cmap.range, (0.0, 1000.0))
+    flat = grapefruit.Colormap(cmap.gradient, vmin=2, vmax=2)
+    assert_equal([flat(v).html for v in (1, 2, 3)], ['#000000', '#000000', '#ffffff'])
+    assert_raises(ValueError, grapefruit.Colormap, ['#000000'], vmin=1, vmax=0)
+    assert_raises(ValueError, grapefruit.Colormap, ['#000000'], size=0)
+
+  def test_apply(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    for layout in ('RGBA8', 'BGR8', 'RGB16', 'RGBAF32'):
+      pixels = grapefruit._pixel_array(self.cmap.apply(array.array('d', self.values), layout), layout).ravel()
+      self.check_pixels(pixels.tolist(), self.cmap, layout)
+    values = numpy.array(self.values)
+    expected = self.cmap.apply(values)
+    assert_equal(self.cmap.apply(values.astype(numpy.float32).reshape(1, -1)), expected)
+    out = numpy.zeros((len(values), 4), dtype=numpy.uint8)
+    assert_true(self.cmap.apply(values, out=out) is out)
+    assert_equal(bytearray(out.tobytes()), expected)
+    assert_equal(len(self.cmap.apply(numpy.arange(10))), 40)
+    flat = grapefruit.Colormap(self.cmap.gradient, vmin=2, vmax=2)
+    self.check_pixels(bytearray(flat.apply(values)), flat, 'RGBA8')
+    assert_raises(ValueError, self.cmap.apply, values, 'RGBA8', bytearray(8))
+
+  def test_bin_edges(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    import random
+    rnd = random.Random(31)
+    cmap = grapefruit.Colormap(['#000000', '#ff0000', '#ffffff'], 'rgb', 256, 0, 0.7)
+    values = [k * 0.7 / 256 for k in range(257)] + [rnd.uniform(0, 0.7) for i in range(5000)]
+    pixels = numpy.frombuffer(cmap.apply(values, 'RGBAF64')).reshape(-1, 4)
+    assert_equal([tuple(p) for p in pixels.tolist()], [cmap(v).rgba for v in values])
+
+  def test_pure_python(self):
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      cmap = grapefruit.Colormap(['#000000', '#ff0000'], size=16)
+      assert_equal(cmap(0.5), grapefruit.Gradient(['#000000', '#ff0000'])(8 / 15.0))
+      assert_raises(ImportError, cmap.apply, [0.5])
+    finally:
+      grapefruit.np = numpy_module
+
+class TestSchemeBatch():
+  @classmethod
+  def setup_class(self):
+    import random
+    rnd = random.Random(29)
+    self.rgb = [(rnd.random(), rnd.random(), rnd.random()) for i in range(200)]
+    self.rgb += [(1.0, 0.0, 0.0), (0.5, 0.5, 0.5), (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)]
+    self.schemes = [
+      (grapefruit.complementary_color_batch, lambda c, *args: (c.complementary_color(*args),), ('ryb',), 1),
+      (grapefruit.complementary_color_batch, lambda c, *args: (c.complementary_color(*args),), ('rgb',), 1),
+      (grapefruit.monochrome_scheme_batch, grapefruit.Color.make_monochrome_scheme, (), 4),
+      (grapefruit.triadic_scheme_batch, grapefruit.Color.make_triadic_scheme, (120, 'ryb'), 2),
+      (grapefruit.triadic_scheme_batch, grapefruit.Color.make_triadic_scheme, (40, 'rgb'), 2),
+      (grapefruit.tetradic_scheme_batch, grapefruit.Color.make_tetradic_scheme, (30, 'ryb'), 3),
+      (grapefruit.tetradic_scheme_batch, grapefruit.Color.make_tetradic_scheme, (0, 'rgb'), 3),
+      (grapefruit.analogous_scheme_batch, grapefruit.Color.make_analogous_scheme, (30, 'ryb'), 2),
+      (grapefruit.analogous_scheme_batch, grapefruit.Color.make_analogous_scheme, (60, 'rgb'), 2)]
+
+  def check_schemes(self, flat):
+    for batch, method, args, k in self.schemes:
+      result = batch(self.rgb, *args)
+      if flat:
+        assert_equal(len(result), len(self.rgb) * k * 3)
+      else:
+        assert_equal(result.shape[-1], 3)
+        assert_equal(len(result), len(self.rgb))
+        result = result.ravel()
+      for i, rgb in enumerate(self.rgb):
+        expected = [v for c in method(grapefruit.Color(rgb), *args) for v in c.rgb]
+        assert_items_almost_equal(result[i*k*3:(i+1)*k*3], expected, places=9)
+
+  def test_batch(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    self.check_schemes(False)
+    assert_equal(grapefruit.triadic_scheme_batch(numpy.array(self.rgb)).shape, (len(self.rgb), 2, 3))
+    assert_equal(grapefruit.complementary_color_batch(self.rgb).shape, (len(self.rgb), 3))
+
+  def test_wheel(self):
+    if numpy is None:
+      raise SkipTest("numpy is not installed")
+    hues = numpy.arange(0, 360.0, 0.7)
+    assert_equal(grapefruit.rgb_to_ryb(hues).tolist(), [grapefruit.rgb_to_ryb(h) for h in hues.tolist()])
+    assert_equal(grapefruit.ryb_to_rgb(hues).tolist(), [grapefruit.ryb_to_rgb(h) for h in hues.tolist()])
+    assert_equal(grapefruit.rgb_to_ryb(numpy.array([360.0])).tolist(), [360.0])
+
+  def test_pure_python(self):
+    numpy_module = grapefruit.np
+    grapefruit.np = None
+    try:
+      self.check_schemes(True)
+    finally:
+      grapefruit.np = numpy_module
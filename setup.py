@@ -23,6 +23,6 @@ except ImportError:
 
 setup(
     setup_requires=['d2to1'],
-    extras_require={'test': ['nose', ]},
+    extras_require={'test': ['nose', ], 'numpy': ['numpy', ]},
     d2to1=True
 )